@@ -0,0 +1,260 @@
+"""
+Cache of the agent's decisions, keyed on the page state it was shown.
+
+Within Agent.run() the first steps are the same for every booking: open
+seacargotracking.net, pick the carrier, fill in the Track & Trace form.
+Only the typed booking ID differs. CachingAgent answers those steps from
+this cache instead of asking Gemini again.
+
+An entry is keyed on a slot made of:
+    - the task template (the carrier's instructions with the booking ID
+      replaced by `{booking_id}`),
+    - the page URL,
+    - the results of the previous actions, which tell "form still empty"
+      apart from "booking ID typed".
+
+The entry stores a fingerprint of the full page state the model saw (tabs
+and interactive elements, booking ID parameterised out, step counter and
+clock removed) together with the model's output. A lookup hits only when
+the fingerprint matches. When the page in a slot no longer matches (the
+site changed), the entry is dropped and the model is asked again.
+
+Decisions are only stored once the run they came from succeeded. If a run
+that used cached decisions fails, those entries are evicted. Entries expire
+after ACTION_CACHE_TTL, and the least recently used ones are evicted beyond
+ACTION_CACHE_SIZE. The entries are kept in the tracking database so they
+survive restarts and are shared between sharded workers.
+
+Settings (environment / .env):
+    ACTION_CACHE_TTL   Seconds a cached decision is reused
+    ACTION_CACHE_SIZE  Decisions kept before the least recently used are evicted
+
+The cache is switched off per run with AGENT_ACTION_CACHE=0 / --no-action-cache.
+
+Like gemini_client.py this module imports browser-use and is only loaded on
+paths that actually run the agent.
+"""
+import hashlib
+import os
+import re
+import time
+
+from browser_use import Agent
+
+from replay import BOOKING_ID_PLACEHOLDER
+from result_cache import TRACKING_DB, connect
+from run_metrics import current_metrics
+from telemetry import counter
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_SIZE = 500
+
+ACTION_CACHE = counter('tracking_action_cache', "Agent steps answered from the action cache, by outcome",
+                       ('outcome',))
+
+STATE_MARKER = '[Current state starts here]'
+_STEP_INFO = re.compile(r'Current step: \d+/\d+|Current date and time: [\d\-: ]+')
+_NEW_ELEMENT = re.compile(r'\*\[(\d+)\]')
+_WHITESPACE = re.compile(r'[ \t]+')
+
+
+def _parameterise(text, booking_id):
+    return text.replace(booking_id, BOOKING_ID_PLACEHOLDER) if booking_id else text
+
+
+def _message_text(message):
+    content = message.content
+    if isinstance(content, str):
+        return content
+    # Vision messages: the text part only, the screenshot is not part of the key
+    return '\n'.join(part.get('text', '') for part in content if isinstance(part, dict) and part.get('type') == 'text')
+
+
+def page_state(input_messages):
+    """The text of the latest state message the agent is about to send, or None."""
+    for message in reversed(input_messages):
+        if getattr(message, 'type', None) != 'human':
+            continue
+        text = _message_text(message)
+        if STATE_MARKER in text:
+            return text[text.index(STATE_MARKER):]
+    return None
+
+
+def fingerprint(task, state, booking_id):
+    """
+    Slot and fingerprint of a page state.
+
+    Returns:
+        Tuple of (slot, url, fingerprint)
+    """
+    state = _parameterise(state, booking_id)
+    state = _STEP_INFO.sub('', state)
+    state = _NEW_ELEMENT.sub(r'[\1]', state)
+    lines = [_WHITESPACE.sub(' ', line).strip() for line in state.splitlines()]
+    lines = [line for line in lines if line]
+    url = next((line[len('Current url:'):].strip() for line in lines if line.startswith('Current url:')), '')
+    results = [line for line in lines if line.startswith(('Action result', 'Action error'))]
+
+    template = _parameterise(task, booking_id)
+    slot = hashlib.sha256('\n'.join([template, url] + results).encode('utf-8')).hexdigest()
+    digest = hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+    return slot, url, digest
+
+
+class ActionCache:
+    """
+    LRU/TTL store of agent outputs by page-state slot.
+
+    Args:
+        db_path: SQLite database file backing the cache
+        ttl: Seconds an entry is reused
+        size: Entries kept before the least recently used are evicted
+    """
+
+    def __init__(self, db_path=TRACKING_DB, ttl=None, size=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("ACTION_CACHE_TTL", DEFAULT_TTL))
+        self.size = size if size is not None else int(os.getenv("ACTION_CACHE_SIZE", DEFAULT_SIZE))
+        self._conn = connect(db_path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS action_cache (
+                slot TEXT PRIMARY KEY,
+                url TEXT,
+                fingerprint TEXT NOT NULL,
+                output TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_action_cache_used ON action_cache (used_at)")
+        self._conn.commit()
+
+    def get(self, slot, digest):
+        """
+        The cached output for a slot if the page still matches.
+
+        Returns:
+            Tuple of (outcome, output): outcome is 'hit', 'miss' or 'drift'
+        """
+        row = self._conn.execute(
+            "SELECT fingerprint, output, created_at FROM action_cache WHERE slot = ?", (slot,)
+        ).fetchone()
+        if row is None:
+            return 'miss', None
+        stored_digest, output, created_at = row
+        if stored_digest != digest or time.time() - created_at > self.ttl:
+            self.evict([slot])
+            return ('drift' if stored_digest != digest else 'miss'), None
+        self._conn.execute("UPDATE action_cache SET used_at = ?, hits = hits + 1 WHERE slot = ?", (time.time(), slot))
+        self._conn.commit()
+        return 'hit', output
+
+    def put_many(self, entries):
+        """Store (slot, url, fingerprint, output) entries and evict beyond the size limit."""
+        if not entries:
+            return
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO action_cache (slot, url, fingerprint, output, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [entry + (now, now) for entry in entries],
+            )
+            self._conn.execute(
+                "DELETE FROM action_cache WHERE slot IN "
+                "(SELECT slot FROM action_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.size,),
+            )
+
+    def evict(self, slots):
+        with self._conn:
+            self._conn.executemany("DELETE FROM action_cache WHERE slot = ?", [(slot,) for slot in slots])
+
+    def clear(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM action_cache")
+
+    def close(self):
+        self._conn.close()
+
+
+_shared_cache = None
+
+
+def get_action_cache():
+    """Return the process-wide action cache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ActionCache()
+    return _shared_cache
+
+
+class CachingAgent(Agent):
+    """
+    browser-use Agent that answers page states seen in earlier successful
+    runs from the ActionCache instead of calling the model.
+
+    Args:
+        booking_id: The booking being tracked, parameterised out of the cache keys
+        action_cache: ActionCache to use, the process-wide one if omitted
+        All other arguments are passed to Agent.
+    """
+
+    def __init__(self, *args, booking_id, action_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.booking_id = booking_id
+        self.action_cache = action_cache or get_action_cache()
+        self._learned = []
+        self._reused = []
+
+    async def get_next_action(self, input_messages):
+        state = page_state(input_messages)
+        if state is None:
+            return await super().get_next_action(input_messages)
+
+        slot, url, digest = fingerprint(self.task, state, self.booking_id)
+        outcome, output = self.action_cache.get(slot, digest)
+        ACTION_CACHE.inc(outcome=outcome)
+        if output is not None:
+            self._reused.append(slot)
+            metrics = current_metrics()
+            if metrics is not None:
+                metrics.cached_actions += 1
+            return self.AgentOutput.model_validate_json(output.replace(BOOKING_ID_PLACEHOLDER, self.booking_id))
+
+        parsed = await super().get_next_action(input_messages)
+        # The final answer is specific to the booking and never reused
+        if not any('done' in action.model_dump(exclude_unset=True) for action in parsed.action):
+            output = _parameterise(parsed.model_dump_json(exclude_unset=True), self.booking_id)
+            self._learned.append((slot, url, digest, output))
+        return parsed
+
+    async def run(self, *args, **kwargs):
+        history = await super().run(*args, **kwargs)
+        self.settle(bool(history.is_successful()))
+        return history
+
+    def settle(self, success):
+        """
+        Store the decisions of a successful run. Evict the cached decisions a
+        failed run relied on.
+        """
+        if success:
+            self.action_cache.put_many(self._learned)
+        else:
+            self.forget_reused()
+        self._learned = []
+
+    def forget_reused(self):
+        """Evict the cached decisions this run has used so far."""
+        if self._reused:
+            self.action_cache.evict(self._reused)
+        self._reused = []
+
+
+def create_agent(booking_id, budget, **kwargs):
+    """An Agent for one lookup: a CachingAgent unless the budget turns the action cache off."""
+    if budget.action_cache and booking_id:
+        return CachingAgent(booking_id=booking_id, **kwargs, **budget.agent_kwargs())
+    return Agent(**kwargs, **budget.agent_kwargs())
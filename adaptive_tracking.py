@@ -1,274 +1,250 @@
 import warnings
 warnings.filterwarnings("ignore", category=ResourceWarning)
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from browser_use import Agent, BrowserSession
 from dotenv import load_dotenv
+import argparse
 import asyncio
 import json
-import os
 import sys
-import re
 
-# Load environment variables from .env
-load_dotenv()
-
-# Get Google API key from environment
-google_api_key = os.getenv("GOOGLE_API_KEY")
-if not google_api_key:
-    raise ValueError("GOOGLE_API_KEY environment variable is not set")
-
-# Define the storage path for interactions
-STORAGE_DIR = "interactions"
-STORAGE_FILE = os.path.join(STORAGE_DIR, "hmm_tracking_interactions.json")
-
-def extract_tracking_fields(result, booking_id):
-    """
-    Extract booking_id, vessel_name, voyage_number, and arrival_date from agent result.
-    Accepts either a string or dict result.
-    Returns a dict with only those fields.
-    """
-    print(f"\nDEBUG: Result type: {type(result)}")
-    print(f"DEBUG: Result content: {result[:500]}..." if isinstance(result, str) else f"DEBUG: Result content: {result}")
-    
-    def split_vessel_and_voyage(text):
-        """Split combined vessel name and voyage number"""
-        if not text:
-            return None, None
-        # Pattern: name followed by space and number+letter at the end (e.g. "YM MANDATE 0096W")
-        parts = text.strip().rsplit(' ', 1)
-        if len(parts) == 2 and any(c.isdigit() for c in parts[1]) and parts[1][-1].upper() in 'WENS':
-            return parts[0], parts[1]
-        return text, None
-
-    # Initialize return structure
-    extracted = {
-        'booking_id': booking_id,
-        'vessel_name': 'Not available',
-        'voyage_number': 'Not available',
-        'arrival_date': 'Not available'
-    }
-    print(f"\nDEBUG: Result type: {type(result)}")
-    print(f"DEBUG: Result content: {result[:500]}..." if isinstance(result, str) else f"DEBUG: Result content: {result}")
-    
-    # Initialize return structure
-    extracted = {
-        'booking_id': booking_id,
-        'vessel_name': 'Not available',
-        'voyage_number': 'Not available',
-        'arrival_date': 'Not available'
-    }
-    
-    # First try to handle dict input
-    if isinstance(result, dict):
-        # Try to parse nested results
-        for key in ['result', 'raw_result', 'data']:
-            if key in result:
-                nested_result = extract_tracking_fields(result[key], booking_id)
-                if nested_result['vessel_name'] != 'Not available':
-                    return nested_result
-
-        # Look for vessel_voyage structure
-        if 'vessel_voyage' in result and isinstance(result['vessel_voyage'], list):
-            v = result['vessel_voyage'][0]
-            if 'vessel_name' in v or 'voyage_number' in v:
-                # Extract combined vessel and voyage if present
-                if 'voyage_number' in v and ' ' in v['voyage_number']:
-                    vessel_name, voyage_number = split_vessel_and_voyage(v['voyage_number'])
-                    if vessel_name:
-                        extracted['vessel_name'] = vessel_name
-                    if voyage_number:
-                        extracted['voyage_number'] = voyage_number
-                else:
-                    # Take values as-is
-                    extracted['vessel_name'] = v.get('vessel_name', extracted['vessel_name'])
-                    extracted['voyage_number'] = v.get('voyage_number', extracted['voyage_number'])
-
-                # Try different date field names
-                for date_key in ['arrival_date_time', 'arrival_date', 'etb']:
-                    if date_key in v and v[date_key]:
-                        extracted['arrival_date'] = v[date_key]
-                        break
-
-                if any(val != 'Not available' for val in extracted.values()):
-                    return extracted
-
-    # Convert to string for pattern matching
-    text = str(result)
-    
-    # Look for direct JSON data first
-    json_match = re.search(r'\{[^{}]*"voyage_number":\s*"([^"]+)"[^{}]*\}', text)
-    if json_match:
-        voyage_str = json_match.group(1)
-        vessel_name, voyage_number = split_vessel_and_voyage(voyage_str)
-        if vessel_name:
-            extracted['vessel_name'] = vessel_name
-        if voyage_number:
-            extracted['voyage_number'] = voyage_number
-            # Look for corresponding arrival date
-            date_match = re.search(r'"arrival_date(?:_time)?":\s*"([^"]+)"', text)
-            if date_match:
-                extracted['arrival_date'] = date_match.group(1)
-                return extracted
-
-    # Search for json code blocks
-    json_blocks = re.finditer(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text)
-    for match in json_blocks:
-        try:
-            data = json.loads(match.group())
-            if 'voyage_number' in data:
-                # Handle combined vessel name and voyage
-                vessel_name, voyage_number = split_vessel_and_voyage(data['voyage_number'])
-                if vessel_name:
-                    extracted['vessel_name'] = vessel_name
-                if voyage_number:
-                    extracted['voyage_number'] = voyage_number
-                    
-                if 'arrival_date' in data:
-                    extracted['arrival_date'] = data['arrival_date']
-                    if any(val != 'Not available' for val in extracted.values()):
-                        return extracted
-        except json.JSONDecodeError:
-            continue
-
-    # Look for specific patterns in text
-    vessel_num = re.search(r'(?:vessel|ship)\s+name\s+(?:and\s+voyage\s+number\s+)?(?:is|:)\s*([A-Z0-9\- ]+\s+\d{4,5}[WENS])', text, re.IGNORECASE)
-    if vessel_num:
-        vessel_name, voyage_number = split_vessel_and_voyage(vessel_num.group(1))
-        if vessel_name:
-            extracted['vessel_name'] = vessel_name
-        if voyage_number:
-            extracted['voyage_number'] = voyage_number
-            # Look for arrival date nearby
-            date_match = re.search(r'arrival\s+date\s*(?:\(ETB\))?\s*(?:is|:)\s*(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2})', text, re.IGNORECASE)
-            if date_match:
-                extracted['arrival_date'] = date_match.group(1)
-                return extracted
-
-    # Look for plaintext patterns as last resort
-    name_match = re.search(r'(?:vessel|ship)\s+name\s*(?:is|:)\s*([A-Z0-9\- ]+)(?!\d{4,5}[WENS])', text, re.IGNORECASE)
-    if name_match:
-        extracted['vessel_name'] = name_match.group(1).strip()
-
-    voyage_match = re.search(r'voyage\s+(?:number\s+)?(?:is|:)\s*(\d{4,5}[WENS])', text, re.IGNORECASE)
-    if voyage_match:
-        extracted['voyage_number'] = voyage_match.group(1).strip()
-
-    date_match = re.search(r'(?:arrival|eta|etb)\s+(?:date|time)\s*(?:\(ETB\))?\s*(?:is|:)\s*(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2})', text, re.IGNORECASE)
-    if date_match:
-        extracted['arrival_date'] = date_match.group(1).strip()
-
-    if any(val != 'Not available' for val in extracted.values()):
-        print("DEBUG: Found some values in plain text")
-        return extracted
-    
-    print("DEBUG: No reliable data found, returning defaults")
-    return extracted
-
-async def adaptive_tracking(booking_id, headless=False):
+# Like main.py, only lightweight modules are imported at module level
+from browser_pool import close_browser_session, new_browser_session, start_browser_session
+from llm_scheduler import is_rate_limit_error
+from carriers import carrier_for
+from main import get_llm, run_tracking_agent, track_shipping
+from replay import ReplayError, load_interactions, record_script, replay_script, save_interactions
+from result_cache import get_cache
+from result_store import get_result_store
+from run_metrics import add_budget_arguments, budget_from_args, page_load_seconds, track_run
+from self_healing import get_fast_path_supervisor, get_replay_supervisor, validate_script
+from telemetry import FALLBACKS, configure_telemetry, span
+from voyage_index import get_voyage_index
+
+async def adaptive_tracking(booking_id, headless=False, llm=None, browser_pool=None, use_http=True, max_age=None,
+                            budget=None):
     """
     Use stored interactions to track a shipping container with minimal AI intervention
     
     Args:
         booking_id: The booking ID to track
         headless: Whether to run browser in headless mode
+        llm: Optional shared chat model or ModelLadder; a new ladder is created if omitted
+        browser_pool: Optional BrowserPool to borrow a warm session from
+        use_http: Try the direct HTTP fast path before any browser work
+        max_age: Maximum age in seconds of a cached result (None for the cache TTL, 0 to skip)
+        budget: AgentBudget for the LLM agent; read from the environment if omitted
     
     Returns:
         Dictionary containing tracking information
     """
-    # Initialize LLM with recommended settings
-    llm = ChatGoogleGenerativeAI(  
-        model='gemini-2.0-flash-exp',
-        temperature=0.0,
-        google_api_key=google_api_key
-    )
-    
-    # Check if stored interactions exist
-    if not os.path.exists(STORAGE_FILE):
+    cache = get_cache()
+    cached = cache.get(booking_id, max_age=max_age)
+    if cached is not None:
+        print(f"✅ Using cached result for {booking_id}")
+        return cached
+
+    minimal = await _adaptive_lookup(booking_id, headless, llm, browser_pool, use_http, budget)
+    cache.put(minimal)
+    get_voyage_index().record(minimal)
+    return minimal
+
+async def _adaptive_lookup(booking_id, headless, llm, browser_pool, use_http, budget):
+    from tracking_models import result_fields
+
+    # The carrier's direct HTTP lookup needs neither a browser nor the LLM
+    carrier = carrier_for(booking_id)
+    fast_path = get_fast_path_supervisor(carrier)
+    if use_http and carrier.has_fast_path and fast_path.allow():
+        with span('http.fetch', carrier=carrier.code):
+            minimal = await fast_path.call(carrier.fetch, booking_id)
+        if minimal is not None:
+            get_result_store().add(minimal, 'http')
+            return minimal
+        FALLBACKS.inc(from_path='http', to_path='browser')
+
+    # The HTTP fast path missed: the LLM may be needed from here on
+    if llm is None:
+        llm = get_llm()
+    
+    # Check if stored interactions exist for this carrier
+    stored = load_interactions(carrier.storage_file)
+    if stored is None:
         print("No stored interactions found. Running full tracking.")
-        from main import track_shipping
-        return await track_shipping(booking_id, headless=headless)
-    
-    # Load stored interactions
-    try:
-        with open(STORAGE_FILE, 'r') as f:
-            stored = json.load(f)
-        print(f"Using stored interactions from {STORAGE_FILE}")
-    except Exception as e:
-        print(f"Error loading stored interactions: {e}")
-        print("Falling back to full tracking.")
-        from main import track_shipping
-        return await track_shipping(booking_id, headless=headless)
+        result = await track_shipping(booking_id, headless=headless, llm=llm, browser_pool=browser_pool, budget=budget,
+                                      carrier=carrier)
+        minimal = result_fields(result, booking_id)
+        get_result_store().add(minimal, 'agent', raw_history=result)
+        # Record the run so the next lookup for this carrier can replay it
+        steps = record_script(result, booking_id) if minimal['vessel_name'] != 'Not available' else []
+        save_interactions(carrier.storage_file, booking_id, minimal, steps)
+        return minimal
+    print(f"Using stored interactions from {carrier.storage_file}")
+    steps = stored.get('steps', []) if isinstance(stored, dict) else []
     
     # Define task that uses the stored interactions as guidance
-    task = f"""
-    Using the previous successful interactions with seacargotracking.net, retrieve the voyage number and arrival date for HMM booking ID '{booking_id}':
-    
-    1. Go to http://www.seacargotracking.net/ 
-    2. Look for HMM (Hyundai Merchant Marine) or similar options
-    3. Search for Track & Trace and click on it:
-        - Input booking ID in search or B/L No. field 
-        - Click on Search button 
-    4. Scrape the full page content and extract:
-        - Voyage number from vessel name format (XXXXX XXXW)
-        - Arrival date with time from ETB (Estimated Time of Berthing)
-    
-    Return ONLY a JSON object with fields 'booking_id', 'voyage_number', and 'arrival_date'.
-    If any information cannot be found, set the value to "Not available".
-    
-    Note: If the website structure has changed, adapt your approach accordingly.
-    """
+    task = carrier.adaptive_task(booking_id)
     
+    # Borrow a warm browser from the pool when one is provided
+    if browser_pool is not None:
+        async with browser_pool.session() as browser_session:
+            return await run_adaptive_lookup(task, llm, browser_session, booking_id, steps, budget, carrier)
+
     # Configure and create browser session for Windows Chrome
-    browser_session = BrowserSession(
-        executable_path='C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe',
-        headless=headless,
-        viewport_size={"width": 1920, "height": 1080},
-    )
-    await browser_session.start()
+    browser_session = new_browser_session(headless=headless)
+    await start_browser_session(browser_session)
+    try:
+        return await run_adaptive_lookup(task, llm, browser_session, booking_id, steps, budget, carrier)
+    finally:
+        # Ensure the browser is properly closed
+        await close_browser_session(browser_session)
+
+async def run_adaptive_lookup(task, llm, browser_session, booking_id, steps, budget=None, carrier=None):
+    """
+    Replay the recorded browser steps for a booking and only fall back to the
+    LLM agent if the replay fails. When replays of this carrier keep failing
+    the script is re-learned once (see self_healing.py) instead of by every lookup.
+    """
+    carrier = carrier or carrier_for(booking_id)
+    supervisor = get_replay_supervisor(carrier)
+    if supervisor.relearning:
+        # The site changed and the script is being re-learned: replay the new one
+        steps = await supervisor.wait_for_script() or steps
+    if steps:
+        try:
+            return await replay_lookup(steps, browser_session, booking_id, carrier)
+        except ReplayError as e:
+            print(f"⚠️ Replay failed at step {e.step_index}: {e}.")
+        if supervisor.relearning:
+            relearned = await supervisor.wait_for_script()
+            if relearned:
+                try:
+                    return await replay_lookup(relearned, browser_session, booking_id, carrier)
+                except ReplayError as e:
+                    print(f"⚠️ Re-learned script failed at step {e.step_index}: {e}.")
+        elif supervisor.should_relearn():
+            return await relearn_script(task, llm, browser_session, booking_id, budget, carrier)
+        print("Falling back to the LLM agent.")
+        FALLBACKS.inc(from_path='replay', to_path='agent')
+    else:
+        print("No replay steps stored. Using the LLM agent.")
+    # Only a validated relearn replaces a stored script, never a single lookup's miss
+    return await run_adaptive_agent(task, llm, browser_session, booking_id, budget, carrier, record=not steps)
+
+async def replay_lookup(steps, browser_session, booking_id, carrier):
+    """Replay a script for one booking, store its result and count it for the carrier's replay supervisor."""
+    supervisor = get_replay_supervisor(carrier)
+    with track_run(booking_id, 'replay') as metrics:
+        page = await browser_session.get_current_page()
+        try:
+            minimal = await replay_script(steps, booking_id, page, carrier.parse_tables)
+        except ReplayError:
+            metrics.success = False
+            supervisor.record(False)
+            raise
+        metrics.steps = len(steps)
+        metrics.page_load_seconds = await page_load_seconds(page)
+        metrics.finish(minimal)
+    supervisor.record(True)
+    get_result_store().add(minimal, 'replay')
+    print(f"\n✅ Replayed {len(steps)} stored steps without the LLM:")
+    print(json.dumps(minimal, indent=2, ensure_ascii=False))
+    return minimal
+
+async def relearn_script(task, llm, browser_session, booking_id, budget, carrier):
+    """
+    Re-learn the carrier's script with one agent run on this booking, validate
+    it against known bookings and store it as the next version.
+    """
+    supervisor = get_replay_supervisor(carrier)
+
+    async def replay(steps, target_id):
+        return await replay_script(steps, target_id, await browser_session.get_current_page(), carrier.parse_tables)
 
-    # Create the agent with optimized settings
-    agent = Agent(
-        task=task,
-        llm=llm,
-        browser_session=browser_session  # Pass BrowserSession
-    )
+    async def learn():
+        return await learn_script(task, llm, browser_session, booking_id, budget, carrier)
+
+    async def validate(steps, extracted):
+        return await validate_script(steps, booking_id, extracted, carrier, replay, supervisor.policy.validate)
+
+    minimal, steps, validated_with = await supervisor.relearn(learn, validate)
+    if steps:
+        version = save_interactions(carrier.storage_file, booking_id, minimal, steps, validated_with)
+        print(f"\n✅ Re-learned the {carrier.code} script (version {version}), "
+              f"validated with {len(validated_with)} booking(s)")
+    else:
+        print(f"\n⚠️ No validated {carrier.code} script came out of the agent run; keeping the stored one")
+    return minimal
+
+async def learn_script(task, llm, browser_session, booking_id, budget=None, carrier=None):
+    """
+    Run the adaptive agent on a started browser session, store its result and
+    record the browser steps it took.
+
+    Returns:
+        Tuple of the extracted fields and the recorded replay steps (empty if nothing was found)
+    """
+    carrier = carrier or carrier_for(booking_id)
+    from tracking_models import result_fields
 
     # Run the agent
     try:
-        result = await agent.run()
-        # Extract and store only the required fields in the JSON file
-        minimal = extract_tracking_fields(result, booking_id)
-        with open(STORAGE_FILE, 'w') as f:
-            json.dump(minimal, f, indent=2, ensure_ascii=False)
-        print(f"\n✅ Saved minimal tracking result to {STORAGE_FILE}:")
-        print(json.dumps(minimal, indent=2, ensure_ascii=False))
-        return minimal
+        result = await run_tracking_agent(task, llm, browser_session, booking_id, budget, carrier)
     except Exception as e:
         print(f"\n❌ Error during adaptive tracking: {e}")
-        if 'ResourceExhausted' in str(e) or '429' in str(e):
+        if is_rate_limit_error(e):
             print('You have exhausted your Gemini API quota. Please wait for quota reset or use a new API key.')
         elif 'Failed to connect to LLM' in str(e):
             print('Failed to connect to LLM. Please check your API key and network connection.')
         raise
-    finally:
-        # Ensure the browser is properly closed
-        await browser_session.close()
+    minimal = result_fields(result, booking_id)
+    get_result_store().add(minimal, 'agent', raw_history=result)
+    steps = record_script(result, booking_id) if minimal['vessel_name'] != 'Not available' else []
+    return minimal, steps
 
-async def main():
-    # Get booking ID from command line
-    if len(sys.argv) > 1:
-        booking_id = sys.argv[1]
-    else:
-        booking_id = "SINI25432400"  # Default example
-    
-    # Check if headless mode is specified
-    headless = "--headless" in sys.argv
+async def run_adaptive_agent(task, llm, browser_session, booking_id, budget=None, carrier=None, record=True):
+    """
+    Run the adaptive agent on a started browser session and store the extracted
+    fields, together with the browser steps it took unless `record` is False.
+    """
+    carrier = carrier or carrier_for(booking_id)
+    minimal, steps = await learn_script(task, llm, browser_session, booking_id, budget, carrier)
+    # Store the extracted fields and, if asked to, re-record the steps for future replays
+    steps = steps if record else []
+    save_interactions(carrier.storage_file, booking_id, minimal, steps)
+    print(f"\n✅ Saved tracking result and {len(steps)} replay steps to {carrier.storage_file}:")
+    print(json.dumps(minimal, indent=2, ensure_ascii=False))
+    return minimal
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Track a shipment reusing stored interactions.")
+    parser.add_argument('booking_id', nargs='?', default="SINI25432400", help="Booking ID to track")  # Default example
+    parser.add_argument('--headless', action='store_true', help="Run the browser in headless mode")
+    parser.add_argument('--no-http', dest='use_http', action='store_false',
+                        help="Skip the direct HTTP fast path and always use the browser")
+    parser.add_argument('--max-age', type=float, default=None,
+                        help="Reuse a cached result up to this many seconds old (0 disables the cache)")
+    add_budget_arguments(parser)
+    return parser.parse_args(argv)
+
+async def main(argv=None):
+    args = parse_args(argv)
+    # Load environment variables from .env
+    load_dotenv()
+    configure_telemetry()
+
+    booking_id = args.booking_id
+    headless = args.headless
     
     print(f"Adaptively tracking booking ID: {booking_id}")
     print(f"Headless mode: {'enabled' if headless else 'disabled'}")
     
-    result = await adaptive_tracking(booking_id, headless=headless)
+    try:
+        result = await adaptive_tracking(booking_id, headless=headless, use_http=args.use_http, max_age=args.max_age,
+                                         budget=budget_from_args(args))
+    finally:
+        # Only imported (with httpx) if the fast path ran, so cache hits stay fast
+        if 'http_fetcher' in sys.modules:
+            await sys.modules['http_fetcher'].close_fetcher()
     print("\nResult:")
     print(result)
 
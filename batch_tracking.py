@@ -0,0 +1,208 @@
+"""
+Batch tracking for many booking IDs.
+
+Reads booking IDs from a file (or stdin), runs them through a bounded pool of
+asyncio workers and streams one JSON line per booking as soon as it finishes.
+
+Usage:
+    python batch_tracking.py bookings.txt --concurrency 4 --headless
+    type bookings.txt | python batch_tracking.py - --output results.jsonl
+"""
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from main import RESULTS_DIR, lookup_booking
+from adaptive_tracking import adaptive_tracking
+from browser_pool import DEFAULT_MAX_USES, BrowserPool
+from llm_scheduler import BACKGROUND, BATCH, llm_priority, scheduler_stats
+from run_metrics import add_budget_arguments, budget_from_args
+from telemetry import configure_telemetry
+from voyage_index import refresh_voyages
+
+DEFAULT_CONCURRENCY = 3
+
+
+def read_booking_ids(source):
+    """
+    Read booking IDs from a file path or '-' for stdin.
+    Blank lines and lines starting with '#' are skipped, duplicates are dropped
+    while keeping the original order.
+    """
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    seen = set()
+    booking_ids = []
+    for line in lines:
+        booking_id = line.strip()
+        if not booking_id or booking_id.startswith('#') or booking_id in seen:
+            continue
+        seen.add(booking_id)
+        booking_ids.append(booking_id)
+    return booking_ids
+
+
+async def track_one(booking_id, llm, browser_pool, adaptive=False, use_http=True, max_age=None, budget=None):
+    """
+    Track a single booking and wrap the outcome in a JSON-serialisable record.
+    Failures are captured in the record instead of being raised so one bad
+    booking never stops the batch.
+    """
+    started = time.perf_counter()
+    try:
+        lookup = adaptive_tracking if adaptive else lookup_booking
+        minimal = await lookup(booking_id, llm=llm, browser_pool=browser_pool, use_http=use_http, max_age=max_age,
+                               budget=budget)
+        return {
+            'booking_id': booking_id,
+            'status': 'ok',
+            'result': minimal,
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+        }
+    except Exception as e:
+        return {
+            'booking_id': booking_id,
+            'status': 'error',
+            'error': f"{type(e).__name__}: {e}",
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+        }
+
+
+async def run_batch(booking_ids, out, concurrency=DEFAULT_CONCURRENCY, headless=False, adaptive=False,
+                    max_uses=DEFAULT_MAX_USES, use_http=True, max_age=None, by_voyage=False,
+                    budget=None, llm=None):
+    """
+    Run booking IDs through `concurrency` workers, writing one JSON line to
+    `out` as each booking finishes.
+
+    Args:
+        booking_ids: Booking IDs to track
+        out: Text stream the JSON Lines records are written to
+        concurrency: Maximum number of bookings (and warm browser sessions) in flight
+        headless: Whether to run browsers in headless mode
+        adaptive: Use adaptive_tracking() instead of track_shipping()
+        max_uses: Lookups served by a pooled browser before it is relaunched
+        use_http: Try the direct HTTP fast path before the browser
+        max_age: Maximum age in seconds of a cached result to reuse (0 disables the cache)
+        by_voyage: Refresh once per known sailing and share the result with every
+            booking on it, instead of looking up each booking (implies max_age=0)
+        budget: AgentBudget for every browser agent run
+        llm: Optional chat model shared by the batch; the process-wide one is created on the
+            first agent fallback if omitted
+
+    Returns:
+        Tuple of (succeeded, failed) counts
+    """
+    queue = asyncio.Queue()
+    for booking_id in booking_ids:
+        queue.put_nowait(booking_id)
+
+    # One set of warm browsers for the whole batch; the LLM is shared too (see main.get_llm())
+    workers = max(1, min(concurrency, len(booking_ids)))
+    counts = {'ok': 0, 'error': 0}
+    lookup = adaptive_tracking if adaptive else lookup_booking
+
+    def write(record):
+        counts[record['status']] += 1
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        out.flush()
+
+    async def worker(browser_pool):
+        while True:
+            try:
+                booking_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            write(await track_one(booking_id, llm, browser_pool, adaptive=adaptive, use_http=use_http,
+                                  max_age=max_age, budget=budget))
+
+    try:
+        async with BrowserPool(size=workers, headless=headless, max_uses=max_uses) as browser_pool:
+            # Batch work yields the LLM to interactive lookups; voyage refreshes yield to both
+            if by_voyage:
+                async def refresh(booking_id):
+                    with llm_priority(BACKGROUND):
+                        return await lookup(booking_id, llm=llm, browser_pool=browser_pool, use_http=use_http, max_age=0,
+                                            budget=budget)
+
+                lookups = await refresh_voyages(booking_ids, refresh, write, concurrency=workers)
+                print(f"Refreshed {len(booking_ids)} bookings with {lookups} lookups", file=sys.stderr)
+            else:
+                with llm_priority(BATCH):
+                    await asyncio.gather(*(worker(browser_pool) for _ in range(workers)))
+    finally:
+        if 'http_fetcher' in sys.modules:
+            await sys.modules['http_fetcher'].close_fetcher()
+        for quota in scheduler_stats():
+            if quota['requests']:
+                print(f"Gemini key {quota['key']}: {quota['requests']} requests, {quota['tokens']} tokens, "
+                      f"{quota['rate_limited']} rate limited", file=sys.stderr)
+    return counts['ok'], counts['error']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Track many booking IDs concurrently.")
+    parser.add_argument('source', help="File with one booking ID per line, or '-' to read from stdin")
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Number of concurrent browser sessions (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('-o', '--output',
+                        help="JSON Lines output file, or '-' for stdout (default: results/batch_<timestamp>.jsonl)")
+    parser.add_argument('--max-uses', type=int, default=DEFAULT_MAX_USES,
+                        help=f"Lookups per browser before it is relaunched (default: {DEFAULT_MAX_USES})")
+    parser.add_argument('--headless', action='store_true', help="Run browsers in headless mode")
+    parser.add_argument('--adaptive', action='store_true', help="Use adaptive tracking for each booking")
+    parser.add_argument('--no-http', dest='use_http', action='store_false',
+                        help="Skip the direct HTTP fast path and always use the browser")
+    parser.add_argument('--max-age', type=float, default=None,
+                        help="Reuse cached results up to this many seconds old (0 disables the cache)")
+    parser.add_argument('--by-voyage', action='store_true',
+                        help="Refresh ETBs once per known sailing and share them with every booking on it")
+    add_budget_arguments(parser)
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    # Load environment variables from .env
+    load_dotenv()
+    configure_telemetry()
+    booking_ids = read_booking_ids(args.source)
+    if not booking_ids:
+        print("No booking IDs to track.", file=sys.stderr)
+        return
+
+    output = args.output or os.path.join(RESULTS_DIR, f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    if output != '-' and os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    print(f"Tracking {len(booking_ids)} booking IDs with concurrency {args.concurrency}", file=sys.stderr)
+
+    options = dict(concurrency=args.concurrency, headless=args.headless, adaptive=args.adaptive,
+                   max_uses=args.max_uses, use_http=args.use_http, max_age=args.max_age,
+                   by_voyage=args.by_voyage, budget=budget_from_args(args))
+    started = time.perf_counter()
+    if output == '-':
+        # Keep stdout clean for the JSON Lines stream; progress output goes to stderr
+        out = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            ok, failed = await run_batch(booking_ids, out, **options)
+    else:
+        with open(output, 'w', encoding='utf-8') as out:
+            ok, failed = await run_batch(booking_ids, out, **options)
+        print(f"Results written to {output}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ {ok} succeeded, ❌ {failed} failed in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Benchmark for etb_analytics.py over a large synthetic tracking history.
+
+Seeds a result store in a temporary directory with --rows results: bookings
+spread over sailings, each looked up several times while its ETB drifts,
+with some free-form and "Not available" arrival dates mixed in the way the
+agent returns them. It then times three loads of the history into columns:
+cold (no column snapshot yet, every result read and parsed), warm (from the
+snapshot) and incremental (snapshot plus --new results added since), and
+each report. It fails (exit code 1) when the incremental load plus all
+reports take longer than --budget seconds. The cold load is bounded by
+fetching every row from SQLite (about a second for 300,000 results) and is
+reported only.
+
+Usage:
+    python benchmarks/bench_analytics.py
+    python benchmarks/bench_analytics.py --rows 500000 --budget 1.5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from etb_analytics import EtbHistory  # noqa: E402
+from result_store import RESULTS_DB, ResultStore  # noqa: E402
+from tracking_parser import NOT_AVAILABLE  # noqa: E402
+
+VESSELS = ('YM MANDATE', 'HMM ALGECIRAS', 'HYUNDAI PRIDE', 'MSC OSCAR', 'EVER GIVEN', 'ONE APUS', 'YM WELLNESS')
+OBSERVATIONS = 5
+
+
+def seed(store, rows, seed_value=7, recorded=None):
+    """Append `rows` synthetic results, OBSERVATIONS lookups per booking."""
+    rng = random.Random(seed_value)
+    start = datetime(2025, 1, 1)
+    recorded = recorded or time.time() - 90 * 86400
+    sailings = [(vessel, f"{number:04d}{rng.choice('EW')}", start + timedelta(hours=rng.randrange(0, 24 * 180)))
+                for vessel in VESSELS for number in range(rows // (OBSERVATIONS * 40 * len(VESSELS)) + 1)]
+    written = 0
+    booking = 0
+    while written < rows:
+        vessel, voyage, etb = rng.choice(sailings)
+        booking += 1
+        for _ in range(OBSERVATIONS):
+            etb += timedelta(hours=rng.choice((0, 0, 0, 2, 6, 12, 24, -6)))
+            roll = rng.random()
+            if roll < 0.03:
+                arrival = NOT_AVAILABLE
+            elif roll < 0.10:
+                arrival = f"ETB {etb:%Y-%m-%dT%H:%M} (local)"
+            else:
+                arrival = f"{etb:%Y-%m-%d %H:%M}"
+            recorded += 1
+            store.add({'booking_id': f"SINI{booking:08d}", 'vessel_name': vessel, 'voyage_number': voyage,
+                       'arrival_date': arrival}, 'replay', recorded_at=recorded)
+            written += 1
+            if written >= rows:
+                break
+    store.flush()
+
+
+def timed(label, func, results):
+    started = time.perf_counter()
+    value = func()
+    results.append((label, time.perf_counter() - started))
+    return value
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ETB analytics over a synthetic history.")
+    parser.add_argument("--rows", type=int, default=300000, help="Results to seed (default: 300000)")
+    parser.add_argument("--new", type=int, default=5000,
+                        help="Results added before the incremental load (default: 5000)")
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="Seconds allowed for the incremental load plus every report (default: 1.0)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, RESULTS_DB)
+        store = ResultStore(db_path, batch_size=args.rows + 1)
+        started = time.perf_counter()
+        seed(store, args.rows)
+        store.close()
+        print(f"Seeded {args.rows} results in {time.perf_counter() - started:.1f}s")
+
+        loads, timings = [], []
+        timed("cold", lambda: EtbHistory.load(db_path), loads)
+        timed("warm", lambda: EtbHistory.load(db_path), loads)
+        store = ResultStore(db_path, batch_size=args.new + 1)
+        seed(store, args.new, seed_value=11, recorded=time.time())
+        store.close()
+        history = timed("incremental", lambda: EtbHistory.load(db_path), timings)
+        voyages = timed("voyages", history.voyage_report, timings)
+        vessels = timed("vessels", history.vessel_report, timings)
+        timed("delays", history.delay_distribution, timings)
+        window = timed("window", lambda: history.arriving_between('2025-03-01', '2025-03-08'), timings)
+
+    for label, seconds in loads + timings:
+        print(f"{label:<12} {seconds * 1000:>8.1f} ms")
+    total = sum(seconds for _, seconds in timings)
+    print(f"{'total':<12} {total * 1000:>8.1f} ms  ({len(history)} results, {len(voyages)} sailings, "
+          f"{len(vessels)} vessels, {len(window)} bookings in the window)")
+    if total > args.budget:
+        print(f"FAIL: over the {args.budget:.2f}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+End-to-end benchmark that runs without network or a Gemini key.
+
+stub_server.py serves a mock seacargotracking.net and HMM Track & Trace
+from the recorded pages in fixtures/, and fake_llm.ScriptedChatModel plays
+the agent's decisions from benchmarks/scripts/seacargotracking.json. The
+lookups go through the real run_batch(), so track_shipping() (agent mode),
+adaptive_tracking() (recorded once, then replayed) and the HTTP fast path
+are all measured with a real headless browser.
+
+Reported per mode and concurrency level: p50/p95 lookup latency,
+throughput, agent steps and LLM calls per lookup; plus browser launch
+time. Any lookup that fails or returns the wrong vessel fails the run
+(exit code 1). The report is written to results/bench_offline.json.
+
+Needs Playwright's Chromium (`playwright install chromium`); set
+CHROME_PATH to use another browser.
+
+Usage:
+    python benchmarks/bench_offline.py
+    python benchmarks/bench_offline.py --modes agent adaptive --concurrency 1 4 --lookups 16
+    python benchmarks/bench_offline.py --quick
+"""
+import argparse
+import asyncio
+import glob
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# browser-use reads these when it is imported
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+os.environ.setdefault("SKIP_LLM_API_KEY_VERIFICATION", "true")
+
+from stub_server import FIXTURES_DIR, base_url, start_stub_server  # noqa: E402
+
+SCRIPT_FILE = os.path.join(BENCH_DIR, "scripts", "seacargotracking.json")
+REPORT_FILE = os.path.join(REPO_DIR, "results", "bench_offline.json")
+MODES = ("agent", "adaptive", "http")
+
+
+def fixture_answers():
+    """Expected tracking fields for every booking with a fixture, keyed by booking ID."""
+    from http_fetcher import parse_response
+
+    answers = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.*"))):
+        booking_id, extension = os.path.splitext(os.path.basename(path))
+        if booking_id == "not_found":
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            extracted = parse_response('application/json' if extension == '.json' else 'text/html',
+                                       f.read(), booking_id)
+        if extracted:
+            answers[booking_id] = extracted
+    return answers
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def read_run_metrics(offset):
+    """Run metrics records appended to results/run_metrics.jsonl after `offset` bytes."""
+    from run_metrics import METRICS_FILE
+
+    if not os.path.exists(METRICS_FILE):
+        return []
+    with open(METRICS_FILE, 'r', encoding='utf-8') as f:
+        # Rotated since the offset was taken: the records are all in the new file
+        f.seek(offset if os.path.getsize(METRICS_FILE) >= offset else 0)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def metrics_offset():
+    from run_metrics import METRICS_FILE
+
+    return os.path.getsize(METRICS_FILE) if os.path.exists(METRICS_FILE) else 0
+
+
+async def measure_browser_launch(runs):
+    """Seconds to start (and separately close) a fresh headless browser session."""
+    from browser_pool import close_browser_session, new_browser_session, start_browser_session
+
+    launches = []
+    for _ in range(runs):
+        browser_session = new_browser_session(headless=True)
+        started = time.perf_counter()
+        await start_browser_session(browser_session)
+        launches.append(time.perf_counter() - started)
+        await close_browser_session(browser_session)
+    return launches
+
+
+async def run_level(mode, concurrency, booking_ids, llm, answers, budget):
+    """Run one batch and summarise it."""
+    from batch_tracking import run_batch
+
+    offset = metrics_offset()
+    out = io.StringIO()
+    started = time.perf_counter()
+    await run_batch(booking_ids, out, concurrency=concurrency, headless=True, adaptive=mode == 'adaptive',
+                    use_http=mode == 'http', max_age=0, budget=budget, llm=llm)
+    wall = time.perf_counter() - started
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    failures = []
+    for record in records:
+        expected = answers[record['booking_id']]
+        result = record.get('result') or {}
+        if record['status'] != 'ok':
+            failures.append(f"{record['booking_id']}: {record['error']}")
+        elif any(result.get(field) != expected[field] for field in ('vessel_name', 'voyage_number', 'arrival_date')):
+            failures.append(f"{record['booking_id']}: got {result}")
+
+    runs = [run for run in read_run_metrics(offset) if run['path'] in ('agent', 'replay')]
+    steps = [run['steps'] for run in runs if run['steps'] is not None]
+    latencies = [record['elapsed_seconds'] for record in records]
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'lookups': len(records),
+        'ok': len(records) - len(failures),
+        'p50_seconds': round(percentile(latencies, 0.50), 3),
+        'p95_seconds': round(percentile(latencies, 0.95), 3),
+        'wall_seconds': round(wall, 3),
+        'lookups_per_minute': round(len(records) / wall * 60, 1),
+        'steps_per_lookup': round(sum(steps) / len(records), 2) if steps else 0,
+        'llm_calls_per_lookup': round(sum(run['llm_calls'] for run in runs) / len(records), 2),
+        'failures': failures,
+    }
+
+
+async def run_benchmark(args):
+    from fake_llm import ScriptedChatModel, load_script
+    from http_fetcher import close_fetcher
+    from run_metrics import AgentBudget
+    from adaptive_tracking import adaptive_tracking
+
+    answers = fixture_answers()
+    known = sorted(answers)
+    booking_ids = [known[i % len(known)] for i in range(args.lookups)]
+    llm = ScriptedChatModel(script=load_script(args.script), answers=answers, start_url=os.environ["SEACARGO_URL"],
+                            latency=args.llm_latency)
+    # The scripted LLM ignores screenshots, so by default none are taken
+    budget = AgentBudget(use_vision=args.vision, dom_extract=args.dom_extract, action_cache=args.action_cache)
+
+    launches = await measure_browser_launch(args.launches)
+    if launches:
+        print(f"Browser launch: median {statistics.median(launches):.2f}s over {len(launches)} launches")
+
+    levels = []
+    print(f"{'mode':<9} {'conc':>4} {'ok':>7} {'p50 s':>7} {'p95 s':>7} {'per min':>8} {'steps':>6} {'llm':>5}")
+    for mode in args.modes:
+        if mode == 'adaptive':
+            # Record the replay script once, as the first real run would
+            await adaptive_tracking(known[0], headless=True, llm=llm, use_http=False, budget=budget)
+            await close_fetcher()
+        for concurrency in args.concurrency:
+            level = await run_level(mode, concurrency, booking_ids, llm, answers, budget)
+            levels.append(level)
+            print(f"{mode:<9} {concurrency:>4} {level['ok']:>3}/{level['lookups']:<3} {level['p50_seconds']:>7.2f} "
+                  f"{level['p95_seconds']:>7.2f} {level['lookups_per_minute']:>8.1f} "
+                  f"{level['steps_per_lookup']:>6.1f} {level['llm_calls_per_lookup']:>5.1f}")
+            for failure in level['failures']:
+                print(f"  FAIL {failure}")
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'browser_launch_seconds': {
+            'median': round(statistics.median(launches), 3),
+            'max': round(max(launches), 3),
+        } if launches else None,
+        'levels': levels,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tracking end to end against a local mock site.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4],
+                        help="Concurrency levels to run (default: 1 2 4)")
+    parser.add_argument("--lookups", type=int, default=8, help="Lookups per level (default: 8)")
+    parser.add_argument("--launches", type=int, default=3, help="Browser launches to time, 0 to skip (default: 3)")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Seconds the scripted LLM waits per call, to simulate model latency")
+    parser.add_argument("--vision", action="store_true", help="Send screenshots to the (scripted) LLM")
+    parser.add_argument("--no-dom-extract", dest="dom_extract", action="store_false",
+                        help="Let the (scripted) LLM read the results page instead of reading it from the DOM")
+    parser.add_argument("--no-action-cache", dest="action_cache", action="store_false",
+                        help="Ask the (scripted) LLM at every step instead of reusing cached decisions")
+    parser.add_argument("--script", default=SCRIPT_FILE, help="Scripted LLM decisions")
+    parser.add_argument("--output", default=REPORT_FILE, help=f"JSON report (default: {REPORT_FILE})")
+    parser.add_argument("--quick", action="store_true", help="CI smoke run: concurrency 1 and 2, 4 lookups")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.concurrency, args.lookups, args.launches = [1, 2], 4, 1
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.output = os.path.abspath(args.output)
+    args.script = os.path.abspath(args.script)
+
+    server, track_url = start_stub_server()
+    os.environ["SEACARGO_URL"] = base_url(server) + "/"
+    os.environ["HMM_TRACK_URL"] = track_url
+    cwd = os.getcwd()
+    try:
+        # Caches, stored scripts and run metrics all go to a throwaway directory
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                report = asyncio.run(run_benchmark(args))
+            finally:
+                os.chdir(cwd)
+                from result_store import close_result_store
+                close_result_store()
+    finally:
+        server.shutdown()
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+    sys.exit(1 if any(level['failures'] for level in report['levels']) else 0)
+
+
+if __name__ == "__main__":
+    main()
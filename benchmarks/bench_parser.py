@@ -0,0 +1,134 @@
+"""
+Microbenchmark for extract_tracking_fields().
+
+Runs the unified parser in tracking_parser.py and the frozen pre-unification
+parser (legacy_parser.py) over the agent outputs in benchmarks/corpus/ and
+reports calls per second for each, plus any result that differs from
+corpus/expected.json.
+
+Corpus entries that are str() dumps of a browser-use AgentHistoryList are
+benchmarked twice: as the raw string, and rebuilt into a stand-in history
+object the way main.py actually passes them (the legacy parser str()s it,
+the new one walks final_result()/extracted_content()).
+
+Usage:
+    python benchmarks/bench_parser.py
+    python benchmarks/bench_parser.py --seconds 5
+"""
+import argparse
+import contextlib
+import glob
+import json
+import ast
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from legacy_parser import legacy_extract_tracking_fields  # noqa: E402
+from tracking_parser import extract_tracking_fields  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+BOOKING_ID = "SINI25432400"
+
+ACTION_RESULT = re.compile(
+    r"ActionResult\(is_done=(True|False).*?extracted_content=('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|None)"
+)
+
+
+class RecordedHistory:
+    """Stand-in for AgentHistoryList rebuilt from its str() dump."""
+
+    def __init__(self, text):
+        self._text = text
+        self._contents = []
+        self._final = None
+        for is_done, content in ACTION_RESULT.findall(text):
+            content = ast.literal_eval(content)
+            if content is None:
+                continue
+            self._contents.append(content)
+            if is_done == "True":
+                self._final = content
+
+    def final_result(self):
+        return self._final
+
+    def extracted_content(self):
+        return list(self._contents)
+
+    def __str__(self):
+        return self._text
+
+
+def load_corpus():
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            corpus[os.path.basename(path)] = f.read()
+    with open(os.path.join(CORPUS_DIR, "expected.json"), "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    return corpus, expected
+
+
+def calls_per_second(parse, texts, seconds):
+    """Call `parse` over the corpus repeatedly for about `seconds` and return the call rate."""
+    calls = 0
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while time.perf_counter() - started < seconds:
+            for text in texts:
+                parse(text, BOOKING_ID)
+            calls += len(texts)
+    return calls / (time.perf_counter() - started)
+
+
+def check(name, parse, corpus, expected):
+    """Print every corpus entry whose result differs from expected.json."""
+    mismatches = 0
+    with open(os.devnull, "w") as devnull:
+        for filename, text in corpus:
+            with contextlib.redirect_stdout(devnull):
+                result = parse(text, BOOKING_ID)
+            want = dict(expected[filename], booking_id=BOOKING_ID)
+            if result != want:
+                mismatches += 1
+                print(f"  {name} differs on {filename}: {result}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extract_tracking_fields().")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time spent per implementation")
+    args = parser.parse_args()
+
+    corpus, expected = load_corpus()
+    histories = [(filename, RecordedHistory(text)) for filename, text in corpus.items()
+                 if text.startswith("AgentHistoryList(")]
+    inputs = [
+        ("str() input", list(corpus.items())),
+        ("AgentHistoryList input", histories),
+    ]
+    implementations = [
+        ("before (legacy)", legacy_extract_tracking_fields),
+        ("after (tracking_parser)", extract_tracking_fields),
+    ]
+
+    print(f"Corpus: {len(corpus)} agent outputs, {sum(map(len, corpus.values()))} characters")
+    for label, entries in inputs:
+        print(f"\n{label} ({len(entries)} entries)")
+        rates = []
+        for name, parse in implementations:
+            mismatches = check(name, parse, entries, expected)
+            rate = calls_per_second(parse, [value for _, value in entries], args.seconds)
+            rates.append(rate)
+            print(f"  {name:<26} {rate:>12,.0f} calls/s   {len(entries) - mismatches}/{len(entries)} correct")
+        print(f"  Speed-up: {rates[1] / rates[0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Startup benchmark for the CLI entry points.
+
+Runs each entry point in a fresh interpreter with `python -X importtime`
+and reports the wall time, the time spent importing modules and the number
+of modules loaded. It fails (exit code 1) when an entry point goes over its
+import-time budget in startup_budget.json, or when a path that must stay
+light imports browser-use, langchain or Playwright.
+
+The cache-hit run seeds a result cache in a temporary directory and runs
+main.py there, so it measures the path where a booking is answered without
+a browser, an LLM or the network.
+
+Every run is appended to results/bench_startup.jsonl together with the git
+revision, so startup time can be tracked over time.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+BUDGET_FILE = os.path.join(BENCH_DIR, "startup_budget.json")
+HISTORY_FILE = os.path.join(REPO_DIR, "results", "bench_startup.jsonl")
+BOOKING_ID = "SINI25432400"
+
+# Must never be imported on the light paths
+HEAVY_MODULES = ('browser_use', 'langchain', 'langchain_core', 'langchain_google_genai', 'playwright')
+
+# (name, command line arguments, whether heavy modules are forbidden)
+ENTRY_POINTS = [
+    ("import main", ["-c", "import main"], True),
+    ("main.py --help", ["main.py", "--help"], True),
+    ("adaptive_tracking.py --help", ["adaptive_tracking.py", "--help"], True),
+    ("batch_tracking.py --help", ["batch_tracking.py", "--help"], True),
+    ("main.py cache hit", ["main.py", BOOKING_ID], True),
+]
+
+
+def seed_cache(directory):
+    """Create a result cache under `directory` holding a fresh result for BOOKING_ID."""
+    from result_cache import ResultCache, TRACKING_DB
+
+    cache = ResultCache(os.path.join(directory, TRACKING_DB))
+    cache.put({
+        'booking_id': BOOKING_ID,
+        'vessel_name': 'YM MANDATE',
+        'voyage_number': '0096W',
+        'arrival_date': '2025-06-03 08:00',
+    })
+    cache.close()
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        Tuple of (total import time in ms, set of imported module names)
+    """
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        modules.add(name.strip())
+        # Only top-level imports; their cumulative time already includes nested ones
+        if not name[1:].startswith(' '):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def run_entry_point(args, cwd, env):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    import_ms, modules = parse_importtime(completed.stderr)
+    return completed.returncode, wall_ms, import_ms, modules
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup time.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per entry point; the median is reported")
+    parser.add_argument("--no-history", action="store_true", help=f"Do not append to {HISTORY_FILE}")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE, 'r', encoding='utf-8') as f:
+        budget = json.load(f)
+
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="1")
+    results = []
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_cache(workdir)
+        print(f"{'entry point':<30} {'wall ms':>9} {'import ms':>10} {'budget':>8} {'modules':>8}")
+        for name, entry_args, light in ENTRY_POINTS:
+            entry_args = [os.path.join(REPO_DIR, arg) if arg.endswith('.py') else arg for arg in entry_args]
+            runs = [run_entry_point(entry_args, workdir, env) for _ in range(max(1, args.runs))]
+            returncode, _, _, modules = runs[-1]
+            wall_ms = statistics.median(run[1] for run in runs)
+            import_ms = statistics.median(run[2] for run in runs)
+            heavy = sorted(module for module in modules if module.split('.')[0] in HEAVY_MODULES)
+            limit = budget.get(name)
+
+            problems = []
+            if returncode != 0:
+                problems.append(f"exit code {returncode}")
+            if limit is not None and import_ms > limit:
+                problems.append(f"over budget by {import_ms - limit:.0f} ms")
+            if light and heavy:
+                problems.append(f"imports {', '.join(sorted({module.split('.')[0] for module in heavy}))}")
+            failed = failed or bool(problems)
+
+            print(f"{name:<30} {wall_ms:>9.0f} {import_ms:>10.0f} {limit if limit is not None else '-':>8} "
+                  f"{len(modules):>8}  {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+            results.append({
+                'entry_point': name,
+                'wall_ms': round(wall_ms, 1),
+                'import_ms': round(import_ms, 1),
+                'modules': len(modules),
+                'budget_ms': limit,
+                'ok': not problems,
+            })
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'timestamp': datetime.now().isoformat(),
+                'revision': git_revision(),
+                'python': sys.version.split()[0],
+                'results': results,
+            }) + '\n')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
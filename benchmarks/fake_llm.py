@@ -0,0 +1,160 @@
+"""
+Scripted stand-in for the Gemini chat model, used by the offline benchmark.
+
+ScriptedChatModel plays back the decisions a real agent run makes on the
+tracking site: each rule in a script matches the page the browser is on
+(by URL) and gives the actions to take there. Element indexes are not
+recorded, they are resolved on every step from the element list in the
+agent's state message, so the script keeps working when a page layout
+shifts. The final `done` action is filled from per-booking answers.
+
+A script is a JSON file such as benchmarks/scripts/seacargotracking.json:
+
+    {"rules": [
+        {"url": "/hmm$", "goal": "Search for the booking",
+         "actions": [{"input_text": {"index": "@srchBkgNo1", "text": "{booking_id}"}},
+                     {"click_element_by_index": {"index": "@Search"}}]},
+        ...
+    ]}
+
+Strings starting with "@" become the index of the first interactive element
+whose line contains the rest of the string; "{name}" placeholders are filled
+from start_url, booking_id and the booking's answers (vessel_name,
+voyage_number, arrival_date).
+"""
+import asyncio
+import json
+import re
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import Field, PrivateAttr, ValidationError
+
+from llm_scheduler import estimate_tokens
+
+CURRENT_URL = re.compile(r'^Current url: (\S+)', re.MULTILINE)
+BOOKING_ID = re.compile(r"booking ID '([^']+)'")
+ELEMENT = re.compile(r'^\s*\*?\[(\d+)\]<(.*)$')
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+class ScriptError(Exception):
+    """Raised when the script has no decision for the current page."""
+
+
+def _text(message):
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return '\n'.join(part.get('text', '') for part in content if isinstance(part, dict))
+
+
+def element_index(state, needle):
+    """Index of the first interactive element whose line contains `needle` (case-insensitive)."""
+    needle = needle.lower()
+    for line in state.splitlines():
+        match = ELEMENT.match(line)
+        if match and needle in match.group(2).lower():
+            return int(match.group(1))
+    raise ScriptError(f"No element matching '{needle}' on the page")
+
+
+def load_script(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that answers browser-use agent steps from a script.
+
+    Args:
+        script: Parsed script with a list of rules
+        answers: Dict of booking ID to the fields to report in the done action
+        start_url: Substituted for {start_url}
+        latency: Seconds to wait per call, to stand in for model think time
+    """
+
+    script: dict
+    answers: dict = Field(default_factory=dict)
+    start_url: str = ''
+    latency: float = 0.0
+    model_name: str = 'scripted'
+
+    # Read by browser-use: skip its API key check and tool calling probe
+    _verified_api_keys = PrivateAttr(default=True)
+    _verified_tool_calling_method = PrivateAttr(default='function_calling')
+
+    @property
+    def _llm_type(self):
+        return 'scripted'
+
+    def decide(self, messages):
+        """Build the agent output (current_state and actions) for the latest state message."""
+        state = _text(messages[-1])
+        url_match = CURRENT_URL.search(state)
+        url = url_match.group(1) if url_match else ''
+        booking_match = BOOKING_ID.search('\n'.join(_text(message) for message in messages))
+        booking_id = booking_match.group(1) if booking_match else ''
+
+        for rule in self.script['rules']:
+            if re.search(rule['url'], url):
+                break
+        else:
+            raise ScriptError(f"No scripted decision for {url or 'an unknown page'}")
+
+        values = {'start_url': self.start_url, 'booking_id': booking_id, **self.answers.get(booking_id, {})}
+
+        def fill(value):
+            if isinstance(value, dict):
+                return {key: fill(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [fill(item) for item in value]
+            if isinstance(value, str) and value.startswith('@'):
+                return element_index(state, value[1:])
+            if isinstance(value, str):
+                return PLACEHOLDER.sub(lambda m: str(values.get(m.group(1), m.group(0))), value)
+            return value
+
+        return {
+            'current_state': {
+                'evaluation_previous_goal': 'Unknown',
+                'memory': f"Tracking booking {booking_id}",
+                'next_goal': rule.get('goal', ''),
+            },
+            'action': fill(rule['actions']),
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = json.dumps(self.decide(messages))
+        input_tokens = estimate_tokens(messages)
+        output_tokens = len(content) // 4
+        message = AIMessage(content=content, usage_metadata={
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._generate(messages, stop, run_manager, **kwargs)
+
+    def with_structured_output(self, schema, *, include_raw=False, **kwargs):
+        """Parse the scripted JSON into `schema`, in the shape browser-use expects."""
+
+        def parse(message):
+            try:
+                parsed, error = schema.model_validate_json(message.content), None
+            except ValidationError as e:
+                parsed, error = None, e
+            if include_raw:
+                return {'raw': message, 'parsed': parsed, 'parsing_error': error}
+            if error is not None:
+                raise error
+            return parsed
+
+        return self | RunnableLambda(parse)
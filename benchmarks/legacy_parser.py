@@ -0,0 +1,142 @@
+"""
+Frozen copy of the extract_tracking_fields() that main.py shipped before the
+parser was unified in tracking_parser.py. Kept only as the "before" side of
+bench_parser.py; do not use it in the tracker.
+"""
+import json
+import re
+
+
+def legacy_extract_tracking_fields(result, booking_id):
+    """
+    Extract booking_id, vessel_name, voyage_number, and arrival_date from agent result.
+    Accepts either a string or dict result.
+    Returns a dict with only those fields.
+    """
+    print(f"\nDEBUG: Result type: {type(result)}")
+    print(f"DEBUG: Result content: {result[:500]}..." if isinstance(result, str) else f"DEBUG: Result content: {result}")
+    
+    # Initialize return structure
+    extracted = {
+        'booking_id': booking_id,
+        'vessel_name': 'Not available',
+        'voyage_number': 'Not available',
+        'arrival_date': 'Not available'
+    }
+    
+    # If input is a dict, try to handle nested structures first
+    if isinstance(result, dict):
+        # Check for result/raw_result nesting
+        for key in ['result', 'raw_result', 'data']:
+            if key in result:
+                nested_result = legacy_extract_tracking_fields(result[key], booking_id)
+                if nested_result['vessel_name'] != 'Not available':
+                    return nested_result
+        
+        # Try direct vessel_voyage structure
+        if 'vessel_voyage' in result and isinstance(result['vessel_voyage'], list) and result['vessel_voyage']:
+            v = result['vessel_voyage'][0]
+            if 'vessel_name' in v:
+                extracted['vessel_name'] = v.get('vessel_name')
+                extracted['voyage_number'] = v.get('voyage_number', 'Not available')
+                # Handle different date field names
+                for date_key in ['arrival_date_time', 'arrival_date', 'etb']:
+                    if date_key in v and v[date_key]:
+                        extracted['arrival_date'] = v[date_key]
+                        break
+                if any(val != 'Not available' for val in extracted.values()):
+                    return extracted
+    
+    # Convert to string for pattern matching
+    text = str(result)
+    
+    # Try each pattern in order of reliability
+    
+    # 1. Look for structured vessel_voyage JSON pattern
+    vessel_voyage_match = re.search(r'"vessel_voyage":\s*\[\s*\{[^}]*"vessel_name":\s*"([^"]+)"[^}]*"voyage_number":\s*"([^"]+)"[^}]*"(?:arrival_date_time|arrival_date|etb)":\s*"([^"]+)"', text)
+    if vessel_voyage_match:
+        print("DEBUG: Found vessel_voyage JSON pattern")
+        vessel_name, voyage_num, arr_date = vessel_voyage_match.groups()
+        if vessel_name and voyage_num and arr_date:
+            return {
+                'booking_id': booking_id,
+                'vessel_name': vessel_name,
+                'voyage_number': voyage_num,
+                'arrival_date': arr_date
+            }
+    
+    # 2. Look for JSON code blocks
+    json_blocks = re.finditer(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text)
+    for match in json_blocks:
+        try:
+            data = json.loads(match.group())
+            # Check various JSON structures we might encounter
+            if 'vessel_voyage' in data and isinstance(data['vessel_voyage'], list) and data['vessel_voyage']:
+                v = data['vessel_voyage'][0]
+                if 'vessel_name' in v:
+                    print("DEBUG: Found vessel_voyage in JSON block")
+                    extracted['vessel_name'] = v.get('vessel_name')
+                    extracted['voyage_number'] = v.get('voyage_number', 'Not available')
+                    # Try different date field names
+                    for date_key in ['arrival_date_time', 'arrival_date', 'etb']:
+                        if date_key in v and v[date_key]:
+                            extracted['arrival_date'] = v[date_key]
+                            break
+                    if extracted['vessel_name'] != 'Not available':
+                        return extracted
+            # Alternative structure
+            elif all(key in data for key in ['vessel_name', 'voyage_number']):
+                print("DEBUG: Found direct fields in JSON block")
+                extracted['vessel_name'] = data.get('vessel_name')
+                extracted['voyage_number'] = data.get('voyage_number')
+                # Try different date field names
+                for date_key in ['arrival_date_time', 'arrival_date', 'etb']:
+                    if date_key in data and data[date_key]:
+                        extracted['arrival_date'] = data[date_key]
+                        break
+                if extracted['vessel_name'] != 'Not available':
+                    return extracted
+        except json.JSONDecodeError:
+            continue
+    
+    # 3. Try to extract from table format
+    # Matches vessel name and voyage number in various formats
+    vessel_row = re.search(
+        r'\|\s*([A-Z0-9\- ]+?)(?:\s+(\d{4,5}[A-Z]))?[^|]*\|[^|]*\|[^|]*\|[^|]*\|[^|]*\|\s*(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2})',
+        text
+    )
+    if vessel_row:
+        print("DEBUG: Found vessel info in table format")
+        vessel_name = vessel_row.group(1).strip()
+        # Group 2 might be None if voyage number wasn't in expected format
+        voyage_number = vessel_row.group(2) if vessel_row.group(2) else 'Not available'
+        arrival_date = vessel_row.group(3).strip()
+        if vessel_name and arrival_date:
+            return {
+                'booking_id': booking_id,
+                'vessel_name': vessel_name,
+                'voyage_number': voyage_number,
+                'arrival_date': arrival_date
+            }
+    
+    # 4. Look for plaintext patterns
+    # Vessel name patterns like "vessel name is YM MANDATE" or "Vessel Name: YM MANDATE"
+    vessel_name_match = re.search(r'(?:vessel\s+name\s+is|Vessel\s+Name:?)\s+([A-Z0-9\- ]+)', text)
+    voyage_num_match = re.search(r'(?:voyage\s+number\s+is|Voyage\s+Number:?)\s+([A-Z0-9\-]+)', text)
+    arrival_date_match = re.search(r'(?:arrival\s+date(?:\s+and\s+time)?\s+is|Arrival\s+Date\s+and\s+Time\s*(?:\(ETB\))?:?)\s+(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2})', text)
+    
+    if vessel_name_match:
+        extracted['vessel_name'] = vessel_name_match.group(1).strip()
+    if voyage_num_match:
+        extracted['voyage_number'] = voyage_num_match.group(1).strip()
+    if arrival_date_match:
+        extracted['arrival_date'] = arrival_date_match.group(1).strip()
+    
+    # Only return if we found something
+    if any(val != 'Not available' for val in extracted.values()):
+        print("DEBUG: Found values in plaintext")
+        return extracted
+    
+    # If we got here, we couldn't extract the data reliably
+    print("DEBUG: No reliable data found, returning default values")
+    return extracted
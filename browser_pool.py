@@ -0,0 +1,283 @@
+"""
+Pool of warm browser sessions shared by main.py and adaptive_tracking.py.
+
+Starting Chrome, creating a profile and doing the TLS handshake with
+seacargotracking.net costs more than most lookups themselves. The pool keeps
+`size` sessions started and hands each lookup a clean tab on one of them.
+A session is recycled after `max_uses` lookups or as soon as it stops
+responding. Sessions are launched on the first borrow (or by an explicit
+start()), so runs answered entirely from the cache never start Chrome.
+
+Usage:
+    async with BrowserPool(size=4, headless=True) as pool:
+        async with pool.session() as browser_session:
+            agent = Agent(task=task, llm=llm, browser_session=browser_session)
+            await agent.run()
+"""
+import asyncio
+import contextlib
+import os
+from urllib.parse import urlsplit
+
+from telemetry import span
+
+# Chrome install used by the tracker, override with CHROME_PATH in .env
+DEFAULT_CHROME_PATH = 'C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe'
+VIEWPORT_SIZE = {"width": 1920, "height": 1080}
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_USES = 25
+HEALTH_CHECK_TIMEOUT = 5.0
+RELAUNCH_DELAY = 2.0
+RELAUNCH_ATTEMPTS = 3
+
+# Never needed to read a schedule table: aborted before they are downloaded
+# unless BROWSER_BLOCK_RESOURCES=false
+BLOCKED_RESOURCE_TYPES = frozenset({'image', 'media', 'font'})
+BLOCKED_HOSTS = (
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com', 'google-analytics.com',
+    'googletagmanager.com', 'facebook.net', 'scorecardresearch.com', 'adnxs.com', 'criteo.com',
+    'taboola.com', 'outbrain.com', 'amazon-adsystem.com',
+)
+
+
+def chrome_path():
+    """
+    Chrome executable to launch: CHROME_PATH, else the default install if it
+    exists, else None so Playwright's bundled Chromium is used (Linux CI).
+    """
+    path = os.getenv("CHROME_PATH")
+    if path:
+        return path
+    return DEFAULT_CHROME_PATH if os.path.exists(DEFAULT_CHROME_PATH) else None
+
+
+def new_browser_session(headless=False, keep_alive=False):
+    """
+    Create (but do not start) a browser session with the tracker's settings.
+
+    Args:
+        headless: Whether to run browser in headless mode
+        keep_alive: Keep the browser open when an Agent finishes with it
+    """
+    # browser-use (and Playwright) are only imported once a browser is needed
+    from browser_use import BrowserSession
+    return BrowserSession(
+        executable_path=chrome_path(),
+        headless=headless,
+        viewport_size=VIEWPORT_SIZE,
+        keep_alive=keep_alive,
+    )
+
+
+def blocking_enabled():
+    return os.getenv("BROWSER_BLOCK_RESOURCES", "true").strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def _is_blocked(request):
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlsplit(request.url).hostname or ''
+    return any(host == blocked or host.endswith('.' + blocked) for blocked in BLOCKED_HOSTS)
+
+
+async def _route_request(route):
+    try:
+        if _is_blocked(route.request):
+            await route.abort()
+        else:
+            await route.continue_()
+    except Exception:
+        # The page (or the whole context) closed while the request was in flight
+        pass
+
+
+async def start_browser_session(browser_session):
+    """
+    Start a session and stop it from downloading images, fonts, media and ad
+    or analytics scripts, which slow every page load but never carry tracking data.
+    """
+    with span('browser.start', headless=bool(browser_session.browser_profile.headless)):
+        await browser_session.start()
+        if blocking_enabled():
+            await browser_session.browser_context.route('**/*', _route_request)
+    return browser_session
+
+
+async def close_browser_session(browser_session):
+    """Close a session even if it was created with keep_alive."""
+    try:
+        browser_session.browser_profile.keep_alive = False
+        await browser_session.close()
+    except Exception as e:
+        print(f"Warning: Error closing browser session: {e}")
+
+
+class _EmptySlot:
+    """Holds a session's place in the pool after it could not be relaunched."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class BrowserPool:
+    """
+    Keeps a fixed number of started browser sessions and lends them out one
+    lookup at a time.
+
+    Args:
+        size: Number of warm sessions to keep
+        headless: Whether to run browsers in headless mode
+        max_uses: Lookups served by a session before it is replaced
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, headless=False, max_uses=DEFAULT_MAX_USES):
+        self.size = max(1, size)
+        self.headless = headless
+        self.max_uses = max(1, max_uses)
+        self._idle = asyncio.Queue()
+        self._uses = {}
+        self._replacements = set()
+        self._closed = False
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        """Launch all sessions concurrently so the following lookups find them warm."""
+        async with self._start_lock:
+            if self._started:
+                return
+            results = await asyncio.gather(*(self._launch() for _ in range(self.size)), return_exceptions=True)
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                # Leave nothing running; the next borrow tries again from scratch
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        self._uses.pop(id(result), None)
+                        await close_browser_session(result)
+                raise errors[0]
+            for browser_session in results:
+                self._idle.put_nowait(browser_session)
+            self._started = True
+
+    async def _launch(self):
+        browser_session = new_browser_session(headless=self.headless, keep_alive=True)
+        try:
+            await start_browser_session(browser_session)
+        except BaseException:
+            await close_browser_session(browser_session)
+            raise
+        self._uses[id(browser_session)] = 0
+        return browser_session
+
+    async def _replace(self, browser_session):
+        """
+        Close a worn out or broken session and put a fresh one in its place.
+        After RELAUNCH_ATTEMPTS failures an _EmptySlot takes its place instead,
+        so that a waiting borrower gets the launch error rather than waiting forever.
+        """
+        self._uses.pop(id(browser_session), None)
+        await close_browser_session(browser_session)
+        for attempt in range(1, RELAUNCH_ATTEMPTS + 1):
+            if self._closed:
+                return
+            try:
+                fresh = await self._launch()
+            except Exception as e:
+                print(f"Warning: Could not relaunch pooled browser (attempt {attempt}/{RELAUNCH_ATTEMPTS}): {e}")
+                if attempt == RELAUNCH_ATTEMPTS:
+                    self._idle.put_nowait(_EmptySlot(e))
+                else:
+                    await asyncio.sleep(RELAUNCH_DELAY)
+                continue
+            if self._closed:
+                await close_browser_session(fresh)
+            else:
+                self._idle.put_nowait(fresh)
+            return
+
+    async def _fill(self):
+        """Launch a session into an empty slot, or raise the launch error and keep the slot empty."""
+        try:
+            return await self._launch()
+        except Exception as e:
+            self._idle.put_nowait(_EmptySlot(e))
+            raise
+
+    def _schedule_replacement(self, browser_session):
+        # Relaunching happens in the background so it never adds to a lookup's latency
+        task = asyncio.create_task(self._replace(browser_session))
+        self._replacements.add(task)
+        task.add_done_callback(self._replacements.discard)
+
+    @staticmethod
+    async def _is_healthy(browser_session):
+        try:
+            if not browser_session.initialized or browser_session.browser_context is None:
+                return False
+            page = await browser_session.get_current_page()
+            await asyncio.wait_for(page.evaluate("1"), HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _clean_tab(browser_session):
+        """Open a blank tab for the next lookup and close everything else."""
+        context = browser_session.browser_context
+        await context.clear_cookies()
+        page = await browser_session.create_new_tab()
+        for other in list(context.pages):
+            if other is not page:
+                await other.close()
+        return page
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        """
+        Borrow a warm session with a single clean tab for one lookup.
+        Waits if every session is busy, and raises the launch error if the
+        session it gets could not be relaunched and fails to launch again.
+        """
+        if self._closed:
+            raise RuntimeError("BrowserPool is closed")
+        await self.start()
+
+        while True:
+            browser_session = await self._idle.get()
+            if isinstance(browser_session, _EmptySlot):
+                browser_session = await self._fill()
+            if await self._is_healthy(browser_session):
+                try:
+                    await self._clean_tab(browser_session)
+                    break
+                except Exception as e:
+                    print(f"Warning: Could not prepare pooled browser tab: {e}")
+            self._schedule_replacement(browser_session)
+
+        try:
+            yield browser_session
+        finally:
+            self._uses[id(browser_session)] = self._uses.get(id(browser_session), 0) + 1
+            if self._closed:
+                await close_browser_session(browser_session)
+            elif self._uses[id(browser_session)] >= self.max_uses or not await self._is_healthy(browser_session):
+                self._schedule_replacement(browser_session)
+            else:
+                self._idle.put_nowait(browser_session)
+
+    async def close(self):
+        """Close every idle session and wait for pending relaunches."""
+        self._closed = True
+        if self._replacements:
+            await asyncio.gather(*self._replacements, return_exceptions=True)
+        while not self._idle.empty():
+            browser_session = self._idle.get_nowait()
+            if not isinstance(browser_session, _EmptySlot):
+                await close_browser_session(browser_session)
@@ -0,0 +1,73 @@
+"""
+Carrier adapters and the router that picks one for a booking.
+
+Each carrier gets its own cheapest path: a direct HTTP fetch where it has
+one (HMM), a recorded replay script per carrier, and the LLM browser agent
+with carrier-specific instructions as the last resort. Bookings are routed
+by their B/L or booking number prefix (the carrier's SCAC code, e.g. EGLV
+for Evergreen); anything unrecognised goes to the default carrier, HMM, or
+to TRACKING_CARRIER if set.
+
+Usage:
+    from carriers import carrier_for
+    carrier = carrier_for("EGLV123456789")
+    print(carrier.task("EGLV123456789"))
+"""
+import os
+import re
+
+from carriers.base import DEFAULT_START_URL, BookingNotFound, Carrier, start_url
+from carriers.hmm import HMMCarrier
+
+# Voyage numbers of most lines: letters and digits with at least one digit,
+# optionally in two parts ("0523-036W", "0MXK3W1MA", "2415")
+GENERIC_VOYAGE = re.compile(r'^(?=[A-Z0-9-]*\d)[A-Z0-9]{2,10}(?:-[A-Z0-9]{2,6})?$')
+
+DEFAULT_CARRIER = "HMM"
+
+_carriers = {}
+
+
+def register(carrier):
+    """Add a carrier adapter to the router, replacing one with the same code."""
+    _carriers[carrier.code.upper()] = carrier
+    return carrier
+
+
+def get_carrier(code):
+    """Return the adapter registered under `code`, raising KeyError if there is none."""
+    try:
+        return _carriers[code.upper()]
+    except KeyError:
+        raise KeyError(f"Unknown carrier '{code}', expected one of {', '.join(sorted(_carriers))}") from None
+
+
+def carriers():
+    """All registered adapters."""
+    return list(_carriers.values())
+
+
+def carrier_for(booking_id):
+    """Pick the carrier for a booking by its longest matching prefix, falling back to the default carrier."""
+    best = max(_carriers.values(), key=lambda carrier: carrier.matches(booking_id))
+    if best.matches(booking_id):
+        return best
+    return get_carrier(os.getenv("TRACKING_CARRIER", DEFAULT_CARRIER))
+
+
+register(HMMCarrier())
+register(Carrier("YML", "Yang Ming", ("YMLU", "YMJA"), vessel_example="YM WELLNESS", voyage_example="093W",
+                 voyage_pattern=GENERIC_VOYAGE))
+register(Carrier("EMC", "Evergreen", ("EGLV", "EISU"), vessel_example="EVER ACE", voyage_example="0523-036W",
+                 voyage_pattern=GENERIC_VOYAGE))
+register(Carrier("ONE", "ONE (Ocean Network Express)", ("ONEY", "ONEU"), vessel_example="ONE INNOVATION",
+                 voyage_example="014W", voyage_pattern=GENERIC_VOYAGE))
+register(Carrier("MSK", "Maersk", ("MAEU", "MSKU"), vessel_example="MAERSK ESSEX", voyage_example="418W",
+                 voyage_pattern=GENERIC_VOYAGE))
+register(Carrier("CMA", "CMA CGM", ("CMDU", "CMAU"), vessel_example="CMA CGM JACQUES SAADE",
+                 voyage_example="0MXK3W1MA", voyage_pattern=GENERIC_VOYAGE))
+
+__all__ = [
+    'BookingNotFound', 'Carrier', 'DEFAULT_CARRIER', 'DEFAULT_START_URL', 'GENERIC_VOYAGE', 'HMMCarrier',
+    'carrier_for', 'carriers', 'get_carrier', 'register', 'start_url',
+]
@@ -0,0 +1,127 @@
+"""
+The carrier adapter interface.
+
+A Carrier describes how to track one shipping line's bookings: where the
+browser agent starts and which form it fills in, an optional direct HTTP
+fast path, how its results tables and voyage numbers are parsed, and the
+file its recorded replay script is kept in.
+"""
+import os
+
+from tracking_parser import fields_from_tables
+
+# Where the agent starts; SEACARGO_URL points it at a mirror or the offline stub site
+DEFAULT_START_URL = "http://www.seacargotracking.net/"
+STORAGE_DIR = "interactions"
+
+
+class BookingNotFound(Exception):
+    """Raised by Carrier.fetch() when the carrier answered that it has no schedule for the booking."""
+
+
+def start_url():
+    """The tracking site the agent starts from, read at call time so tests can redirect it."""
+    return os.getenv("SEACARGO_URL") or DEFAULT_START_URL
+
+
+class Carrier:
+    """
+    Tracking adapter for one shipping line, reached through seacargotracking.net.
+
+    Subclasses (or instances) set:
+        code: Short carrier code, also used for the replay script file name
+        name: Name shown on the tracking site, e.g. "HMM (Hyundai Merchant Marine)"
+        prefixes: Booking / B/L number prefixes routed to this carrier
+        form_steps: How the agent reaches and submits the carrier's tracking form
+        vessel_example, voyage_example: Shown to the agent as the expected format
+        voyage_pattern: Compiled regex for the carrier's voyage numbers, None for HMM's
+        has_fast_path: Whether fetch() is implemented
+    """
+
+    code = None
+    name = None
+    prefixes = ()
+    form_steps = """Search for Track & Trace and click on it:
+            - Input booking ID in search or B/L No. field
+            - Click on Search button"""
+    vessel_example = "YM MANDATE"
+    voyage_example = "0096W"
+    voyage_pattern = None
+    has_fast_path = False
+
+    def __init__(self, code=None, name=None, prefixes=None, **overrides):
+        self.code = code or self.code
+        self.name = name or self.name
+        self.prefixes = tuple(prefixes if prefixes is not None else self.prefixes)
+        for attribute, value in overrides.items():
+            if not hasattr(self, attribute):
+                raise TypeError(f"Unknown carrier attribute '{attribute}'")
+            setattr(self, attribute, value)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.code}>"
+
+    @property
+    def storage_file(self):
+        """Stored result and replay script of the last successful agent run for this carrier."""
+        return os.path.join(STORAGE_DIR, f"{self.code.lower()}_tracking_interactions.json")
+
+    def start_url(self):
+        return start_url()
+
+    def task(self, booking_id):
+        """Instructions for a browser agent run from scratch."""
+        return f"""
+        Track {self.code} shipping container with booking ID '{booking_id}':
+
+        1. Go to {self.start_url()}
+        2. Look for {self.name} or similar options
+        3. {self.form_steps}
+        4. Scrape the full page content and extract:
+            - Vessel name (e.g., {self.vessel_example})
+            - Voyage number from vessel name format (e.g., {self.voyage_example})
+            - Arrival date with time from ETB (Estimated Time of Berthing)
+
+    Finish with the done action, filling vessel_voyage with one entry per
+    vessel schedule row (arrival_date_time as YYYY-MM-DD HH:MM).
+    """
+
+    def adaptive_task(self, booking_id):
+        """Instructions for an agent run that falls back from a failed replay."""
+        return f"""
+    Using the previous successful interactions with seacargotracking.net, retrieve the voyage number and arrival date for {self.code} booking ID '{booking_id}':
+
+    1. Go to {self.start_url()}
+    2. Look for {self.name} or similar options
+    3. {self.form_steps}
+    4. Scrape the full page content and extract:
+        - Vessel name and voyage number from vessel name format (e.g., {self.vessel_example} {self.voyage_example})
+        - Arrival date with time from ETB (Estimated Time of Berthing)
+
+    Finish with the done action, filling vessel_voyage with one entry per
+    vessel schedule row. If any information cannot be found, set the value to "Not available".
+
+    Note: If the website structure has changed, adapt your approach accordingly.
+    """
+
+    def matches(self, booking_id):
+        """Length of the longest prefix of `booking_id` routed to this carrier, 0 if none."""
+        booking_id = booking_id.strip().upper()
+        return max((len(prefix) for prefix in self.prefixes if booking_id.startswith(prefix)), default=0)
+
+    async def fetch(self, booking_id):
+        """
+        Direct HTTP fast path.
+
+        Returns:
+            Tracking fields dict, or None if the browser should be used instead
+
+        Raises:
+            BookingNotFound: If the carrier answered that it does not know the booking;
+                the fast path worked, the booking is the problem
+        """
+        return None
+
+    def parse_tables(self, tables, booking_id):
+        """Read the tracking fields from the tables of a results page, or None."""
+        return fields_from_tables(tables, booking_id, self.voyage_pattern)
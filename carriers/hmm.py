@@ -0,0 +1,19 @@
+"""
+HMM (Hyundai Merchant Marine): the carrier the tracker was built for, with
+the direct HTTP fast path to its Track & Trace endpoint (http_fetcher.py).
+"""
+from carriers.base import Carrier
+
+
+class HMMCarrier(Carrier):
+    code = "HMM"
+    name = "HMM (Hyundai Merchant Marine)"
+    # HMM bookings start with the booking office's location code (e.g. SINI
+    # for Singapore), so anything not claimed by another carrier is HMM's
+    prefixes = ("HDMU",)
+    has_fast_path = True
+
+    async def fetch(self, booking_id):
+        # httpx is only imported once the fast path is actually tried
+        from http_fetcher import fetch_tracking
+        return await fetch_tracking(booking_id)
@@ -0,0 +1,73 @@
+"""
+Finish an agent run from the DOM as soon as the results table is on screen.
+
+Without this the agent reaches the results page and then spends one or more
+further steps, each with a full screenshot and element tree, asking the
+model to "scrape the full page content". DomExtractor is passed to
+Agent.run() as its on_step_end hook: after every step it reads the tables of
+the current page, and once the carrier's parser finds a vessel schedule it
+records a successful `done` result with a TrackingOutput built from the
+table, which ends the run before the next model call.
+
+The recorded run is indistinguishable from one where the model called
+`done` itself, so result_fields(), record_script() and the run metrics work
+unchanged.
+"""
+from replay import TABLES_JS
+from tracking_parser import NOT_AVAILABLE
+
+
+class DomExtractor:
+    """
+    on_step_end hook reading the tracking fields straight from the page.
+
+    Args:
+        booking_id: The booking being tracked
+        carrier: Carrier adapter whose parse_tables() reads the results table
+        metrics: Optional RunMetrics to mark as DOM-extracted
+    """
+
+    def __init__(self, booking_id, carrier, metrics=None):
+        self.booking_id = booking_id
+        self.carrier = carrier
+        self.metrics = metrics
+        self.extracted = None
+
+    async def _read_page(self, agent):
+        try:
+            page = await agent.browser_session.get_current_page()
+            tables = await page.evaluate(TABLES_JS)
+        except Exception:
+            # Mid-navigation or a closed tab; try again after the next step
+            return None
+        extracted = self.carrier.parse_tables(tables, self.booking_id)
+        if not extracted or extracted['vessel_name'] == NOT_AVAILABLE:
+            return None
+        return extracted
+
+    async def __call__(self, agent):
+        history = agent.state.history
+        if self.extracted is not None or not history.history or history.is_done():
+            return
+        extracted = await self._read_page(agent)
+        if extracted is None:
+            return
+
+        from browser_use.agent.views import ActionResult
+        from tracking_models import TrackingOutput, VesselVoyage
+
+        output = TrackingOutput(vessel_voyage=[VesselVoyage(
+            vessel_name=extracted['vessel_name'],
+            voyage_number=extracted['voyage_number'],
+            arrival_date_time=extracted['arrival_date'],
+        )])
+        history.history[-1].result.append(ActionResult(
+            is_done=True,
+            success=True,
+            extracted_content=output.model_dump_json(),
+            include_in_memory=True,
+        ))
+        self.extracted = extracted
+        if self.metrics is not None:
+            self.metrics.dom_extracted = True
+        print(f"✅ Read the vessel schedule for {self.booking_id} from the page, skipping further model steps")
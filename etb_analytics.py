@@ -0,0 +1,459 @@
+"""
+ETB analytics over the whole tracking history, computed with NumPy.
+
+The result store (result_store.py) keeps every lookup, but its arrival_date
+is whatever string the parser or the agent returned ("2025-07-03 14:00",
+"2025-07-03", "ETB 2025-07-03T14:00 (local)", "Not available"). This module
+keeps the history as columns: booking and sailing codes, the ETB as
+datetime64[m] (NaT where the string holds no date) and the time recorded.
+Each distinct arrival string is parsed once. The columns are saved beside
+the results database (results.columns.npz), so a later run only reads and
+parses the results added since. The reports are computed on whole arrays
+instead of row by row:
+
+    voyages   ETB slippage per sailing: first and latest ETB seen, and the
+              distribution of the per-booking slippage
+    vessels   The same distribution over all voyages of each vessel
+    delays    Histogram of the per-booking slippage in hours
+    window    Bookings whose latest ETB falls in a time window
+
+A booking's slippage is its latest observed ETB minus the first ETB observed
+for it on the same sailing; a rolled booking starts again on its new sailing.
+
+Usage:
+    python etb_analytics.py voyages --limit 20
+    python etb_analytics.py voyages --vessel "YM MANDATE"
+    python etb_analytics.py vessels
+    python etb_analytics.py delays --since-days 30
+    python etb_analytics.py window 2025-07-01 "2025-07-08 12:00"
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from result_store import RESULT_COLUMNS, RESULTS_DB, ResultStore
+from tracking_parser import DATE_TIME, NOT_AVAILABLE
+
+NAT = np.datetime64('NaT', 'm')
+HOUR = np.timedelta64(1, 'h')
+
+# Edges in hours of the delay histogram; values outside fall in the open-ended first and last bins
+DELAY_BINS = (-72, -24, -6, 0, 6, 24, 72, 168)
+
+
+def _parse_arrival(value):
+    """parse_arrival() as a datetime64[m], NaT where there is no date."""
+    match = DATE_TIME.search(value) if isinstance(value, str) else None
+    if match is None:
+        return NAT
+    # NumPy checks the same ranges as parse_arrival()'s strptime, many times faster
+    try:
+        return np.datetime64(match.group(0).replace(' ', 'T'), 'm')
+    except ValueError:
+        return NAT
+
+
+def _factorize(values, index=None):
+    """
+    Integer codes of `values`, numbered in order of first appearance and
+    continuing the numbering of an existing `index` (value -> code).
+
+    Returns:
+        Tuple of (index including the new values, int64 code per value)
+    """
+    index = {} if index is None else index
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int64,
+                        count=len(values))
+    return index, codes
+
+
+def arrival_column(values):
+    """Parse arrival_date strings into a datetime64[m] array, NaT where there is no date."""
+    distinct, codes = _factorize(values)
+    parsed = np.array([_parse_arrival(value) for value in distinct], dtype='datetime64[m]')
+    return parsed[codes] if len(codes) else parsed
+
+
+def _sailing(vessel, voyage):
+    if not vessel or not voyage or NOT_AVAILABLE in (vessel, voyage):
+        return None
+    return vessel.strip().upper(), voyage.strip().upper()
+
+
+def sailing_column(vessels, voyages, index):
+    """
+    Sailing codes of (vessel_name, voyage_number) columns, -1 where either is
+    missing. New sailings are added to `index` ((vessel, voyage) -> code).
+    """
+    vessel_index, vessel = _factorize(vessels)
+    voyage_index, voyage = _factorize(voyages)
+    # Normalise each distinct raw pair once rather than every row
+    width = max(1, len(voyage_index))
+    pairs, pair = np.unique(vessel * width + voyage, return_inverse=True)
+    vessel_names, voyage_numbers = list(vessel_index), list(voyage_index)
+    codes = np.empty(len(pairs), dtype=np.int64)
+    for i, key in enumerate(pairs.tolist()):
+        sailing = _sailing(vessel_names[key // width], voyage_numbers[key % width])
+        codes[i] = -1 if sailing is None else index.setdefault(sailing, len(index))
+    return codes[pair] if len(pair) else codes
+
+
+def _run_starts(keys):
+    """Offsets where a new run of equal values begins in a sorted array."""
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def _run_ends(starts, length):
+    """Offsets where each run that begins at `starts` ends (inclusive)."""
+    return np.r_[starts[1:], length].astype(np.int64) - 1 if length else starts
+
+
+def _quantile(values, starts, counts, q):
+    """Linear-interpolated quantile of each run of a run-sorted array."""
+    position = starts + q * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, starts + counts - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def _format(timestamp):
+    return None if np.isnat(timestamp) else str(timestamp).replace('T', ' ')
+
+
+def _hours(value):
+    return round(float(value), 1)
+
+
+def columns_file(db_path):
+    """The column snapshot kept beside a results database."""
+    return os.path.splitext(db_path)[0] + '.columns.npz'
+
+
+class EtbHistory:
+    """
+    The tracking history as NumPy columns, one entry per stored result.
+
+    Attributes:
+        ids: Result ids, ascending
+        booking_ids: Distinct booking IDs; `booking` holds indexes into it
+        sailings: Distinct (vessel_name, voyage_number); `sailing` holds indexes into it, -1 if unknown
+        arrival: ETB as datetime64[m], NaT if the result had none
+        recorded: When the result was recorded, as datetime64[s]
+    """
+
+    def __init__(self, ids, booking_ids, booking, sailings, sailing, arrival, recorded):
+        self.ids = ids
+        self.booking_ids = booking_ids
+        self.booking = booking
+        self.sailings = sailings
+        self.sailing = sailing
+        self.arrival = arrival
+        self.recorded = recorded
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64),
+                   np.zeros(0, dtype='datetime64[m]'), np.zeros(0, dtype='datetime64[s]'))
+
+    def extend(self, rows):
+        """Append results given as ResultStore.rows(); their ids must follow the ones held."""
+        if not rows:
+            return self
+        # One object array for the whole fetch, then a column view per field
+        table = np.array(rows, dtype=object).reshape(len(rows), len(RESULT_COLUMNS))
+        columns = dict(zip(RESULT_COLUMNS, table.T))
+        booking_index = dict(zip(self.booking_ids, range(len(self.booking_ids))))
+        booking_index, booking = _factorize(columns['booking_id'], booking_index)
+        sailing_index = dict(zip(self.sailings, range(len(self.sailings))))
+        sailing = sailing_column(columns['vessel_name'], columns['voyage_number'], sailing_index)
+        self.ids = np.concatenate([self.ids, np.array(columns['id'], dtype=np.int64)])
+        self.booking_ids, self.sailings = list(booking_index), list(sailing_index)
+        self.booking = np.concatenate([self.booking, booking])
+        self.sailing = np.concatenate([self.sailing, sailing])
+        self.arrival = np.concatenate([self.arrival, arrival_column(columns['arrival_date'])])
+        recorded = np.array(columns['recorded_at'], dtype=np.float64).astype('datetime64[s]')
+        self.recorded = np.concatenate([self.recorded, recorded])
+        return self
+
+    def select(self, mask):
+        """The results where `mask` is true, sharing the booking and sailing lists."""
+        return EtbHistory(self.ids[mask], self.booking_ids, self.booking[mask], self.sailings, self.sailing[mask],
+                          self.arrival[mask], self.recorded[mask])
+
+    def compact(self):
+        """Drop the booking IDs and sailings no result refers to any more."""
+        used = np.unique(self.booking)
+        if len(used) < len(self.booking_ids):
+            remap = np.full(len(self.booking_ids), -1, dtype=np.int64)
+            remap[used] = np.arange(len(used))
+            self.booking = remap[self.booking]
+            self.booking_ids = [self.booking_ids[i] for i in used]
+        used = np.unique(self.sailing[self.sailing >= 0])
+        if len(used) < len(self.sailings):
+            # One extra slot so that the -1 of unknown sailings maps to -1
+            remap = np.full(len(self.sailings) + 1, -1, dtype=np.int64)
+            remap[used] = np.arange(len(used))
+            self.sailing = remap[self.sailing]
+            self.sailings = [self.sailings[i] for i in used]
+        return self
+
+    def save(self, path):
+        """Write the columns to an .npz snapshot, replacing it atomically."""
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporary,
+            ids=self.ids, booking=self.booking, sailing=self.sailing, arrival=self.arrival, recorded=self.recorded,
+            booking_ids=np.array(self.booking_ids, dtype=str),
+            vessels=np.array([vessel for vessel, _ in self.sailings], dtype=str),
+            voyages=np.array([voyage for _, voyage in self.sailings], dtype=str),
+        )
+        os.replace(temporary, path)
+
+    @classmethod
+    def read(cls, path):
+        """Read an .npz snapshot written by save()."""
+        with np.load(path) as data:
+            return cls(data['ids'], data['booking_ids'].tolist(), data['booking'],
+                       list(zip(data['vessels'].tolist(), data['voyages'].tolist())), data['sailing'],
+                       data['arrival'], data['recorded'])
+
+    @classmethod
+    def load(cls, db_path=RESULTS_DB, since=None, snapshot=True):
+        """
+        Load the results recorded at or after `since` (epoch seconds).
+
+        The column snapshot beside the database is brought up to date with the
+        results added since it was written, trimmed to the results the
+        database still keeps under its retention policy, and rewritten; it is
+        rebuilt from scratch when it no longer matches the database.
+        """
+        path = columns_file(db_path)
+        store = ResultStore(db_path)
+        try:
+            first_id, last_id = store.id_range()
+            history = None
+            if snapshot and os.path.exists(path):
+                try:
+                    history = cls.read(path)
+                except (OSError, ValueError, KeyError):
+                    history = None
+                if history is not None and len(history) and (last_id is None or history.ids[-1] > last_id):
+                    # The database was replaced or emptied
+                    history = None
+            if history is None:
+                history = cls.empty()
+            held = int(history.ids[-1]) if len(history) else 0
+            changed = last_id is not None and last_id > held
+            if changed:
+                history.extend(store.rows(after_id=held))
+            # Results removed by the retention policy, or due to be at the next prune
+            cutoff = np.datetime64(int(time.time() - store.result_retention_days * 86400), 's')
+            kept = history.recorded >= cutoff
+            if first_id is not None:
+                kept &= history.ids >= first_id
+            if not kept.all():
+                history = history.select(kept).compact()
+                changed = True
+            if snapshot and changed:
+                history.save(path)
+        finally:
+            store.close()
+        if since:
+            history = history.select(history.recorded >= np.datetime64(int(since), 's'))
+        return history
+
+    def booking_slippage(self):
+        """
+        ETB movement of every booking on every sailing it was seen on.
+
+        Returns:
+            Dict of equal-length arrays: booking, sailing, observations,
+            first_seen, last_seen, first_etb, latest_etb and slippage_hours
+        """
+        known = (self.sailing >= 0) & ~np.isnat(self.arrival)
+        group = self.booking[known] * max(1, len(self.sailings)) + self.sailing[known]
+        recorded = self.recorded[known]
+        order = np.lexsort((recorded, group))
+        group, recorded, arrival = group[order], recorded[order], self.arrival[known][order]
+        starts = _run_starts(group)
+        ends = _run_ends(starts, len(group))
+        return {
+            'booking': group[starts] // max(1, len(self.sailings)),
+            'sailing': group[starts] % max(1, len(self.sailings)),
+            'observations': ends - starts + 1,
+            'first_seen': recorded[starts],
+            'last_seen': recorded[ends],
+            'first_etb': arrival[starts],
+            'latest_etb': arrival[ends],
+            'slippage_hours': (arrival[ends] - arrival[starts]) / HOUR,
+        }
+
+    @staticmethod
+    def _distribution(keys, slippage):
+        """Slippage statistics per key; keys are small non-negative integers."""
+        order = np.lexsort((slippage, keys))
+        keys, slippage = keys[order], slippage[order]
+        starts = _run_starts(keys)
+        counts = np.diff(np.r_[starts, len(keys)])
+        if not len(starts):
+            empty = np.zeros(0)
+            return keys[starts], {name: empty for name in ('bookings', 'mean', 'median', 'p90', 'max', 'delayed')}
+        return keys[starts], {
+            'bookings': counts,
+            'mean': np.add.reduceat(slippage, starts) / counts,
+            'median': _quantile(slippage, starts, counts, 0.5),
+            'p90': _quantile(slippage, starts, counts, 0.9),
+            'max': np.maximum.reduceat(slippage, starts),
+            'delayed': np.add.reduceat((slippage > 0).astype(np.int64), starts) / counts,
+        }
+
+    def voyage_report(self, vessel=None):
+        """
+        ETB slippage per sailing, most slipped first.
+
+        The sailing's slippage is the latest ETB seen for any of its bookings
+        minus the first ETB seen for it; the distribution is over its bookings.
+        """
+        bookings = self.booking_slippage()
+        sailing = bookings['sailing']
+        keys, stats = self._distribution(sailing, bookings['slippage_hours'])
+
+        # First ETB seen for the sailing, and the latest one
+        first = np.lexsort((bookings['first_seen'], sailing))
+        first_etb = bookings['first_etb'][first][_run_starts(sailing[first])]
+        latest = np.lexsort((bookings['last_seen'], sailing))
+        latest_etb = bookings['latest_etb'][latest][_run_ends(_run_starts(sailing[latest]), len(latest))]
+        slipped = (latest_etb - first_etb) / HOUR
+
+        rows = []
+        for i in np.argsort(-slipped, kind='stable'):
+            vessel_name, voyage_number = self.sailings[keys[i]]
+            if vessel is not None and vessel_name != vessel.strip().upper():
+                continue
+            rows.append({
+                'vessel_name': vessel_name,
+                'voyage_number': voyage_number,
+                'bookings': int(stats['bookings'][i]),
+                'first_etb': _format(first_etb[i]),
+                'latest_etb': _format(latest_etb[i]),
+                'slippage_hours': _hours(slipped[i]),
+                'booking_median_hours': _hours(stats['median'][i]),
+                'booking_p90_hours': _hours(stats['p90'][i]),
+                'booking_max_hours': _hours(stats['max'][i]),
+                'delayed_share': round(float(stats['delayed'][i]), 3),
+            })
+        return rows
+
+    def vessel_report(self):
+        """Distribution of the per-booking slippage over all voyages of each vessel, most delayed first."""
+        vessel_index, vessel_of_sailing = _factorize([vessel for vessel, _ in self.sailings])
+        vessel_names = list(vessel_index)
+        bookings = self.booking_slippage()
+        vessel = vessel_of_sailing[bookings['sailing']]
+        keys, stats = self._distribution(vessel, bookings['slippage_hours'])
+        voyages = np.bincount(vessel_of_sailing[np.unique(bookings['sailing'])], minlength=len(vessel_names))
+        return [{
+            'vessel_name': vessel_names[keys[i]],
+            'voyages': int(voyages[keys[i]]),
+            'bookings': int(stats['bookings'][i]),
+            'mean_hours': _hours(stats['mean'][i]),
+            'median_hours': _hours(stats['median'][i]),
+            'p90_hours': _hours(stats['p90'][i]),
+            'max_hours': _hours(stats['max'][i]),
+            'delayed_share': round(float(stats['delayed'][i]), 3),
+        } for i in np.argsort(-stats['median'], kind='stable')]
+
+    def delay_distribution(self, bins=DELAY_BINS):
+        """Number of bookings per slippage bucket, as (label, count) pairs."""
+        slippage = self.booking_slippage()['slippage_hours']
+        edges = np.r_[-np.inf, np.asarray(bins, dtype=np.float64), np.inf]
+        counts, _ = np.histogram(slippage, edges)
+        labels = [f"< {bins[0]}h"] + [f"{low}h .. {high}h" for low, high in zip(bins, bins[1:])] + [f">= {bins[-1]}h"]
+        return list(zip(labels, counts.tolist()))
+
+    def arriving_between(self, start, end):
+        """
+        Bookings whose latest known ETB is in [start, end), earliest first.
+
+        Args:
+            start, end: datetime, numpy.datetime64 or date string ("YYYY-MM-DD[ HH:MM]")
+        """
+        start, end = (_parse_arrival(value) if isinstance(value, str) else np.datetime64(value, 'm')
+                      for value in (start, end))
+        known = np.flatnonzero(~np.isnat(self.arrival))
+        order = known[np.lexsort((self.recorded[known], self.booking[known]))]
+        booking = self.booking[order]
+        latest = order[_run_ends(_run_starts(booking), len(booking))]
+        arrival = self.arrival[latest]
+        latest = latest[(arrival >= start) & (arrival < end)]
+        latest = latest[np.argsort(self.arrival[latest], kind='stable')]
+        rows = []
+        for i in latest:
+            sailing = self.sailings[self.sailing[i]] if self.sailing[i] >= 0 else (NOT_AVAILABLE, NOT_AVAILABLE)
+            rows.append({
+                'booking_id': self.booking_ids[self.booking[i]],
+                'vessel_name': sailing[0],
+                'voyage_number': sailing[1],
+                'arrival_date': _format(self.arrival[i]),
+            })
+        return rows
+
+
+def _print_rows(rows):
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ETB slippage and arrival reports over the stored tracking results.")
+    parser.add_argument('--db', default=RESULTS_DB, help=f"Results database (default: {RESULTS_DB})")
+    parser.add_argument('--since-days', type=float, default=None,
+                        help="Only use results recorded in the last N days (default: all)")
+    parser.add_argument('--no-snapshot', dest='snapshot', action='store_false',
+                        help="Read every result from the database instead of the column snapshot")
+    commands = parser.add_subparsers(dest='command', required=True)
+    voyages = commands.add_parser('voyages', help="ETB slippage per sailing")
+    voyages.add_argument('--vessel', default=None, help="Only this vessel's voyages")
+    voyages.add_argument('--limit', type=int, default=None, help="Print only the N most slipped sailings")
+    commands.add_parser('vessels', help="Slippage distribution per vessel")
+    commands.add_parser('delays', help="Histogram of the per-booking slippage")
+    window = commands.add_parser('window', help="Bookings whose latest ETB is in [START, END)")
+    window.add_argument('start', help="YYYY-MM-DD[ HH:MM]")
+    window.add_argument('end', help="YYYY-MM-DD[ HH:MM]")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    since = time.time() - args.since_days * 86400 if args.since_days else None
+    history = EtbHistory.load(args.db, since, snapshot=args.snapshot)
+    loaded = time.perf_counter()
+    if args.command == 'voyages':
+        _print_rows(history.voyage_report(args.vessel)[:args.limit])
+    elif args.command == 'vessels':
+        _print_rows(history.vessel_report())
+    elif args.command == 'delays':
+        for label, count in history.delay_distribution():
+            print(f"{label:>14} {count:>8}")
+    elif args.command == 'window':
+        start, end = _parse_arrival(args.start), _parse_arrival(args.end)
+        if np.isnat(start) or np.isnat(end):
+            print("START and END must be dates (YYYY-MM-DD or YYYY-MM-DD HH:MM)", file=sys.stderr)
+            sys.exit(2)
+        _print_rows(history.arriving_between(start, end))
+    print(f"{len(history)} results loaded in {loaded - started:.3f}s, "
+          f"report in {time.perf_counter() - loaded:.3f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
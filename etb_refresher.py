@@ -0,0 +1,372 @@
+"""
+Incremental ETB refresh for active bookings.
+
+Every observed arrival_date is kept with its history, and each booking is
+re-scraped on its own schedule: often when the vessel is close to arrival or
+its ETB moved recently, rarely when arrival is weeks away. Bookings whose
+vessel has berthed drop out. Only changes are written to the change feed
+(JSON Lines, optionally POSTed to a webhook), so scrape volume follows the
+rate of change rather than the size of the portfolio.
+
+Usage:
+    python etb_refresher.py add active_bookings.txt
+    python etb_refresher.py run --headless                # refresh what is due, once
+    python etb_refresher.py run --loop 600 --headless     # keep refreshing every 10 minutes
+    python etb_refresher.py status
+    python etb_refresher.py history SINI25432400
+
+Settings (environment / .env):
+    ETB_WEBHOOK_URL   URL that every change event is POSTed to as JSON
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from result_cache import TRACKING_DB, connect
+from tracking_parser import NOT_AVAILABLE, parse_arrival
+from telemetry import configure_telemetry
+from voyage_index import refresh_voyages
+
+CHANGE_FEED = os.path.join("results", "etb_changes.jsonl")
+
+# (hours to arrival below which, refresh every N hours), checked in order
+REFRESH_INTERVALS = ((24, 1), (72, 3), (168, 12))
+DEFAULT_INTERVAL_HOURS = 24
+UNKNOWN_INTERVAL_HOURS = 6
+# An ETB that moved within this window is checked twice as often
+RECENT_CHANGE_HOURS = 24
+# A vessel is taken to have berthed this long after its ETB
+BERTHED_GRACE_HOURS = 6
+
+TRACKED_FIELDS = ('vessel_name', 'voyage_number', 'arrival_date')
+
+
+def refresh_interval(arrival, last_changed, now):
+    """
+    Seconds between refreshes of a booking.
+
+    Args:
+        arrival: ETB as a datetime, or None if unknown
+        last_changed: Epoch seconds of the last observed change, or None
+        now: Current epoch seconds
+    """
+    if arrival is None:
+        hours = UNKNOWN_INTERVAL_HOURS
+    else:
+        hours_to_arrival = (arrival.timestamp() - now) / 3600
+        hours = next((every for below, every in REFRESH_INTERVALS if hours_to_arrival < below), DEFAULT_INTERVAL_HOURS)
+    if last_changed and now - last_changed < RECENT_CHANGE_HOURS * 3600:
+        hours /= 2
+    return hours * 3600
+
+
+class EtbStore:
+    """
+    Watched bookings with their latest fields and the history of their ETB.
+
+    Args:
+        db_path: SQLite database file, shared with the result cache
+    """
+
+    def __init__(self, db_path=TRACKING_DB):
+        self._conn = connect(db_path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS etb_watch (
+                booking_id TEXT PRIMARY KEY,
+                vessel_name TEXT,
+                voyage_number TEXT,
+                arrival_date TEXT,
+                last_checked REAL NOT NULL DEFAULT 0,
+                last_changed REAL,
+                active INTEGER NOT NULL DEFAULT 1
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS etb_history (
+                booking_id TEXT NOT NULL,
+                vessel_name TEXT,
+                voyage_number TEXT,
+                arrival_date TEXT NOT NULL,
+                observed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_etb_history_booking ON etb_history (booking_id, observed_at)")
+        self._conn.commit()
+
+    def add(self, booking_ids):
+        """Start watching bookings (re-activating dropped ones). Returns the number of new bookings."""
+        before = self._conn.total_changes
+        self._conn.executemany("INSERT OR IGNORE INTO etb_watch (booking_id) VALUES (?)",
+                               [(booking_id,) for booking_id in booking_ids])
+        added = self._conn.total_changes - before
+        self._conn.executemany("UPDATE etb_watch SET active = 1 WHERE booking_id = ?",
+                               [(booking_id,) for booking_id in booking_ids])
+        self._conn.commit()
+        return added
+
+    def due(self, now=None, limit=None):
+        """
+        Active bookings whose refresh is due, closest arrival first.
+        """
+        now = now or time.time()
+        rows = self._conn.execute(
+            "SELECT booking_id, arrival_date, last_checked, last_changed FROM etb_watch WHERE active = 1"
+        ).fetchall()
+        due = []
+        for booking_id, arrival_date, last_checked, last_changed in rows:
+            arrival = parse_arrival(arrival_date)
+            if last_checked + refresh_interval(arrival, last_changed, now) > now:
+                continue
+            hours_to_arrival = (arrival.timestamp() - now) / 3600 if arrival else float('inf')
+            due.append((hours_to_arrival, last_checked, booking_id))
+        due.sort()
+        booking_ids = [booking_id for _, _, booking_id in due]
+        return booking_ids[:limit] if limit else booking_ids
+
+    def observe(self, extracted, observed_at=None):
+        """
+        Record a fresh lookup of a booking.
+
+        Returns:
+            List of change events (field changes, berthing); empty if nothing changed
+        """
+        observed_at = observed_at or time.time()
+        booking_id = extracted['booking_id']
+        row = self._conn.execute(
+            "SELECT vessel_name, voyage_number, arrival_date, last_changed FROM etb_watch WHERE booking_id = ?",
+            (booking_id,),
+        ).fetchone()
+        previous = dict(zip(TRACKED_FIELDS, row[:3])) if row else {}
+        last_changed = row[3] if row else None
+        current = {field: extracted.get(field, NOT_AVAILABLE) for field in TRACKED_FIELDS}
+
+        if current['arrival_date'] == NOT_AVAILABLE:
+            # Nothing usable came back; keep the last known fields and try again later
+            self._conn.execute(
+                "INSERT INTO etb_watch (booking_id, last_checked) VALUES (?, ?) "
+                "ON CONFLICT(booking_id) DO UPDATE SET last_checked = excluded.last_checked",
+                (booking_id, observed_at),
+            )
+            self._conn.commit()
+            return []
+
+        events = []
+        first = previous.get('arrival_date') is None
+        changes = {field: [previous[field], current[field]] for field in TRACKED_FIELDS
+                   if not first and previous.get(field) != current[field]}
+        if first or changes:
+            self._conn.execute(
+                "INSERT INTO etb_history VALUES (?, ?, ?, ?, ?)",
+                (booking_id, current['vessel_name'], current['voyage_number'], current['arrival_date'], observed_at),
+            )
+        if changes:
+            last_changed = observed_at
+            event = {'event': 'changed', 'booking_id': booking_id, 'changes': changes}
+            if 'arrival_date' in changes:
+                old, new = (parse_arrival(value) for value in changes['arrival_date'])
+                if old and new:
+                    event['shift_hours'] = round((new - old).total_seconds() / 3600, 2)
+            events.append(event)
+
+        arrival = parse_arrival(current['arrival_date'])
+        active = not (arrival and arrival.timestamp() + BERTHED_GRACE_HOURS * 3600 < observed_at)
+        if not active:
+            events.append({'event': 'berthed', 'booking_id': booking_id, **current})
+
+        self._conn.execute(
+            """INSERT OR REPLACE INTO etb_watch
+               (booking_id, vessel_name, voyage_number, arrival_date, last_checked, last_changed, active)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (booking_id, current['vessel_name'], current['voyage_number'], current['arrival_date'],
+             observed_at, last_changed, int(active)),
+        )
+        self._conn.commit()
+        for event in events:
+            event['observed_at'] = datetime.fromtimestamp(observed_at).isoformat()
+        return events
+
+    def checked(self, booking_id, checked_at=None):
+        """Push back the next refresh of a booking whose lookup failed."""
+        self._conn.execute("UPDATE etb_watch SET last_checked = ? WHERE booking_id = ?",
+                           (checked_at or time.time(), booking_id))
+        self._conn.commit()
+
+    def history(self, booking_id):
+        """Every distinct observation of a booking, oldest first."""
+        rows = self._conn.execute(
+            "SELECT vessel_name, voyage_number, arrival_date, observed_at FROM etb_history "
+            "WHERE booking_id = ? ORDER BY observed_at",
+            (booking_id,),
+        ).fetchall()
+        return [dict(zip(TRACKED_FIELDS + ('observed_at',), row)) for row in rows]
+
+    def watched(self):
+        """All watched bookings with their latest fields and refresh state."""
+        cursor = self._conn.execute("SELECT * FROM etb_watch ORDER BY active DESC, arrival_date")
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        self._conn.close()
+
+
+class ChangeFeed:
+    """
+    Appends change events to a JSON Lines file and, if configured, POSTs
+    each one to a webhook.
+
+    Args:
+        path: JSON Lines file the events are appended to
+        webhook_url: URL to POST each event to, defaults to ETB_WEBHOOK_URL
+    """
+
+    def __init__(self, path=CHANGE_FEED, webhook_url=None):
+        self.path = path
+        self.webhook_url = webhook_url or os.getenv('ETB_WEBHOOK_URL')
+        self._client = None
+        if self.webhook_url:
+            import httpx
+            self._client = httpx.AsyncClient(timeout=10.0)
+
+    async def emit(self, event):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        if self._client is not None:
+            import httpx
+            try:
+                response = await self._client.post(self.webhook_url, json=event)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f"Warning: Could not deliver change event to {self.webhook_url}: {e}", file=sys.stderr)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+
+async def refresh_due(store, lookup, feed, concurrency=3, limit=None):
+    """
+    Refresh the bookings that are due and emit what changed.
+
+    Due bookings on the same sailing share one lookup (see refresh_voyages).
+
+    Args:
+        store: EtbStore holding the watched bookings
+        lookup: Coroutine function taking a booking ID and returning fresh tracking fields
+        feed: ChangeFeed receiving the change events
+        concurrency: Maximum number of lookups in flight
+        limit: Refresh at most this many bookings
+
+    Returns:
+        Tuple of (bookings refreshed, lookups performed, events emitted)
+    """
+    due = store.due(limit=limit)
+    if not due:
+        return 0, 0, 0
+    events = []
+
+    def on_record(record):
+        if record['status'] == 'ok':
+            events.extend(store.observe(record['result']))
+        else:
+            store.checked(record['booking_id'])
+
+    lookups = await refresh_voyages(due, lookup, on_record, concurrency=concurrency)
+    for event in events:
+        await feed.emit(event)
+    return len(due), lookups, len(events)
+
+
+async def run_refresher(loop_seconds=None, concurrency=3, limit=None, headless=True, use_http=True,
+                        feed_path=CHANGE_FEED, webhook_url=None):
+    """Refresh due bookings once, or every `loop_seconds` until interrupted."""
+    from main import lookup_booking
+    from browser_pool import BrowserPool
+    from http_fetcher import close_fetcher
+    from llm_scheduler import BACKGROUND, llm_priority
+
+    store = EtbStore()
+    feed = ChangeFeed(feed_path, webhook_url)
+    try:
+        async with BrowserPool(size=max(1, concurrency), headless=headless) as browser_pool:
+            async def lookup(booking_id):
+                with llm_priority(BACKGROUND):
+                    return await lookup_booking(booking_id, browser_pool=browser_pool,
+                                                use_http=use_http, max_age=0)
+
+            while True:
+                refreshed, lookups, emitted = await refresh_due(store, lookup, feed, concurrency, limit)
+                print(f"{datetime.now().isoformat(timespec='seconds')} refreshed {refreshed} bookings "
+                      f"with {lookups} lookups, {emitted} changes", file=sys.stderr)
+                if loop_seconds is None:
+                    return
+                await asyncio.sleep(loop_seconds)
+    finally:
+        await close_fetcher()
+        await feed.aclose()
+        store.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally refresh the ETB of active bookings.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="Start watching bookings")
+    add.add_argument('source', help="File with one booking ID per line, or '-' to read from stdin")
+
+    run = commands.add_parser('run', help="Refresh the bookings that are due")
+    run.add_argument('--loop', type=float, default=None, metavar='SECONDS',
+                     help="Keep running, checking for due bookings every SECONDS")
+    run.add_argument('-c', '--concurrency', type=int, default=3, help="Concurrent lookups (default: 3)")
+    run.add_argument('--limit', type=int, default=None, help="Refresh at most this many bookings per round")
+    run.add_argument('--headless', action='store_true', help="Run browsers in headless mode")
+    run.add_argument('--no-http', dest='use_http', action='store_false',
+                     help="Skip the direct HTTP fast path and always use the browser")
+    run.add_argument('--feed', default=CHANGE_FEED, help=f"Change feed file (default: {CHANGE_FEED})")
+    run.add_argument('--webhook', default=None, help="POST each change event to this URL (default: ETB_WEBHOOK_URL)")
+
+    commands.add_parser('status', help="List watched bookings")
+
+    history = commands.add_parser('history', help="Show the ETB history of a booking")
+    history.add_argument('booking_id')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Load environment variables from .env
+    load_dotenv()
+    configure_telemetry()
+    if args.command == 'run':
+        asyncio.run(run_refresher(args.loop, args.concurrency, args.limit, args.headless, args.use_http,
+                                  args.feed, args.webhook))
+        return
+
+    store = EtbStore()
+    try:
+        if args.command == 'add':
+            from batch_tracking import read_booking_ids
+            booking_ids = read_booking_ids(args.source)
+            print(f"Watching {store.add(booking_ids)} new of {len(booking_ids)} bookings")
+        elif args.command == 'status':
+            for row in store.watched():
+                print(json.dumps(row, ensure_ascii=False))
+        elif args.command == 'history':
+            for row in store.history(args.booking_id):
+                row['observed_at'] = datetime.fromtimestamp(row['observed_at']).isoformat()
+                print(json.dumps(row, ensure_ascii=False))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Gemini chat model wiring: the scheduled ChatGoogleGenerativeAI and the
+callback that feeds LLM latency and token usage into the run metrics.
+
+This module imports langchain and is only loaded on paths that actually
+call the LLM; llm_scheduler.py and run_metrics.py stay import-light.
+"""
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_google_genai import ChatGoogleGenerativeAI
+from pydantic import PrivateAttr
+
+from llm_scheduler import backoff_delay, estimate_tokens, get_scheduler, is_rate_limit_error
+from run_metrics import current_metrics
+from telemetry import LLM_SECONDS, RATE_LIMITED, start_span
+
+
+class ScheduledChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+    """
+    ChatGoogleGenerativeAI whose calls go through the GeminiScheduler.
+
+    One underlying client is kept per API key; each call is sent with the
+    key the scheduler hands out.
+    """
+
+    _clients = PrivateAttr(default_factory=dict)
+    _scheduler = PrivateAttr(default=None)
+    # Read by browser-use: skip the unscheduled API key check on every agent start
+    _verified_api_keys = PrivateAttr(default=True)
+
+    def _client_for(self, api_key):
+        client = self._clients.get(api_key)
+        if client is None:
+            # The scheduler does the retrying; the client should fail fast on a 429
+            client = ChatGoogleGenerativeAI(
+                model=self.model,
+                temperature=self.temperature,
+                google_api_key=api_key,
+                max_retries=1,
+            )
+            self._clients[api_key] = client
+        return client
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler = self._scheduler or get_scheduler()
+        estimated = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            quota = await scheduler.acquire(estimated)
+            try:
+                result = await self._client_for(quota.api_key)._agenerate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= scheduler.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                quota.cool_down(delay)
+                RATE_LIMITED.inc(key=quota.label)
+                attempt += 1
+                print(f"Gemini rate limit on key {quota.label}, retry {attempt}/{scheduler.max_retries} "
+                      f"after {delay:.1f}s")
+                continue
+            quota.settle(estimated, _total_tokens(result))
+            return result
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler = self._scheduler or get_scheduler()
+        estimated = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            quota = scheduler.acquire_blocking(estimated)
+            try:
+                result = self._client_for(quota.api_key)._generate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= scheduler.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                quota.cool_down(delay)
+                RATE_LIMITED.inc(key=quota.label)
+                attempt += 1
+                print(f"Gemini rate limit on key {quota.label}, retry {attempt}/{scheduler.max_retries} "
+                      f"after {delay:.1f}s")
+                continue
+            quota.settle(estimated, _total_tokens(result))
+            return result
+
+
+def _total_tokens(result):
+    try:
+        usage = result.generations[0].message.usage_metadata
+    except (AttributeError, IndexError):
+        return None
+    return usage.get('total_tokens') if usage else None
+
+
+def create_scheduled_llm(model='gemini-2.0-flash-exp', temperature=0.0, scheduler=None):
+    """
+    Create a Gemini chat model whose calls are rate limited, retried and
+    prioritised by the shared scheduler.
+    """
+    scheduler = scheduler or get_scheduler()
+    llm = ScheduledChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        google_api_key=scheduler.quotas[0].api_key,
+    )
+    llm._scheduler = scheduler
+    return llm
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Times every chat model call as an `llm.call` span and counts its tokens
+    into the RunMetrics of the lookup that made it. One handler serves every
+    concurrent lookup: the metrics and the parent span are found through
+    context variables set by track_run().
+    """
+
+    # Run in the caller's task so the context variables are visible
+    run_inline = True
+
+    def __init__(self):
+        self._pending = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        model = (kwargs.get('invocation_params') or {}).get('model') or (serialized or {}).get('name', '')
+        self._pending[run_id] = (current_metrics(), start_span('llm.call', model=str(model)), time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        pending = self._pending.pop(run_id, None)
+        if pending is None:
+            return
+        metrics, call_span, started = pending
+        seconds = time.perf_counter() - started
+        LLM_SECONDS.observe(seconds, model=call_span.attributes.get('model', ''))
+        usage = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        call_span.set_attribute('input_tokens', usage.get('input_tokens', 0))
+        call_span.set_attribute('output_tokens', usage.get('output_tokens', 0))
+        call_span.end()
+        if metrics is not None:
+            metrics.record_llm_call(
+                seconds,
+                usage.get('input_tokens', 0),
+                usage.get('output_tokens', 0),
+            )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        pending = self._pending.pop(run_id, None)
+        if pending is not None:
+            metrics, call_span, started = pending
+            call_span.end(error)
+            if metrics is not None:
+                metrics.record_llm_call(time.perf_counter() - started)
+
+
+_callback = LLMMetricsCallback()
+
+
+def instrument_llm(llm):
+    """Attach the shared metrics callback to a chat model (idempotent)."""
+    callbacks = list(llm.callbacks or [])
+    if _callback not in callbacks:
+        llm.callbacks = callbacks + [_callback]
+    return llm
@@ -0,0 +1,159 @@
+"""
+Direct HTTP fast path for HMM Track & Trace.
+
+The seacargotracking.net flow in track_shipping() ends at HMM's own Track &
+Trace form. This module submits that form directly over a pooled
+httpx.AsyncClient (keep-alive, HTTP/2 where the server supports it) and
+parses the HTML or JSON response into the same shape that
+extract_tracking_fields() returns. The browser agent is only used when this
+fast path cannot resolve a booking.
+
+The endpoint can be pointed elsewhere, e.g. at stub_server.py, with:
+    HMM_TRACK_URL    URL of the Track & Trace endpoint
+    HMM_TRACK_FIELD  Name of the form field carrying the booking ID
+"""
+import asyncio
+import json
+import os
+
+import httpx
+
+from carriers.base import BookingNotFound
+from tracking_parser import NOT_AVAILABLE, fields_from_json, fields_from_tables, tables_from_html
+
+DEFAULT_TRACK_URL = 'https://www.hmm21.com/e-service/general/trackNTrace/TrackNTrace.do'
+DEFAULT_TRACK_FIELD = 'srchBkgNo1'
+REQUEST_TIMEOUT = 15.0
+MAX_CONNECTIONS = 20
+# What the endpoint answers for a booking it does not know
+NOT_FOUND_MARKERS = ('No data found',)
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/124.0 Safari/537.36')
+
+
+class FetchError(Exception):
+    """Raised when the tracking endpoint cannot be reached or its response cannot be parsed."""
+
+
+class HMMHttpFetcher:
+    """
+    Looks up bookings on the HMM Track & Trace endpoint over one shared,
+    keep-alive connection pool.
+
+    Args:
+        track_url: Track & Trace endpoint, defaults to HMM_TRACK_URL or the HMM site
+        booking_field: Form field name for the booking ID
+        timeout: Per-request timeout in seconds
+        max_connections: Upper bound on open connections in the pool
+    """
+
+    def __init__(self, track_url=None, booking_field=None, timeout=REQUEST_TIMEOUT,
+                 max_connections=MAX_CONNECTIONS):
+        self.track_url = track_url or os.getenv('HMM_TRACK_URL', DEFAULT_TRACK_URL)
+        self.booking_field = booking_field or os.getenv('HMM_TRACK_FIELD', DEFAULT_TRACK_FIELD)
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=timeout,
+            follow_redirects=True,
+            headers={'User-Agent': USER_AGENT, 'Accept': 'text/html,application/json'},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def fetch(self, booking_id):
+        """
+        Look up a booking and return its tracking fields.
+
+        Returns:
+            Dict with booking_id, vessel_name, voyage_number and arrival_date
+
+        Raises:
+            BookingNotFound: If the endpoint answered that it has no such booking
+            FetchError: If the request fails or no vessel schedule can be read from the response
+        """
+        try:
+            response = await self._client.post(self.track_url, data={self.booking_field: booking_id})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise FetchError(f"{type(e).__name__}: {e}") from e
+
+        extracted = parse_response(response.headers.get('content-type', ''), response.text, booking_id)
+        if not extracted or extracted['vessel_name'] == NOT_AVAILABLE:
+            if any(marker in response.text for marker in NOT_FOUND_MARKERS):
+                raise BookingNotFound(f"HMM has no vessel schedule for {booking_id}")
+            raise FetchError(f"No vessel schedule found for {booking_id}")
+        return extracted
+
+
+def parse_response(content_type, body, booking_id):
+    """Parse a Track & Trace response body (JSON or HTML) into tracking fields, or None."""
+    if 'json' in content_type or body.lstrip().startswith(('{', '[')):
+        try:
+            return fields_from_json(json.loads(body), booking_id)
+        except json.JSONDecodeError:
+            pass
+    return fields_from_tables(tables_from_html(body), booking_id)
+
+
+_shared_fetcher = None
+
+
+def get_fetcher():
+    """Return the process-wide fetcher so every lookup reuses the same connections."""
+    global _shared_fetcher
+    if _shared_fetcher is None:
+        _shared_fetcher = HMMHttpFetcher()
+    return _shared_fetcher
+
+
+async def close_fetcher():
+    """Close the process-wide fetcher, if one was created."""
+    global _shared_fetcher
+    if _shared_fetcher is not None:
+        await _shared_fetcher.aclose()
+        _shared_fetcher = None
+
+
+async def fetch_tracking(booking_id):
+    """
+    Try the HTTP fast path for a booking.
+
+    Returns:
+        Tracking fields dict, or None if the browser should be used instead
+
+    Raises:
+        BookingNotFound: If HMM answered that it has no such booking
+    """
+    try:
+        extracted = await get_fetcher().fetch(booking_id)
+    except BookingNotFound as e:
+        print(f"HTTP fast path: {e}")
+        raise
+    except FetchError as e:
+        print(f"HTTP fast path unavailable for {booking_id}: {e}")
+        return None
+    print(f"✅ Resolved {booking_id} via direct HTTP fast path")
+    return extracted
+
+
+if __name__ == "__main__":
+    import sys
+
+    async def _main():
+        booking_id = sys.argv[1] if len(sys.argv) > 1 else "SINI25432400"
+        try:
+            print(json.dumps(await fetch_tracking(booking_id), indent=2, ensure_ascii=False))
+        except BookingNotFound:
+            pass
+        finally:
+            await close_fetcher()
+
+    asyncio.run(_main())
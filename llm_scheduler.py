@@ -0,0 +1,278 @@
+"""
+Rate-limit aware scheduling of Gemini calls.
+
+Every chat model created through gemini_client.create_scheduled_llm() sends
+its requests through one process-wide GeminiScheduler, which
+    - keeps each API key under its requests-per-minute and tokens-per-minute
+      quota with token buckets, so a batch runs at the quota ceiling instead
+      of running into 429s,
+    - retries a 429 / ResourceExhausted with jittered exponential backoff,
+      cooling the offending key down and moving on to another key,
+    - serves waiting calls by priority, so an interactive lookup jumps ahead
+      of batch work and background refreshes.
+
+Settings (environment / .env):
+    GOOGLE_API_KEYS     Comma-separated API keys to rotate across (falls back to GOOGLE_API_KEY)
+    GEMINI_RPM          Requests per minute allowed per key
+    GEMINI_TPM          Tokens per minute allowed per key
+    GEMINI_MAX_RETRIES  Retries of a rate-limited call before giving up
+    GEMINI_QUOTA_SHARE  Fraction of the per-key quota this process may use, for
+                        worker processes sharing the same keys (default 1)
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+
+DEFAULT_RPM = 10
+DEFAULT_TPM = 1_000_000
+DEFAULT_MAX_RETRIES = 6
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# Rough size of a request, used until the response reports its real usage
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+
+# Lower value is served first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+_current_priority = contextvars.ContextVar('llm_priority', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Run the LLM calls made inside the block (and tasks started from it) at `priority`."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def is_rate_limit_error(error):
+    """True if an exception from the Gemini client means the quota was exceeded."""
+    text = f"{type(error).__name__} {error}"
+    return 'ResourceExhausted' in text or '429' in text
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Full-jitter exponential backoff: a random delay up to base * 2**attempt, capped."""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """
+    Refills continuously at `per_minute` units per minute, holding at most
+    one minute's worth.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount):
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def give_back(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class KeyQuota:
+    """Buckets, cooldown and usage counters of one API key."""
+
+    def __init__(self, api_key, rpm, tpm):
+        self.api_key = api_key
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.cooldown_until = 0.0
+        self.request_count = 0
+        self.token_count = 0
+        self.rate_limited = 0
+
+    def delay_for(self, tokens):
+        cooldown = max(0.0, self.cooldown_until - time.monotonic())
+        return max(cooldown, self.requests.delay_for(1), self.tokens.delay_for(tokens))
+
+    def take(self, tokens):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.request_count += 1
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the real usage of a request is known."""
+        if actual is None:
+            self.token_count += estimated
+            return
+        self.token_count += actual
+        if actual > estimated:
+            self.tokens.take(actual - estimated)
+        else:
+            self.tokens.give_back(estimated - actual)
+
+    def cool_down(self, seconds):
+        self.rate_limited += 1
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    @property
+    def label(self):
+        return f"...{self.api_key[-4:]}" if self.api_key else "(none)"
+
+
+class GeminiScheduler:
+    """
+    Hands out API keys to LLM calls in priority order, as their quotas allow.
+
+    Args:
+        api_keys: API keys to rotate across
+        rpm: Requests per minute allowed per key
+        tpm: Tokens per minute allowed per key
+        max_retries: Retries of a rate-limited call
+    """
+
+    def __init__(self, api_keys, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES):
+        if not api_keys:
+            raise ValueError("At least one Gemini API key is required")
+        self.max_retries = max_retries
+        self.quotas = [KeyQuota(key, rpm, tpm) for key in api_keys]
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = None
+
+    def _best_quota(self, tokens):
+        return min(((quota.delay_for(tokens), index) for index, quota in enumerate(self.quotas)))
+
+    async def acquire(self, tokens, priority=None):
+        """
+        Wait until it is this call's turn and some key has quota for it.
+
+        Returns:
+            The KeyQuota to send the request with; its buckets are already charged
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        priority = _current_priority.get() if priority is None else priority
+        entry = (priority, next(self._sequence))
+        heapq.heappush(self._waiting, entry)
+        async with self._condition:
+            try:
+                while True:
+                    timeout = None
+                    if self._waiting[0] == entry:
+                        delay, index = self._best_quota(tokens)
+                        if delay <= 0:
+                            heapq.heappop(self._waiting)
+                            quota = self.quotas[index]
+                            quota.take(tokens)
+                            # Let the next waiter look at the remaining quota
+                            self._condition.notify_all()
+                            return quota
+                        timeout = delay
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                raise
+
+    def acquire_blocking(self, tokens):
+        """
+        Synchronous acquire() for the odd blocking call (langchain's invoke()),
+        sleeping until some key has quota. It does not queue behind waiting
+        async calls, but it is charged to the same buckets.
+
+        Returns:
+            The KeyQuota to send the request with; its buckets are already charged
+        """
+        while True:
+            delay, index = self._best_quota(tokens)
+            if delay <= 0:
+                quota = self.quotas[index]
+                quota.take(tokens)
+                return quota
+            time.sleep(delay)
+
+    def stats(self):
+        """Per-key request, token and 429 counts since the scheduler was created."""
+        return [
+            {
+                'key': quota.label,
+                'requests': quota.request_count,
+                'tokens': quota.token_count,
+                'rate_limited': quota.rate_limited,
+            }
+            for quota in self.quotas
+        ]
+
+
+def api_keys_from_env():
+    keys = os.getenv('GOOGLE_API_KEYS') or os.getenv('GOOGLE_API_KEY') or ''
+    return [key.strip() for key in keys.split(',') if key.strip()]
+
+
+_shared_scheduler = None
+
+
+def get_scheduler():
+    """Return the process-wide scheduler, configured from the environment."""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        share = float(os.getenv('GEMINI_QUOTA_SHARE', 1))
+        _shared_scheduler = GeminiScheduler(
+            api_keys_from_env(),
+            rpm=float(os.getenv('GEMINI_RPM', DEFAULT_RPM)) * share,
+            tpm=float(os.getenv('GEMINI_TPM', DEFAULT_TPM)) * share,
+            max_retries=int(os.getenv('GEMINI_MAX_RETRIES', DEFAULT_MAX_RETRIES)),
+        )
+    return _shared_scheduler
+
+
+def scheduler_stats():
+    """Per-key usage of the process-wide scheduler, or [] if no Gemini call was scheduled."""
+    return _shared_scheduler.stats() if _shared_scheduler is not None else []
+
+
+def estimate_tokens(messages):
+    """Approximate the input tokens of a list of chat messages without calling the API."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if isinstance(part, str):
+                chars += len(part)
+            elif part.get('type') == 'text':
+                chars += len(part.get('text', ''))
+            else:
+                images += 1
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS
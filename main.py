@@ -1,303 +1,270 @@
-from langchain_google_genai import ChatGoogleGenerativeAI  
-from browser_use import Agent, Browser, BrowserConfig, BrowserSession
 from dotenv import load_dotenv
+import argparse
 import asyncio
 import json
-import os
-import re
+import sys
 from datetime import datetime
 import warnings
 
+# Only lightweight modules are imported here; browser-use, langchain, httpx
+# and pydantic are imported inside the functions that need them, so --help
+# and cache hits start fast
+from browser_pool import close_browser_session, new_browser_session, start_browser_session
+from carriers import carrier_for
+from llm_scheduler import api_keys_from_env
+from model_tiers import ESCALATIONS, ModelLadder, TierEscalator, as_ladder, nothing_found, tier_names_from_env
+from replay import record_script, save_interactions
+from result_cache import get_cache
+from result_store import get_result_store
+from run_metrics import AgentBudget, add_budget_arguments, budget_from_args, page_load_seconds, track_run
+from self_healing import get_fast_path_supervisor
+from telemetry import FALLBACKS, AgentStepSpans, configure_telemetry, get_logger, span
+from voyage_index import get_voyage_index
+
 # Ignore ResourceWarnings (e.g., unclosed browser sessions)
 warnings.filterwarnings("ignore", category=ResourceWarning)
 warnings.filterwarnings("ignore", message="unclosed.*")
 warnings.filterwarnings("ignore", message="I/O operation on closed pipe")
 
-# Load environment variables from .env
-load_dotenv()
+# Results directory (created on first write); stored replay scripts live in
+# interactions/, one file per carrier (see carriers/)
+RESULTS_DIR = "results"
 
-# Get Google API key from environment
-google_api_key = os.getenv("GOOGLE_API_KEY")
-print(f"Google API Key: {google_api_key}")  # Debugging line to check if key is loaded
-if not google_api_key:
-    raise ValueError("GOOGLE_API_KEY environment variable is not set")
+logger = get_logger('main')
 
-# Define the storage path for interactions
-STORAGE_DIR = "interactions"
-RESULTS_DIR = "results"
-STORAGE_FILE = os.path.join(STORAGE_DIR, "hmm_tracking_interactions.json")
+def create_llm():
+    """
+    Create the Gemini models used by the tracking agent, as a ModelLadder
+    from the cheapest to the strongest tier of GEMINI_MODEL_TIERS (see
+    model_tiers.py). The ladder can be shared across many lookups; its calls
+    are rate limited and retried by the shared scheduler in llm_scheduler.py.
+    """
+    # Load environment variables from .env
+    load_dotenv()
+    if not api_keys_from_env():
+        raise ValueError("GOOGLE_API_KEY (or GOOGLE_API_KEYS) environment variable is not set")
+    from gemini_client import create_scheduled_llm
+    return ModelLadder([
+        create_scheduled_llm(model=name, temperature=0.0)
+        for name in tier_names_from_env()
+    ])
 
-# Ensure storage directory exists
-os.makedirs(STORAGE_DIR, exist_ok=True)
-os.makedirs(RESULTS_DIR, exist_ok=True)
+_shared_llm = None
 
-def extract_tracking_fields(result, booking_id):
+def get_llm():
     """
-    Extract booking_id, vessel_name, voyage_number, and arrival_date from agent result.
-    Accepts either a string or dict result.
-    Returns a dict with only those fields.
+    Return the process-wide ModelLadder, created on the first agent run, so
+    that lookups answered from the cache or the HTTP fast path never need a
+    Gemini key.
     """
-    print(f"\nDEBUG: Result type: {type(result)}")
-    print(f"DEBUG: Result content: {result[:500]}..." if isinstance(result, str) else f"DEBUG: Result content: {result}")
-    
-    # Initialize return structure
-    extracted = {
-        'booking_id': booking_id,
-        'vessel_name': 'Not available',
-        'voyage_number': 'Not available',
-        'arrival_date': 'Not available'
-    }
-    
-    # If input is a dict, try to handle nested structures first
-    if isinstance(result, dict):
-        # Check for result/raw_result nesting
-        for key in ['result', 'raw_result', 'data']:
-            if key in result:
-                nested_result = extract_tracking_fields(result[key], booking_id)
-                if nested_result['vessel_name'] != 'Not available':
-                    return nested_result
-        
-        # Try direct vessel_voyage structure
-        if 'vessel_voyage' in result and isinstance(result['vessel_voyage'], list) and result['vessel_voyage']:
-            v = result['vessel_voyage'][0]
-            if 'vessel_name' in v:
-                extracted['vessel_name'] = v.get('vessel_name')
-                extracted['voyage_number'] = v.get('voyage_number', 'Not available')
-                # Handle different date field names
-                for date_key in ['arrival_date_time', 'arrival_date', 'etb']:
-                    if date_key in v and v[date_key]:
-                        extracted['arrival_date'] = v[date_key]
-                        break
-                if any(val != 'Not available' for val in extracted.values()):
-                    return extracted
-    
-    # Convert to string for pattern matching
-    text = str(result)
-    
-    # Try each pattern in order of reliability
-    
-    # 1. Look for structured vessel_voyage JSON pattern
-    vessel_voyage_match = re.search(r'"vessel_voyage":\s*\[\s*\{[^}]*"vessel_name":\s*"([^"]+)"[^}]*"voyage_number":\s*"([^"]+)"[^}]*"(?:arrival_date_time|arrival_date|etb)":\s*"([^"]+)"', text)
-    if vessel_voyage_match:
-        print("DEBUG: Found vessel_voyage JSON pattern")
-        vessel_name, voyage_num, arr_date = vessel_voyage_match.groups()
-        if vessel_name and voyage_num and arr_date:
-            return {
-                'booking_id': booking_id,
-                'vessel_name': vessel_name,
-                'voyage_number': voyage_num,
-                'arrival_date': arr_date
-            }
-    
-    # 2. Look for JSON code blocks
-    json_blocks = re.finditer(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text)
-    for match in json_blocks:
-        try:
-            data = json.loads(match.group())
-            # Check various JSON structures we might encounter
-            if 'vessel_voyage' in data and isinstance(data['vessel_voyage'], list) and data['vessel_voyage']:
-                v = data['vessel_voyage'][0]
-                if 'vessel_name' in v:
-                    print("DEBUG: Found vessel_voyage in JSON block")
-                    extracted['vessel_name'] = v.get('vessel_name')
-                    extracted['voyage_number'] = v.get('voyage_number', 'Not available')
-                    # Try different date field names
-                    for date_key in ['arrival_date_time', 'arrival_date', 'etb']:
-                        if date_key in v and v[date_key]:
-                            extracted['arrival_date'] = v[date_key]
-                            break
-                    if extracted['vessel_name'] != 'Not available':
-                        return extracted
-            # Alternative structure
-            elif all(key in data for key in ['vessel_name', 'voyage_number']):
-                print("DEBUG: Found direct fields in JSON block")
-                extracted['vessel_name'] = data.get('vessel_name')
-                extracted['voyage_number'] = data.get('voyage_number')
-                # Try different date field names
-                for date_key in ['arrival_date_time', 'arrival_date', 'etb']:
-                    if date_key in data and data[date_key]:
-                        extracted['arrival_date'] = data[date_key]
-                        break
-                if extracted['vessel_name'] != 'Not available':
-                    return extracted
-        except json.JSONDecodeError:
-            continue
-    
-    # 3. Try to extract from table format
-    # Matches vessel name and voyage number in various formats
-    vessel_row = re.search(
-        r'\|\s*([A-Z0-9\- ]+?)(?:\s+(\d{4,5}[A-Z]))?[^|]*\|[^|]*\|[^|]*\|[^|]*\|[^|]*\|\s*(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2})',
-        text
-    )
-    if vessel_row:
-        print("DEBUG: Found vessel info in table format")
-        vessel_name = vessel_row.group(1).strip()
-        # Group 2 might be None if voyage number wasn't in expected format
-        voyage_number = vessel_row.group(2) if vessel_row.group(2) else 'Not available'
-        arrival_date = vessel_row.group(3).strip()
-        if vessel_name and arrival_date:
-            return {
-                'booking_id': booking_id,
-                'vessel_name': vessel_name,
-                'voyage_number': voyage_number,
-                'arrival_date': arrival_date
-            }
-    
-    # 4. Look for plaintext patterns
-    # Vessel name patterns like "vessel name is YM MANDATE" or "Vessel Name: YM MANDATE"
-    vessel_name_match = re.search(r'(?:vessel\s+name\s+is|Vessel\s+Name:?)\s+([A-Z0-9\- ]+)', text)
-    voyage_num_match = re.search(r'(?:voyage\s+number\s+is|Voyage\s+Number:?)\s+([A-Z0-9\-]+)', text)
-    arrival_date_match = re.search(r'(?:arrival\s+date(?:\s+and\s+time)?\s+is|Arrival\s+Date\s+and\s+Time\s*(?:\(ETB\))?:?)\s+(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2})', text)
-    
-    if vessel_name_match:
-        extracted['vessel_name'] = vessel_name_match.group(1).strip()
-    if voyage_num_match:
-        extracted['voyage_number'] = voyage_num_match.group(1).strip()
-    if arrival_date_match:
-        extracted['arrival_date'] = arrival_date_match.group(1).strip()
-    
-    # Only return if we found something
-    if any(val != 'Not available' for val in extracted.values()):
-        print("DEBUG: Found values in plaintext")
-        return extracted
-    
-    # If we got here, we couldn't extract the data reliably
-    print("DEBUG: No reliable data found, returning default values")
-    return extracted
+    global _shared_llm
+    if _shared_llm is None:
+        _shared_llm = create_llm()
+    return _shared_llm
 
-async def track_shipping(booking_id, use_stored=True, headless=False):
+async def track_shipping(booking_id, headless=False, llm=None, browser_pool=None, budget=None, carrier=None):
     """
-    Track a shipping container from HMM through seacargotracking.net
+    Track a shipping container through seacargotracking.net with the LLM browser agent
     
     Args:
         booking_id: The booking ID to track
-        use_stored: Whether to use stored interactions if available
         headless: Whether to run browser in headless mode
+        llm: Optional chat model or ModelLadder; the process-wide ladder (get_llm()) if omitted
+        browser_pool: Optional BrowserPool to borrow a warm session from
+        budget: AgentBudget capping steps, actions and tokens; read from the environment if omitted
+        carrier: Carrier adapter giving the agent its instructions; routed by booking prefix if omitted
     
     Returns:
         Dictionary containing tracking information
     """
-    # Initialize LLM with recommended settings
-    llm = ChatGoogleGenerativeAI(  
-        model='gemini-2.0-flash-exp',
-        temperature=0.0,
-        google_api_key=google_api_key
-    )
-    
-    # Define the task with clear instructions    
-    task = f"""
-        Track HMM shipping container with booking ID '{booking_id}':
+    # The LLM is only created once a lookup needs the agent
+    if llm is None:
+        llm = get_llm()
+    carrier = carrier or carrier_for(booking_id)
     
-        1. Go to http://www.seacargotracking.net/ 
-        2. Look for HMM (Hyundai Merchant Marine) or similar options
-        3. Search for Track & Trace and click on it:
-            - Input booking ID in search or B/L No. field 
-            - Click on Search button 
-        4. Scrape the full page content and extract:
-            - Vessel name (e.g., YM MANDATE)
-            - Voyage number from vessel name format (e.g., 0096W)
-            - Arrival date with time from ETB (Estimated Time of Berthing)
+    # Define the task with clear instructions for this carrier's site and form
+    task = carrier.task(booking_id)
     
-    Return the data in this exact JSON format:
-    {{
-        "vessel_voyage": [
-            {{
-                "vessel_name": "extracted vessel name",
-                "voyage_number": "extracted voyage number",
-                "arrival_date_time": "YYYY-MM-DD HH:MM"
-            }}
-        ]
-    }}
-    """
-    
-    # Check if we have stored interactions and should use them
-    stored_interactions = None
-    if use_stored and os.path.exists(STORAGE_FILE):
-        try:
-            with open(STORAGE_FILE, 'r') as f:
-                stored_interactions = json.load(f)
-            print(f"Using stored interactions from {STORAGE_FILE}")
-        except Exception as e:
-            print(f"Error loading stored interactions: {e}")
-            stored_interactions = None
-      # Configure and create browser session for Windows Chrome
+    # Borrow a warm browser from the pool when one is provided
+    if browser_pool is not None:
+        async with browser_pool.session() as browser_session:
+            return await run_tracking_agent(task, llm, browser_session, booking_id, budget, carrier)
+
+    # Configure and create browser session for Windows Chrome
     browser_session = None
-    agent = None
     
     try:
-        browser_session = BrowserSession(
-            executable_path='C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe',
-            headless=headless,
-            viewport_size={"width": 1920, "height": 1080},
-        )
-        await browser_session.start()
-        
-        # Create the agent with optimized settings
-        agent = Agent(
+        browser_session = new_browser_session(headless=headless)
+        await start_browser_session(browser_session)
+        return await run_tracking_agent(task, llm, browser_session, booking_id, budget, carrier)
+    finally:
+        # Ensure proper cleanup
+        if browser_session:
+            await close_browser_session(browser_session)
+            # Give it a moment to clean up
+            await asyncio.sleep(0.5)
+
+async def run_tracking_agent(task, llm, browser_session, booking_id=None, budget=None, carrier=None):
+    """
+    Run the browser agent for a task on an already started browser session,
+    within the step/token budget, and append its run metrics. Unless the
+    budget disables it, the run ends as soon as the results table can be read
+    from the page.
+
+    The agent starts on the cheapest model tier and moves up when it stalls or
+    repeats itself; a run that finds none of the tracking fields is run once
+    more on the next tier (see model_tiers.py).
+    """
+    from tracking_models import result_fields
+
+    ladder = as_ladder(llm)
+    tier = 0
+    while True:
+        result, tier = await _run_agent_on_tier(task, ladder, tier, browser_session, booking_id, budget, carrier)
+        if not booking_id or not ladder.has_tier(tier + 1) or not nothing_found(result_fields(result, booking_id)):
+            return result
+        ESCALATIONS.inc(from_model=ladder.name(tier), to_model=ladder.name(tier + 1), reason='no_result')
+        print(f"⚠️ Nothing found for {booking_id} on {ladder.name(tier)}, retrying on {ladder.name(tier + 1)}")
+        tier += 1
+
+async def _run_agent_on_tier(task, ladder, tier, browser_session, booking_id, budget, carrier):
+    """One agent run starting on `tier`; returns the history and the tier it finished on."""
+    from action_cache import create_agent
+    from dom_extraction import DomExtractor
+    from gemini_client import instrument_llm
+    from tracking_models import create_controller
+
+    budget = budget or AgentBudget.from_env()
+    for model in ladder.models[tier:]:
+        instrument_llm(model)
+    with track_run(booking_id, 'agent', budget) as metrics:
+        # Create the agent with optimized settings; the controller makes the
+        # final answer a validated TrackingOutput instead of free text
+        agent = create_agent(
+            booking_id,
+            budget,
             task=task,
-            llm=llm,
-            browser_session=browser_session
+            llm=ladder[tier],
+            browser_session=browser_session,
+            controller=create_controller(),
         )
         
         # Run the agent
-        result = await agent.run()
-        
-        # Debug: Print raw result
-        print(f"\nDEBUG: Raw agent result type: {type(result)}")
-        print(f"DEBUG: Raw agent result: {result}")
-        
-        return result
-    finally:
-        # Ensure proper cleanup
-        try:
-            if browser_session:
-                await browser_session.close()
-                # Give it a moment to clean up
-                await asyncio.sleep(0.5)
-        except Exception as e:
-            print(f"Warning: Error closing browser session: {e}")
+        dom_extractor = None
+        if budget.dom_extract and booking_id:
+            dom_extractor = DomExtractor(booking_id, carrier or carrier_for(booking_id), metrics)
+        escalator = TierEscalator(ladder, tier, metrics, then=dom_extractor)
+        step_spans = AgentStepSpans(then=escalator)
+        result = await agent.run(max_steps=budget.max_steps, on_step_start=step_spans.on_step_start,
+                                 on_step_end=step_spans.on_step_end)
+        metrics.record_history(result)
+        metrics.page_load_seconds = await page_load_seconds(await browser_session.get_current_page())
+    
+    logger.debug("Raw agent result (%s): %s", type(result).__name__, result)
 
-async def main():
-    # Example booking ID from the assignment
-    booking_id = "SINI25432400"
+    return result, escalator.tier
+
+async def lookup_booking(booking_id, headless=False, llm=None, browser_pool=None, use_http=True, max_age=None,
+                         budget=None, on_agent_result=None):
+    """
+    Resolve a booking from the result cache, then its carrier's direct HTTP
+    fast path, falling back to the browser agent only when both miss.
     
-    # Get command line arguments if provided
-    import sys
-    if len(sys.argv) > 1:
-        booking_id = sys.argv[1]
+    Args:
+        max_age: Maximum age in seconds of a cached result (None for the cache TTL, 0 to skip)
+        budget: AgentBudget for the browser agent, if it has to run
+        on_agent_result: Called with the agent's raw result when the browser agent ran
     
-    # Check if headless mode is specified
-    headless = "--headless" in sys.argv
+    Returns:
+        Dict with booking_id, vessel_name, voyage_number and arrival_date, plus
+        'fetched_at' if it came from the cache
+    """
+    cache = get_cache()
+    cached = cache.get(booking_id, max_age=max_age)
+    if cached is not None:
+        return cached
+    from tracking_models import result_fields
+
+    # Each carrier's cheapest path first: its direct HTTP fetcher, if it has one
+    carrier = carrier_for(booking_id)
+    minimal = None
+    fast_path = get_fast_path_supervisor(carrier)
+    tried_http = use_http and carrier.has_fast_path and fast_path.allow()
+    if tried_http:
+        with span('http.fetch', carrier=carrier.code):
+            minimal = await fast_path.call(carrier.fetch, booking_id)
+    if minimal is not None:
+        get_result_store().add(minimal, 'http')
+    else:
+        if tried_http:
+            FALLBACKS.inc(from_path='http', to_path='agent')
+        result = await track_shipping(booking_id, headless=headless, llm=llm, browser_pool=browser_pool, budget=budget,
+                                      carrier=carrier)
+        minimal = result_fields(result, booking_id)
+        get_result_store().add(minimal, 'agent', raw_history=result)
+        if on_agent_result is not None:
+            on_agent_result(result)
+    cache.put(minimal)
+    get_voyage_index().record(minimal)
+    return minimal
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Track a shipment through seacargotracking.net.")
+    # Example booking ID from the assignment
+    parser.add_argument('booking_id', nargs='?', default="SINI25432400", help="Booking ID to track")
+    parser.add_argument('--headless', action='store_true', help="Run the browser in headless mode")
+    parser.add_argument('--no-http', dest='use_http', action='store_false',
+                        help="Skip the direct HTTP fast path and always use the browser")
+    parser.add_argument('--max-age', type=float, default=None,
+                        help="Reuse a cached result up to this many seconds old (0 disables the cache)")
+    add_budget_arguments(parser)
+    return parser.parse_args(argv)
+
+async def main(argv=None):
+    args = parse_args(argv)
+    # Load environment variables from .env
+    load_dotenv()
+    configure_telemetry()
+    booking_id = args.booking_id
+    headless = args.headless
     
-    print(f"Tracking booking ID: {booking_id}")
+    carrier = carrier_for(booking_id)
+    print(f"Tracking booking ID: {booking_id} ({carrier.name})")
     print(f"Headless mode: {'enabled' if headless else 'disabled'}")
     
-    result = await track_shipping(booking_id, headless=headless)
+    # Cache, then the carrier's HTTP fast path, then the browser agent
+    agent_results = []
+    try:
+        minimal = await lookup_booking(booking_id, headless=headless, use_http=args.use_http, max_age=args.max_age,
+                                       budget=budget_from_args(args), on_agent_result=agent_results.append)
+    finally:
+        # Only imported (with httpx) if the fast path ran, so cache hits stay fast
+        if 'http_fetcher' in sys.modules:
+            await sys.modules['http_fetcher'].close_fetcher()
+
+    if 'fetched_at' in minimal:
+        print(f"\n✅ Cached result from {datetime.fromtimestamp(minimal['fetched_at']).isoformat()}:")
+        print(json.dumps(minimal, indent=2, ensure_ascii=False))
+        return
+
+    if not agent_results:
+        save_interactions(carrier.storage_file, booking_id, minimal, [])
+        print(f"\n✅ Saved tracking result to {carrier.storage_file}:")
+        print(json.dumps(minimal, indent=2, ensure_ascii=False))
+        return
+
+    result = agent_results[0]
     print("\nResult:")
     print(result)
-
-    # Extract and store only the required fields in the JSON file
-    minimal = extract_tracking_fields(result, booking_id)    
-    
-    # Save both the raw result and the extracted data for debugging
-    debug_data = {
-        "timestamp": datetime.now().isoformat(),
-        "booking_id": booking_id,
-        "raw_result": str(result),
-        "extracted_data": minimal
-    }
-    debug_file = os.path.join(STORAGE_DIR, f"debug_{booking_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-    with open(debug_file, 'w', encoding='utf-8') as f:
-        json.dump(debug_data, f, indent=2, ensure_ascii=False)
-    print(f"\nDEBUG: Saved debug data to {debug_file}")
+    print("\nStored the result and agent history (query with: python result_store.py history "
+          f"{booking_id})")
     
-    # Save the minimal tracking result
-    with open(STORAGE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(minimal, f, indent=2, ensure_ascii=False)
-    print(f"\n✅ Saved minimal tracking result to {STORAGE_FILE}:")
+    # Save the minimal tracking result with the browser steps that produced it
+    steps = record_script(result, booking_id) if minimal['vessel_name'] != 'Not available' else []
+    save_interactions(carrier.storage_file, booking_id, minimal, steps)
+    print(f"\n✅ Saved tracking result and {len(steps)} replay steps to {carrier.storage_file}:")
     print(json.dumps(minimal, indent=2, ensure_ascii=False))
 
-
 if __name__ == "__main__":
     asyncio.run(main())
 
@@ -0,0 +1,177 @@
+"""
+Run the agent on the cheapest configured Gemini model and escalate to a
+stronger one only when the cheap one is not getting anywhere.
+
+GEMINI_MODEL_TIERS lists the models from cheapest and fastest to strongest.
+Every agent run starts on the first tier. TierEscalator, passed to
+Agent.run() as part of its on_step_end hook, moves the running agent one tier
+up when it:
+    - stalls: the last ESCALATE_STALL_STEPS steps all ended in an error,
+    - repeats itself: the last ESCALATE_REPEAT_STEPS steps sent the same
+      actions on the same page.
+If a run still ends with every tracking field "Not available", the lookup
+runs the agent once more on the next tier (see main.run_tracking_agent).
+
+Each escalation is counted by the tracking_model_escalations counter with
+its reason. The latency of every call is observed per model in
+tracking_llm_call_seconds, and each run records the tier it finished on and
+its escalations in run_metrics.jsonl.
+
+Settings (environment / .env):
+    GEMINI_MODEL_TIERS     Comma-separated models, cheapest first
+    ESCALATE_STALL_STEPS   Consecutive failed steps that escalate
+    ESCALATE_REPEAT_STEPS  Identical consecutive steps that escalate
+"""
+import json
+import os
+from dataclasses import dataclass
+
+from telemetry import counter, get_logger
+from tracking_parser import NOT_AVAILABLE
+
+logger = get_logger('tiers')
+
+DEFAULT_TIERS = 'gemini-2.0-flash-lite,gemini-2.0-flash-exp'
+
+ESCALATIONS = counter('tracking_model_escalations', "Agent runs moved to a stronger model, by reason",
+                      ('from_model', 'to_model', 'reason'))
+
+
+def tier_names_from_env():
+    """The configured models, cheapest first."""
+    names = [name.strip() for name in os.getenv('GEMINI_MODEL_TIERS', DEFAULT_TIERS).split(',')]
+    names = [name for name in names if name]
+    if not names:
+        raise ValueError("GEMINI_MODEL_TIERS does not name any model")
+    return names
+
+
+def model_name(llm):
+    return str(getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or type(llm).__name__)
+
+
+class ModelLadder:
+    """
+    Chat models ordered from cheapest to strongest; shared by every lookup
+    like a single chat model.
+
+    Args:
+        models: Chat models, cheapest first
+    """
+
+    def __init__(self, models):
+        if not models:
+            raise ValueError("A model ladder needs at least one model")
+        self.models = list(models)
+
+    def __len__(self):
+        return len(self.models)
+
+    def __getitem__(self, tier):
+        return self.models[tier]
+
+    def name(self, tier):
+        return model_name(self.models[tier])
+
+    def has_tier(self, tier):
+        return tier < len(self.models)
+
+
+def as_ladder(llm):
+    """A ModelLadder as is; any other chat model as a ladder of one tier."""
+    return llm if isinstance(llm, ModelLadder) else ModelLadder([llm])
+
+
+def nothing_found(extracted):
+    """Whether an extraction found none of the tracking fields."""
+    return all(extracted.get(field, NOT_AVAILABLE) == NOT_AVAILABLE
+               for field in ('vessel_name', 'voyage_number', 'arrival_date'))
+
+
+@dataclass
+class EscalationPolicy:
+    """When a running agent moves to the next model tier."""
+
+    stall_steps: int = 2
+    repeat_steps: int = 3
+
+    @classmethod
+    def from_env(cls):
+        default = cls()
+        return cls(
+            stall_steps=int(os.getenv('ESCALATE_STALL_STEPS', default.stall_steps)),
+            repeat_steps=int(os.getenv('ESCALATE_REPEAT_STEPS', default.repeat_steps)),
+        )
+
+
+def _failed(item):
+    return any(result.error for result in item.result)
+
+
+def _step_key(item):
+    if item.model_output is None:
+        return None
+    actions = [action.model_dump(exclude_unset=True) for action in item.model_output.action]
+    return json.dumps(actions, sort_keys=True, default=str), item.state.url
+
+
+class TierEscalator:
+    """
+    on_step_end hook moving a stuck agent to the next model tier.
+
+    Args:
+        ladder: ModelLadder the agent runs on
+        tier: Tier the agent was created with
+        metrics: Optional RunMetrics recording the tier and escalations
+        policy: EscalationPolicy, read from the environment if omitted
+        then: Optional on_step_end hook run before the check (e.g. DomExtractor)
+    """
+
+    def __init__(self, ladder, tier=0, metrics=None, policy=None, then=None):
+        self.ladder = ladder
+        self.tier = tier
+        self.metrics = metrics
+        self.policy = policy or EscalationPolicy.from_env()
+        self.then = then
+        # Only steps taken on the current tier count towards the next escalation
+        self._since = 0
+        if metrics is not None:
+            metrics.model_tier = ladder.name(tier)
+
+    def _reason(self, steps):
+        stall, repeat = self.policy.stall_steps, self.policy.repeat_steps
+        if stall > 0 and len(steps) >= stall and all(_failed(item) for item in steps[-stall:]):
+            return 'stall'
+        if repeat > 1 and len(steps) >= repeat:
+            keys = {_step_key(item) for item in steps[-repeat:]}
+            if len(keys) == 1 and None not in keys:
+                return 'repeat'
+        return None
+
+    def escalate(self, agent, reason):
+        previous, self.tier = self.ladder.name(self.tier), self.tier + 1
+        llm = self.ladder[self.tier]
+        if agent.settings.page_extraction_llm is agent.llm:
+            agent.settings.page_extraction_llm = llm
+        agent.llm = llm
+        agent.model_name = self.ladder.name(self.tier)
+        # Cached decisions may be what the agent keeps repeating
+        forget = getattr(agent, 'forget_reused', None)
+        if forget is not None:
+            forget()
+        self._since = len(agent.state.history.history)
+        ESCALATIONS.inc(from_model=previous, to_model=agent.model_name, reason=reason)
+        if self.metrics is not None:
+            self.metrics.model_tier = agent.model_name
+            self.metrics.escalations += 1
+        logger.info("Agent %s on %s, escalating to %s", reason, previous, agent.model_name)
+
+    async def __call__(self, agent):
+        if self.then is not None:
+            await self.then(agent)
+        history = agent.state.history
+        if history.is_done() or not self.ladder.has_tier(self.tier + 1):
+            return
+        reason = self._reason(history.history[self._since:])
+        if reason is not None:
+            self.escalate(agent, reason)
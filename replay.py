@@ -0,0 +1,257 @@
+"""
+Record the browser actions of a successful agent run and replay them with
+Playwright for other booking IDs, without calling the LLM.
+
+A recorded script is a list of steps such as:
+
+    {"action": "navigate", "url": "http://www.seacargotracking.net/"}
+    {"action": "click", "xpath": "html/body/div[2]/a[7]", "css_selector": "a[href*='hmm']"}
+    {"action": "fill", "xpath": "...", "css_selector": "...", "value": "{booking_id}"}
+    {"action": "press", "keys": "Enter"}
+    {"action": "switch_tab", "page_index": 1}
+
+The booking ID typed during recording is stored as the `{booking_id}`
+placeholder and substituted again on replay.
+"""
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from telemetry import EXTRACTION_MISSES, span
+from tracking_parser import fields_from_tables, NOT_AVAILABLE
+
+BOOKING_ID_PLACEHOLDER = '{booking_id}'
+STEP_TIMEOUT_MS = 15000
+RESULTS_TIMEOUT_MS = 20000
+
+# Returns every table on the page as a list of rows of cell texts
+TABLES_JS = """
+() => Array.from(document.querySelectorAll('table')).map(table =>
+    Array.from(table.rows).map(row =>
+        Array.from(row.cells).map(cell => cell.innerText.trim())))
+"""
+
+
+class ReplayError(Exception):
+    """Raised when a recorded step cannot be replayed on the current page."""
+
+    def __init__(self, message, step_index=None, step=None):
+        super().__init__(message)
+        self.step_index = step_index
+        self.step = step
+
+
+def _element_locator(element):
+    locator = {}
+    xpath = getattr(element, 'xpath', None)
+    css_selector = getattr(element, 'css_selector', None)
+    if xpath:
+        locator['xpath'] = xpath
+    if css_selector:
+        locator['css_selector'] = css_selector
+    return locator
+
+
+def record_script(history, booking_id):
+    """
+    Convert the action history of a browser-use Agent run into a replay script.
+    Only actions that completed without error are recorded.
+
+    Args:
+        history: AgentHistoryList returned by Agent.run()
+        booking_id: The booking ID used in the run, replaced by a placeholder
+
+    Returns:
+        List of replay steps
+    """
+    steps = []
+    for item in history.history:
+        if not item.model_output:
+            continue
+        interacted = item.state.interacted_element or []
+        for i, action in enumerate(item.model_output.action):
+            if i < len(item.result) and item.result[i].error:
+                continue
+            element = interacted[i] if i < len(interacted) else None
+            for name, params in action.model_dump(exclude_unset=True).items():
+                params = params or {}
+                if name in ('go_to_url', 'open_tab') and params.get('url'):
+                    steps.append({'action': 'navigate', 'url': params['url']})
+                elif name == 'click_element_by_index' and element is not None:
+                    steps.append({'action': 'click', **_element_locator(element)})
+                elif name == 'input_text' and element is not None:
+                    value = str(params.get('text', '')).replace(booking_id, BOOKING_ID_PLACEHOLDER)
+                    steps.append({'action': 'fill', **_element_locator(element), 'value': value})
+                elif name == 'send_keys' and params.get('keys'):
+                    steps.append({'action': 'press', 'keys': params['keys']})
+                elif name == 'switch_tab' and 'page_id' in params:
+                    steps.append({'action': 'switch_tab', 'page_index': params['page_id']})
+    return steps
+
+
+def load_interactions(storage_file):
+    """Load the stored interactions file, or None if it does not exist or is unreadable."""
+    if not os.path.exists(storage_file):
+        return None
+    try:
+        with open(storage_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading stored interactions: {e}")
+        return None
+
+
+def versioned_file(storage_file, version):
+    """Where version `version` of a replaced script is kept, e.g. hmm_tracking_interactions.v2.json."""
+    root, extension = os.path.splitext(storage_file)
+    return f"{root}.v{version}{extension}"
+
+
+def script_version(stored):
+    """Version of a stored script; files written before versioning count as version 1."""
+    if not stored:
+        return 0
+    return stored.get('version', 1 if stored.get('steps') else 0)
+
+
+def _write_json(path, data):
+    """Write JSON to a temporary file and move it into place, so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with span('storage.write', target='interactions'):
+        fd, temporary = tempfile.mkstemp(dir=directory or '.', prefix=os.path.basename(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+def save_interactions(storage_file, booking_id, extracted, steps, validated_with=None):
+    """
+    Store the extracted fields together with the replay script that produced them.
+    If `steps` is empty the previously stored script is kept. A different
+    script is stored as the next version, and the one it replaces is kept
+    beside it (see versioned_file()).
+
+    Args:
+        validated_with: Booking IDs the script was checked against before it was saved
+
+    Returns:
+        The version of the stored script
+    """
+    previous = load_interactions(storage_file) or {}
+    version = script_version(previous)
+    if not steps or steps == previous.get('steps'):
+        steps = previous.get('steps', [])
+        validated_with = validated_with or previous.get('validated_with')
+    else:
+        if previous.get('steps'):
+            _write_json(versioned_file(storage_file, version), previous)
+        version += 1
+    data = {
+        'timestamp': datetime.now().isoformat(),
+        'booking_id': booking_id,
+        'result': extracted,
+        'steps': steps,
+        'version': version,
+    }
+    if validated_with:
+        data['validated_with'] = validated_with
+    _write_json(storage_file, data)
+    return version
+
+
+async def _locate(page, step):
+    """Find the recorded element, preferring the CSS selector over the XPath."""
+    candidates = []
+    if step.get('css_selector'):
+        candidates.append(page.locator(step['css_selector']))
+    if step.get('xpath'):
+        xpath = step['xpath'] if step['xpath'].startswith('/') else '/' + step['xpath']
+        candidates.append(page.locator(f"xpath={xpath}"))
+
+    for locator in candidates:
+        try:
+            if await locator.count() == 1:
+                await locator.wait_for(state='visible', timeout=STEP_TIMEOUT_MS)
+                return locator
+        except Exception:
+            continue
+    raise ReplayError(f"Element not found for {step['action']} step")
+
+
+async def _follow_new_page(page, pages_before):
+    """Switch to a tab opened by the last action, if there is one."""
+    pages = page.context.pages
+    if len(pages) > pages_before:
+        page = pages[-1]
+        await page.wait_for_load_state('domcontentloaded', timeout=STEP_TIMEOUT_MS)
+    return page
+
+
+async def replay_script(steps, booking_id, page, parse_tables=fields_from_tables):
+    """
+    Replay a recorded script with Playwright and read the tracking fields from
+    the results table.
+
+    Args:
+        steps: Replay steps produced by record_script()
+        booking_id: The booking ID to substitute into typed values
+        page: Playwright page to start from
+        parse_tables: Reads the fields from the page's tables, e.g. Carrier.parse_tables
+
+    Returns:
+        Dict with booking_id, vessel_name, voyage_number and arrival_date
+
+    Raises:
+        ReplayError: If a step fails or no results table is found
+    """
+    for index, step in enumerate(steps):
+        try:
+            pages_before = len(page.context.pages)
+            action = step['action']
+            with span('navigation' if action == 'navigate' else 'replay.step', action=action, step=index):
+                if action == 'navigate':
+                    await page.goto(step['url'], wait_until='domcontentloaded', timeout=STEP_TIMEOUT_MS)
+                elif action == 'click':
+                    locator = await _locate(page, step)
+                    await locator.click(timeout=STEP_TIMEOUT_MS)
+                    # Give links that open a new tab a moment to do so
+                    await asyncio.sleep(0.3)
+                    page = await _follow_new_page(page, pages_before)
+                elif action == 'fill':
+                    locator = await _locate(page, step)
+                    await locator.fill(step['value'].replace(BOOKING_ID_PLACEHOLDER, booking_id), timeout=STEP_TIMEOUT_MS)
+                elif action == 'press':
+                    await page.keyboard.press(step['keys'])
+                    await asyncio.sleep(0.3)
+                    page = await _follow_new_page(page, pages_before)
+                elif action == 'switch_tab':
+                    page = page.context.pages[step['page_index']]
+                    await page.bring_to_front()
+                else:
+                    raise ReplayError(f"Unknown replay action '{action}'")
+        except ReplayError as e:
+            e.step_index, e.step = index, step
+            raise
+        except Exception as e:
+            raise ReplayError(f"{type(e).__name__}: {e}", index, step) from e
+
+    try:
+        await page.wait_for_selector('table', timeout=RESULTS_TIMEOUT_MS)
+        await page.wait_for_load_state('networkidle', timeout=RESULTS_TIMEOUT_MS)
+    except Exception as e:
+        raise ReplayError(f"Results table did not load: {e}") from e
+
+    with span('extraction', source='replay'):
+        extracted = parse_tables(await page.evaluate(TABLES_JS), booking_id)
+    if not extracted or extracted['vessel_name'] == NOT_AVAILABLE:
+        EXTRACTION_MISSES.inc(source='replay')
+        raise ReplayError("No vessel schedule found on the results page")
+    return extracted
@@ -0,0 +1,141 @@
+"""
+Cache of extracted tracking results keyed by booking ID.
+
+Two tiers: a small in-memory LRU in front of an SQLite table on disk, so a
+repeated lookup within the TTL returns without starting a browser, calling
+Gemini or even touching the network. Only results that actually found a
+vessel are cached.
+
+Settings (environment / .env):
+    TRACKING_CACHE_TTL   Default maximum age of a cached result in seconds
+"""
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from telemetry import CACHE_LOOKUPS, span
+
+TRACKING_DB = os.path.join("interactions", "tracking.db")
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MEMORY_SIZE = 1024
+
+FIELDS = ('booking_id', 'vessel_name', 'voyage_number', 'arrival_date')
+
+
+def connect(db_path=TRACKING_DB):
+    """Open the tracking database, creating its directory if needed."""
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ResultCache:
+    """
+    TTL cache of tracking results with an in-memory LRU front tier.
+
+    Args:
+        db_path: SQLite database file backing the cache
+        ttl: Default maximum age in seconds of a result returned by get()
+        memory_size: Number of results kept in the in-memory tier
+    """
+
+    def __init__(self, db_path=TRACKING_DB, ttl=None, memory_size=DEFAULT_MEMORY_SIZE):
+        self.ttl = ttl if ttl is not None else float(os.getenv("TRACKING_CACHE_TTL", DEFAULT_TTL))
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._conn = connect(db_path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS tracking_cache (
+                booking_id TEXT PRIMARY KEY,
+                vessel_name TEXT,
+                voyage_number TEXT,
+                arrival_date TEXT,
+                fetched_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def _remember(self, booking_id, record, fetched_at):
+        self._memory[booking_id] = (record, fetched_at)
+        self._memory.move_to_end(booking_id)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, booking_id, max_age=None):
+        """
+        Return the cached result for a booking if it is fresh enough.
+
+        Args:
+            booking_id: The booking ID to look up
+            max_age: Maximum age in seconds, defaults to the cache TTL; 0 disables reads
+
+        Returns:
+            Tracking fields dict with an extra 'fetched_at' timestamp, or None
+        """
+        max_age = self.ttl if max_age is None else max_age
+        if max_age <= 0:
+            return None
+        oldest = time.time() - max_age
+
+        entry = self._memory.get(booking_id)
+        if entry is None:
+            row = self._conn.execute(
+                "SELECT vessel_name, voyage_number, arrival_date, fetched_at FROM tracking_cache WHERE booking_id = ?",
+                (booking_id,),
+            ).fetchone()
+            if row is None:
+                CACHE_LOOKUPS.inc(outcome='miss')
+                return None
+            record = dict(zip(FIELDS, (booking_id,) + row[:3]))
+            entry = (record, row[3])
+            self._remember(booking_id, *entry)
+        else:
+            self._memory.move_to_end(booking_id)
+
+        record, fetched_at = entry
+        if fetched_at < oldest:
+            CACHE_LOOKUPS.inc(outcome='stale')
+            return None
+        CACHE_LOOKUPS.inc(outcome='hit')
+        return dict(record, fetched_at=fetched_at)
+
+    def put(self, extracted, fetched_at=None):
+        """Store a result. Results without a vessel name are not cached."""
+        if extracted.get('vessel_name', 'Not available') == 'Not available':
+            return
+        fetched_at = fetched_at or time.time()
+        record = {field: extracted.get(field, 'Not available') for field in FIELDS}
+        with span('storage.write', target='cache'):
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tracking_cache VALUES (?, ?, ?, ?, ?)",
+                tuple(record[field] for field in FIELDS) + (fetched_at,),
+            )
+            self._conn.commit()
+        self._remember(record['booking_id'], record, fetched_at)
+
+    def purge(self, older_than=None):
+        """Delete results older than `older_than` seconds (the TTL by default)."""
+        cutoff = time.time() - (self.ttl if older_than is None else older_than)
+        self._conn.execute("DELETE FROM tracking_cache WHERE fetched_at < ?", (cutoff,))
+        self._conn.commit()
+        for booking_id in [key for key, (_, fetched_at) in self._memory.items() if fetched_at < cutoff]:
+            del self._memory[booking_id]
+
+    def close(self):
+        self._conn.close()
+
+
+_shared_cache = None
+
+
+def get_cache():
+    """Return the process-wide result cache."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ResultCache()
+    return _shared_cache
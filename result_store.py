@@ -0,0 +1,353 @@
+"""
+Append-only store of every tracking result, with compressed agent histories.
+
+Each lookup appends one row to an indexed SQLite table instead of writing a
+pretty-printed debug file per run, so past results can be queried (latest
+per booking, every booking on a sailing, a booking's history) and disk use
+stays bounded: raw agent histories are zstd-compressed and pruned after a
+retention period, as are old result rows.
+
+Writes are buffered and committed in batches, at the latest FLUSH_INTERVAL
+seconds after they were added when an asyncio event loop is running (the
+tracking service, batch runs), so quiet periods never leave results
+uncommitted in a long-running process.
+
+Usage:
+    python result_store.py latest [BOOKING_ID ...]
+    python result_store.py history SINI25432400
+    python result_store.py voyage "YM MANDATE" 0096W
+    python result_store.py raw 42
+    python result_store.py prune
+    python result_store.py stats
+
+Settings (environment / .env):
+    RESULT_RETENTION_DAYS    Days result rows are kept
+    HISTORY_RETENTION_DAYS   Days raw agent histories are kept
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+
+import zstandard
+
+from result_cache import connect
+from telemetry import span
+from tracking_parser import NOT_AVAILABLE
+
+RESULTS_DB = os.path.join("interactions", "results.db")
+DEFAULT_RESULT_RETENTION_DAYS = 365
+DEFAULT_HISTORY_RETENTION_DAYS = 14
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 5.0
+PRUNE_INTERVAL = 60 * 60
+ZSTD_LEVEL = 10
+
+RESULT_COLUMNS = ('id', 'booking_id', 'vessel_name', 'voyage_number', 'arrival_date', 'source', 'recorded_at')
+
+
+def compress(text):
+    """Compress a raw history, returning (codec, data)."""
+    return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(text.encode('utf-8'))
+
+
+def decompress(codec, data):
+    """Decompress a raw history; rows written before zstandard was required may be zlib."""
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+
+def serialize_history(result):
+    """Serialise a browser-use AgentHistoryList (or any agent result) for storage."""
+    if hasattr(result, 'model_dump_json'):
+        try:
+            return result.model_dump_json()
+        except Exception:
+            pass
+    return str(result)
+
+
+class ResultStore:
+    """
+    Append-only SQLite store of tracking results.
+
+    Args:
+        db_path: SQLite database file
+        batch_size: Buffered results that trigger a commit
+        flush_interval: Seconds after which buffered results are committed, by a timer on
+            the running event loop or else on the next add()
+        result_retention_days: Days result rows are kept
+        history_retention_days: Days raw agent histories are kept
+    """
+
+    def __init__(self, db_path=RESULTS_DB, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 result_retention_days=None, history_retention_days=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.result_retention_days = result_retention_days or float(
+            os.getenv('RESULT_RETENTION_DAYS', DEFAULT_RESULT_RETENTION_DAYS))
+        self.history_retention_days = history_retention_days or float(
+            os.getenv('HISTORY_RETENTION_DAYS', DEFAULT_HISTORY_RETENTION_DAYS))
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._flush_timer = None
+        self._last_prune = 0.0
+        self._conn = connect(db_path)
+        # Lets prune() hand freed pages back to the file system; only takes effect on a new database
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                booking_id TEXT NOT NULL,
+                vessel_name TEXT,
+                voyage_number TEXT,
+                arrival_date TEXT,
+                source TEXT,
+                recorded_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS raw_histories (
+                result_id INTEGER PRIMARY KEY REFERENCES results (id),
+                codec TEXT NOT NULL,
+                data BLOB NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_booking ON results (booking_id, recorded_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_voyage ON results (vessel_name, voyage_number)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_recorded ON results (recorded_at)")
+        self._conn.commit()
+
+    def add(self, extracted, source, raw_history=None, recorded_at=None):
+        """
+        Buffer one result, committing the buffer when it is full or old enough.
+
+        Args:
+            extracted: Tracking fields dict
+            source: Where the result came from ('http', 'replay', 'agent', 'shared')
+            raw_history: Agent result to keep (compressed) for debugging
+        """
+        raw = compress(serialize_history(raw_history)) if raw_history is not None else None
+        row = tuple(extracted.get(field, NOT_AVAILABLE) for field in RESULT_COLUMNS[1:5])
+        self._pending.append((row + (source, recorded_at or time.time()), raw))
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop: committed by the next add(), or by close() at exit
+            return
+        self._flush_timer = loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        """Commit the buffered results in one transaction."""
+        self._last_flush = time.monotonic()
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with span('storage.write', target='results', rows=len(pending)), self._conn:
+            for row, raw in pending:
+                cursor = self._conn.execute(
+                    "INSERT INTO results (booking_id, vessel_name, voyage_number, arrival_date, source, recorded_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                if raw is not None:
+                    self._conn.execute("INSERT INTO raw_histories VALUES (?, ?, ?)", (cursor.lastrowid,) + raw)
+        if time.time() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self):
+        """
+        Apply the retention policy.
+
+        Returns:
+            Tuple of (result rows deleted, raw histories deleted)
+        """
+        self._last_prune = time.time()
+        result_cutoff = time.time() - self.result_retention_days * 86400
+        history_cutoff = time.time() - self.history_retention_days * 86400
+        with self._conn:
+            histories = self._conn.execute(
+                "DELETE FROM raw_histories WHERE result_id IN (SELECT id FROM results WHERE recorded_at < ?)",
+                (max(result_cutoff, history_cutoff),),
+            ).rowcount
+            results = self._conn.execute("DELETE FROM results WHERE recorded_at < ?", (result_cutoff,)).rowcount
+        self._conn.execute("PRAGMA incremental_vacuum")
+        return results, histories
+
+    def _rows(self, sql, params=()):
+        return [dict(zip(RESULT_COLUMNS, row)) for row in self._conn.execute(sql, params).fetchall()]
+
+    def latest(self, booking_ids=None):
+        """The most recent result of each booking (of the given ones, or of all)."""
+        self.flush()
+        sql = f"""SELECT {', '.join(RESULT_COLUMNS)} FROM results
+                  WHERE id IN (SELECT MAX(id) FROM results {{where}} GROUP BY booking_id)
+                  ORDER BY booking_id"""
+        if booking_ids:
+            placeholders = ', '.join('?' * len(booking_ids))
+            return self._rows(sql.format(where=f"WHERE booking_id IN ({placeholders})"), tuple(booking_ids))
+        return self._rows(sql.format(where=''))
+
+    def recent_found(self, limit=50):
+        """The latest result of the most recently resolved bookings that found a vessel, newest first."""
+        self.flush()
+        return self._rows(
+            f"""SELECT {', '.join(RESULT_COLUMNS)} FROM results
+                WHERE id IN (SELECT MAX(id) FROM results GROUP BY booking_id) AND vessel_name != ?
+                ORDER BY id DESC LIMIT ?""",
+            (NOT_AVAILABLE, limit),
+        )
+
+    def history(self, booking_id):
+        """Every result recorded for a booking, oldest first."""
+        self.flush()
+        return self._rows(
+            f"SELECT {', '.join(RESULT_COLUMNS)} FROM results WHERE booking_id = ? ORDER BY recorded_at, id",
+            (booking_id,),
+        )
+
+    def voyage(self, vessel_name, voyage_number):
+        """The latest result of every booking last seen on a sailing."""
+        self.flush()
+        return self._rows(
+            f"""SELECT {', '.join(RESULT_COLUMNS)} FROM results
+                WHERE id IN (SELECT MAX(id) FROM results GROUP BY booking_id)
+                AND UPPER(vessel_name) = ? AND UPPER(voyage_number) = ?
+                ORDER BY booking_id""",
+            (vessel_name.strip().upper(), voyage_number.strip().upper()),
+        )
+
+    def rows(self, after_id=0):
+        """
+        Every result with an id above `after_id`, in id order, as tuples of
+        RESULT_COLUMNS (see etb_analytics.py, which turns them into arrays).
+        """
+        self.flush()
+        return self._conn.execute(
+            f"SELECT {', '.join(RESULT_COLUMNS)} FROM results WHERE id > ? ORDER BY id", (after_id,)
+        ).fetchall()
+
+    def id_range(self):
+        """The lowest and highest result id still stored, (None, None) when empty."""
+        self.flush()
+        return self._conn.execute("SELECT MIN(id), MAX(id) FROM results").fetchone()
+
+    def raw_history(self, result_id):
+        """The decompressed agent history stored with a result, or None."""
+        self.flush()
+        row = self._conn.execute("SELECT codec, data FROM raw_histories WHERE result_id = ?", (result_id,)).fetchone()
+        return decompress(*row) if row else None
+
+    def stats(self):
+        self.flush()
+        results, bookings, first, last = self._conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT booking_id), MIN(recorded_at), MAX(recorded_at) FROM results"
+        ).fetchone()
+        histories, history_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM raw_histories"
+        ).fetchone()
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            'results': results,
+            'bookings': bookings,
+            'first_recorded': datetime.fromtimestamp(first).isoformat() if first else None,
+            'last_recorded': datetime.fromtimestamp(last).isoformat() if last else None,
+            'raw_histories': histories,
+            'raw_history_bytes': history_bytes,
+            'database_bytes': page_count * page_size,
+        }
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+_shared_store = None
+
+
+def get_result_store():
+    """Return the process-wide result store; buffered results are committed at exit."""
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = ResultStore()
+        atexit.register(close_result_store)
+    return _shared_store
+
+
+def close_result_store():
+    """Commit and close the process-wide result store, if one was opened."""
+    global _shared_store
+    if _shared_store is not None:
+        _shared_store.close()
+        _shared_store = None
+
+
+def _print_rows(rows):
+    for row in rows:
+        row['recorded_at'] = datetime.fromtimestamp(row['recorded_at']).isoformat()
+        print(json.dumps(row, ensure_ascii=False))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query the stored tracking results.")
+    parser.add_argument('--db', default=RESULTS_DB, help=f"Results database (default: {RESULTS_DB})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    latest = commands.add_parser('latest', help="Latest result per booking")
+    latest.add_argument('booking_ids', nargs='*', help="Limit to these bookings")
+    history = commands.add_parser('history', help="Every result of a booking")
+    history.add_argument('booking_id')
+    voyage = commands.add_parser('voyage', help="Bookings last seen on a sailing")
+    voyage.add_argument('vessel_name')
+    voyage.add_argument('voyage_number')
+    raw = commands.add_parser('raw', help="Print the agent history stored with a result")
+    raw.add_argument('result_id', type=int)
+    commands.add_parser('prune', help="Apply the retention policy now")
+    commands.add_parser('stats', help="Row counts and disk use")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = ResultStore(args.db)
+    try:
+        if args.command == 'latest':
+            _print_rows(store.latest(args.booking_ids))
+        elif args.command == 'history':
+            _print_rows(store.history(args.booking_id))
+        elif args.command == 'voyage':
+            _print_rows(store.voyage(args.vessel_name, args.voyage_number))
+        elif args.command == 'raw':
+            raw = store.raw_history(args.result_id)
+            if raw is None:
+                print(f"No agent history stored for result {args.result_id}", file=sys.stderr)
+                sys.exit(1)
+            print(raw)
+        elif args.command == 'prune':
+            results, histories = store.prune()
+            print(f"Deleted {results} results and {histories} agent histories")
+        elif args.command == 'stats':
+            print(json.dumps(store.stats(), indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
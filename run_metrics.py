@@ -0,0 +1,248 @@
+"""
+Step/token budgets for the browser-use Agent and per-run metrics.
+
+Every agent or replay run appends one JSON line to results/run_metrics.jsonl
+with the number of steps, LLM calls, LLM latency, tokens in/out, the model
+tier it finished on and its escalations, page load time and total wall time,
+together with the budget it ran under. That makes it possible to find the
+cheapest configuration that still resolves bookings and to spot regressions
+when the site changes.
+
+Budget settings (environment / .env):
+    AGENT_MAX_STEPS             Maximum agent steps per lookup
+    AGENT_MAX_ACTIONS_PER_STEP  Maximum actions the model may chain in one step
+    AGENT_USE_VISION            1/0, send screenshots to the model
+    AGENT_MAX_INPUT_TOKENS      History is truncated to fit this many input tokens
+    AGENT_MAX_FAILURES          Consecutive failed steps before the agent gives up
+    AGENT_DOM_EXTRACT           1/0, read the results table from the DOM (dom_extraction.py)
+    AGENT_ACTION_CACHE          1/0, reuse decisions for page states seen before (action_cache.py)
+
+Metrics file settings:
+    RUN_METRICS_MAX_BYTES       Size at which run_metrics.jsonl is rotated to run_metrics.jsonl.1
+    RUN_METRICS_BACKUPS         Rotated files kept (run_metrics.jsonl.1 is the newest)
+"""
+import contextlib
+import contextvars
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from telemetry import LOOKUP_SECONDS, span
+
+METRICS_FILE = os.path.join("results", "run_metrics.jsonl")
+DEFAULT_METRICS_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_METRICS_BACKUPS = 3
+
+_current_metrics = contextvars.ContextVar('current_run_metrics', default=None)
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+@dataclass
+class AgentBudget:
+    max_steps: int = 25
+    max_actions_per_step: int = 10
+    use_vision: bool = True
+    max_input_tokens: int = 128000
+    max_failures: int = 3
+    # Read the results table from the DOM as soon as it loads instead of
+    # letting the model scrape it (dom_extraction.py)
+    dom_extract: bool = True
+    # Answer page states seen in earlier successful runs without the model
+    # (action_cache.py)
+    action_cache: bool = True
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a budget from AGENT_* environment variables, defaulting to the
+        values above. Those are browser-use's Agent defaults except max_steps:
+        25 instead of its 100, since a lookup that needs more steps has lost its way.
+        """
+        default = cls()
+        return cls(
+            max_steps=int(os.getenv('AGENT_MAX_STEPS', default.max_steps)),
+            max_actions_per_step=int(os.getenv('AGENT_MAX_ACTIONS_PER_STEP', default.max_actions_per_step)),
+            use_vision=_env_bool('AGENT_USE_VISION', default.use_vision),
+            max_input_tokens=int(os.getenv('AGENT_MAX_INPUT_TOKENS', default.max_input_tokens)),
+            max_failures=int(os.getenv('AGENT_MAX_FAILURES', default.max_failures)),
+            dom_extract=_env_bool('AGENT_DOM_EXTRACT', default.dom_extract),
+            action_cache=_env_bool('AGENT_ACTION_CACHE', default.action_cache),
+        )
+
+    def agent_kwargs(self):
+        """Keyword arguments for browser_use.Agent; max_steps goes to Agent.run()."""
+        return {
+            'use_vision': self.use_vision,
+            'max_actions_per_step': self.max_actions_per_step,
+            'max_input_tokens': self.max_input_tokens,
+            'max_failures': self.max_failures,
+        }
+
+
+def add_budget_arguments(parser):
+    """Add the agent budget options to an argparse parser."""
+    parser.add_argument('--max-steps', type=int, default=None,
+                        help="Maximum agent steps per lookup (default: AGENT_MAX_STEPS or 25)")
+    parser.add_argument('--max-actions-per-step', type=int, default=None,
+                        help="Maximum actions the model may chain in one step (default: AGENT_MAX_ACTIONS_PER_STEP or 10)")
+    parser.add_argument('--max-input-tokens', type=int, default=None,
+                        help="Truncate the agent history to this many input tokens (default: AGENT_MAX_INPUT_TOKENS)")
+    parser.add_argument('--no-vision', dest='use_vision', action='store_false', default=None,
+                        help="Do not send screenshots to the model")
+    parser.add_argument('--no-dom-extract', dest='dom_extract', action='store_false', default=None,
+                        help="Let the model read the results page instead of extracting the table from the DOM")
+    parser.add_argument('--no-action-cache', dest='action_cache', action='store_false', default=None,
+                        help="Ask the model at every step instead of reusing cached decisions")
+
+
+def budget_from_args(args):
+    """Build an AgentBudget from the environment, overridden by the command line options."""
+    budget = AgentBudget.from_env()
+    for name in ('max_steps', 'max_actions_per_step', 'max_input_tokens', 'use_vision', 'dom_extract',
+                 'action_cache'):
+        value = getattr(args, name, None)
+        if value is not None:
+            setattr(budget, name, value)
+    return budget
+
+
+class RunMetrics:
+    """Counters for one lookup; filled in by the LLM callback and the tracking code."""
+
+    def __init__(self, booking_id, path, budget=None):
+        self.booking_id = booking_id
+        self.path = path
+        self.budget = budget
+        self.steps = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.page_load_seconds = None
+        self.total_seconds = None
+        self.success = None
+        self.dom_extracted = False
+        self.cached_actions = 0
+        self.model_tier = None
+        self.escalations = 0
+        self._started = time.perf_counter()
+
+    def record_llm_call(self, seconds, input_tokens=0, output_tokens=0):
+        self.llm_calls += 1
+        self.llm_seconds += seconds
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+    def record_history(self, history):
+        """Take the step count and outcome from a browser-use AgentHistoryList."""
+        self.steps = history.number_of_steps()
+        self.success = history.is_successful()
+
+    def finish(self, extracted=None):
+        self.total_seconds = time.perf_counter() - self._started
+        if extracted is not None:
+            self.success = extracted.get('vessel_name', 'Not available') != 'Not available'
+
+    def to_dict(self):
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'booking_id': self.booking_id,
+            'path': self.path,
+            'success': self.success,
+            'steps': self.steps,
+            'llm_calls': self.llm_calls,
+            'llm_seconds': round(self.llm_seconds, 3),
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'dom_extracted': self.dom_extracted,
+            'cached_actions': self.cached_actions,
+            'model_tier': self.model_tier,
+            'escalations': self.escalations,
+            'page_load_seconds': None if self.page_load_seconds is None else round(self.page_load_seconds, 3),
+            'total_seconds': None if self.total_seconds is None else round(self.total_seconds, 3),
+            'budget': asdict(self.budget) if self.budget else None,
+        }
+
+
+def rotate_metrics(metrics_file=METRICS_FILE, max_bytes=None, backups=None):
+    """
+    Move the metrics file to metrics_file.1 (and older ones up to
+    metrics_file.<backups>, dropping the oldest) once it reaches `max_bytes`.
+    """
+    max_bytes = max_bytes or int(os.getenv('RUN_METRICS_MAX_BYTES', DEFAULT_METRICS_MAX_BYTES))
+    backups = backups if backups is not None else int(os.getenv('RUN_METRICS_BACKUPS', DEFAULT_METRICS_BACKUPS))
+    try:
+        if os.path.getsize(metrics_file) < max_bytes:
+            return
+    except OSError:
+        return
+    if backups < 1:
+        os.remove(metrics_file)
+        return
+    for number in range(backups - 1, 0, -1):
+        older = f"{metrics_file}.{number}"
+        if os.path.exists(older):
+            os.replace(older, f"{metrics_file}.{number + 1}")
+    os.replace(metrics_file, f"{metrics_file}.1")
+
+
+def write_metrics(metrics, metrics_file=METRICS_FILE):
+    """Append one metrics record to the JSON Lines metrics file, rotating it when it is full."""
+    directory = os.path.dirname(metrics_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    rotate_metrics(metrics_file)
+    with open(metrics_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(metrics.to_dict(), ensure_ascii=False) + '\n')
+
+
+def current_metrics():
+    """The RunMetrics of the lookup running in this context, or None."""
+    return _current_metrics.get()
+
+
+@contextlib.contextmanager
+def track_run(booking_id, path, budget=None):
+    """
+    Collect metrics for one lookup and append them to the metrics file when
+    the block exits, whether it succeeded or not.
+    """
+    metrics = RunMetrics(booking_id, path, budget)
+    token = _current_metrics.set(metrics)
+    try:
+        with span(f'run.{path}', booking_id=booking_id):
+            yield metrics
+    finally:
+        _current_metrics.reset(token)
+        if metrics.total_seconds is None:
+            metrics.finish()
+        LOOKUP_SECONDS.observe(metrics.total_seconds, path=path, success=bool(metrics.success))
+        try:
+            write_metrics(metrics)
+        except OSError as e:
+            print(f"Warning: Could not write run metrics: {e}")
+
+
+# Navigation timing of the current document, in seconds
+PAGE_LOAD_JS = """
+() => {
+    const [nav] = performance.getEntriesByType('navigation');
+    return nav ? (nav.loadEventEnd || nav.domContentLoadedEventEnd) / 1000 : null;
+}
+"""
+
+
+async def page_load_seconds(page):
+    """Load time of the page currently shown, or None if it cannot be read."""
+    try:
+        return await page.evaluate(PAGE_LOAD_JS)
+    except Exception:
+        return None
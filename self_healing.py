@@ -0,0 +1,314 @@
+"""
+Notice when a carrier's site changes under the replay or HTTP fast path, and
+heal the replay path with one agent run instead of one per booking.
+
+Each carrier has a supervisor per path that keeps the outcome of its last
+HEAL_WINDOW lookups.
+
+Replay path: when the miss rate reaches HEAL_MISS_RATE (after at least
+HEAL_MIN_SAMPLES replays), or when no replay has succeeded yet in this
+process, a failed replay pauses the path. The booking that tipped it
+runs a single agent session and records a new script. Every other lookup
+for that carrier waits for the new script instead of starting its own
+exploration.
+
+The new script is replayed for that booking and for up to HEAL_VALIDATE - 1
+other bookings whose results are known. It is accepted if it reproduces the
+agent's answer and the vessel of at least half of the known bookings. An
+accepted script is stored as the next version, and the previous version is
+kept beside it. The waiting lookups then replay it. A script that fails
+validation is discarded: lookups fall back to the agent one by one, and no
+new relearn starts until HEAL_COOLDOWN has passed. If the agent finds
+nothing for the booking either, the booking is the problem rather than the
+site, and no cooldown is started.
+
+HTTP fast path: its parser is code, so there is nothing to relearn. When its
+miss rate reaches the threshold, lookups skip it for HEAL_COOLDOWN seconds.
+After that, a single lookup probes it to decide whether to resume.
+
+Settings (environment / .env):
+    HEAL_WINDOW       Recent lookups per path the miss rate is taken over
+    HEAL_MIN_SAMPLES  Lookups needed before the miss rate counts
+    HEAL_MISS_RATE    Miss rate that pauses a path
+    HEAL_VALIDATE     Bookings a relearned script is validated against
+    HEAL_COOLDOWN     Seconds a paused fast path or a failed relearn waits before the next try
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from carriers.base import BookingNotFound
+from telemetry import counter, get_logger
+from tracking_parser import NOT_AVAILABLE
+
+logger = get_logger('healing')
+
+RELEARNS = counter('tracking_relearns', "Replay scripts re-learned after a site change, by outcome",
+                   ('carrier', 'outcome'))
+PATH_PAUSES = counter('tracking_path_pauses', "Times a lookup path was paused for a high miss rate",
+                      ('carrier', 'path'))
+
+
+@dataclass
+class HealingPolicy:
+    """Thresholds of the path supervisors."""
+
+    window: int = 10
+    min_samples: int = 4
+    miss_rate: float = 0.5
+    validate: int = 3
+    cooldown: float = 600.0
+
+    @classmethod
+    def from_env(cls):
+        default = cls()
+        return cls(
+            window=int(os.getenv('HEAL_WINDOW', default.window)),
+            min_samples=int(os.getenv('HEAL_MIN_SAMPLES', default.min_samples)),
+            miss_rate=float(os.getenv('HEAL_MISS_RATE', default.miss_rate)),
+            validate=int(os.getenv('HEAL_VALIDATE', default.validate)),
+            cooldown=float(os.getenv('HEAL_COOLDOWN', default.cooldown)),
+        )
+
+
+class PathSupervisor:
+    """
+    Miss rate of one lookup path of one carrier over its recent lookups.
+
+    Args:
+        carrier_code: Carrier the path belongs to
+        path: 'replay' or 'http'
+        policy: HealingPolicy, read from the environment if omitted
+    """
+
+    def __init__(self, carrier_code, path, policy=None):
+        self.carrier_code = carrier_code
+        self.path = path
+        self.policy = policy or HealingPolicy.from_env()
+        self._outcomes = deque(maxlen=max(1, self.policy.window))
+
+    def record(self, success):
+        self._outcomes.append(bool(success))
+
+    @property
+    def miss_rate(self):
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    @property
+    def successes(self):
+        return self._outcomes.count(True)
+
+    def breached(self):
+        return len(self._outcomes) >= self.policy.min_samples and self.miss_rate >= self.policy.miss_rate
+
+    def reset(self):
+        self._outcomes.clear()
+
+
+class FastPathSupervisor(PathSupervisor):
+    """Circuit breaker for a carrier's direct HTTP lookup."""
+
+    def __init__(self, carrier_code, policy=None):
+        super().__init__(carrier_code, 'http', policy)
+        self._paused_until = 0.0
+        self._probing = False
+
+    def allow(self):
+        """Whether this lookup should try the fast path."""
+        if self._paused_until == 0.0:
+            return True
+        if time.monotonic() < self._paused_until or self._probing:
+            return False
+        # Cooled down: let exactly one lookup probe the path
+        self._probing = True
+        return True
+
+    async def call(self, fetch, *args):
+        """
+        Run a fast path lookup, `await fetch(*args)`, and record whether the
+        path worked. A lookup that raises or reads nothing counts as a miss,
+        so a probe that fails this way still ends the probe. A carrier
+        answering that it has no such booking (BookingNotFound) counts as the
+        path working, and returns None so the caller falls back as before.
+        """
+        worked = False
+        try:
+            result = await fetch(*args)
+            worked = result is not None
+            return result
+        except BookingNotFound:
+            worked = True
+            return None
+        finally:
+            self.record(worked)
+
+    def record(self, success):
+        if self._probing:
+            self._probing = False
+            if success:
+                logger.info("%s fast path answered again, resuming it", self.carrier_code)
+                self._paused_until = 0.0
+                self.reset()
+            else:
+                self._paused_until = time.monotonic() + self.policy.cooldown
+            return
+        super().record(success)
+        if self._paused_until == 0.0 and self.breached():
+            logger.warning("%s fast path missed %.0f%% of the last %d lookups, skipping it for %.0fs",
+                           self.carrier_code, self.miss_rate * 100, len(self._outcomes), self.policy.cooldown)
+            PATH_PAUSES.inc(carrier=self.carrier_code, path=self.path)
+            self._paused_until = time.monotonic() + self.policy.cooldown
+            self.reset()
+
+
+class ReplaySupervisor(PathSupervisor):
+    """Pauses a carrier's replay path while one agent run re-learns its script."""
+
+    def __init__(self, carrier_code, policy=None):
+        super().__init__(carrier_code, 'replay', policy)
+        self._relearn = None
+        self._retry_after = 0.0
+
+    @property
+    def relearning(self):
+        return self._relearn is not None
+
+    def should_relearn(self):
+        if self.relearning or time.monotonic() < self._retry_after:
+            return False
+        # Nothing shows the stored script still works: no need to wait for more misses
+        return self.breached() or (len(self._outcomes) > 0 and self.successes == 0)
+
+    async def wait_for_script(self):
+        """
+        Wait for the relearn in progress.
+
+        Returns:
+            The new replay steps, or None if no validated script came out of it
+        """
+        if self._relearn is None:
+            return None
+        return await asyncio.shield(self._relearn)
+
+    async def relearn(self, learn, validate):
+        """
+        Re-learn the script with one agent run while other lookups wait.
+
+        Args:
+            learn: Coroutine function returning (extracted, steps) from an agent run
+            validate: Coroutine function taking the steps and the agent's answer, returning
+                the booking IDs the script reproduced, or None if it failed validation
+
+        Returns:
+            Tuple of the agent's answer and the validated steps with the booking
+            IDs they were checked against; steps and booking IDs are None if
+            validation failed
+        """
+        PATH_PAUSES.inc(carrier=self.carrier_code, path=self.path)
+        logger.warning("%s replay missed %.0f%% of the last %d lookups, re-learning the script once",
+                       self.carrier_code, self.miss_rate * 100, len(self._outcomes))
+        future = asyncio.get_running_loop().create_future()
+        self._relearn = future
+        steps = validated_with = None
+        outcome = 'failed'
+        try:
+            extracted, learned = await learn()
+            if not learned or extracted['vessel_name'] == NOT_AVAILABLE:
+                # The agent found nothing either: this booking, not the site, is the problem
+                outcome = 'no_result'
+            else:
+                validated_with = await validate(learned, extracted)
+                steps = learned if validated_with else None
+                outcome = 'promoted' if steps else 'rejected'
+            return extracted, steps, validated_with
+        finally:
+            RELEARNS.inc(carrier=self.carrier_code, outcome=outcome)
+            if outcome == 'promoted':
+                self.reset()
+            elif outcome != 'no_result':
+                logger.warning("%s script could not be re-learned (%s); agent fallback for %.0fs",
+                               self.carrier_code, outcome, self.policy.cooldown)
+                self._retry_after = time.monotonic() + self.policy.cooldown
+            self._relearn = None
+            future.set_result(steps)
+
+
+def validation_targets(carrier, booking_id, limit):
+    """
+    Up to `limit` other bookings of `carrier` with a known vessel, newest
+    first, as (booking_id, extracted) pairs.
+    """
+    from carriers import carrier_for
+    from result_store import get_result_store
+
+    targets = []
+    for row in get_result_store().recent_found(limit=max(50, limit * 10)):
+        if len(targets) >= limit:
+            break
+        if row['booking_id'] != booking_id and carrier_for(row['booking_id']).code == carrier.code:
+            targets.append((row['booking_id'], row))
+    return targets
+
+
+def same_sailing(extracted, expected):
+    return all(
+        str(extracted.get(field, '')).strip().upper() == str(expected.get(field, '')).strip().upper()
+        for field in ('vessel_name', 'voyage_number')
+    )
+
+
+async def validate_script(steps, booking_id, extracted, carrier, replay, limit):
+    """
+    Replay a freshly learned script for the booking it was learned on and for
+    known bookings.
+
+    Args:
+        replay: Coroutine function (steps, booking_id) returning the replayed fields
+        limit: Total bookings to check, including `booking_id`
+
+    Returns:
+        The booking IDs the script reproduced, or None if it must not be used
+    """
+    from replay import ReplayError
+
+    async def check(target_id, expected):
+        try:
+            return same_sailing(await replay(steps, target_id), expected)
+        except ReplayError as e:
+            logger.info("Validation replay for %s failed: %s", target_id, e)
+            return False
+
+    if not await check(booking_id, extracted):
+        return None
+    reproduced = [booking_id]
+    others = validation_targets(carrier, booking_id, max(0, limit - 1))
+    matched = 0
+    for target_id, expected in others:
+        if await check(target_id, expected):
+            matched += 1
+            reproduced.append(target_id)
+    # Known results can be stale (a rolled booking), so half of them is enough
+    if others and matched * 2 < len(others):
+        return None
+    return reproduced
+
+
+_supervisors = {}
+
+
+def get_replay_supervisor(carrier):
+    """The process-wide replay supervisor of a carrier."""
+    key = ('replay', carrier.code)
+    if key not in _supervisors:
+        _supervisors[key] = ReplaySupervisor(carrier.code)
+    return _supervisors[key]
+
+
+def get_fast_path_supervisor(carrier):
+    """The process-wide HTTP fast path supervisor of a carrier."""
+    key = ('http', carrier.code)
+    if key not in _supervisors:
+        _supervisors[key] = FastPathSupervisor(carrier.code)
+    return _supervisors[key]
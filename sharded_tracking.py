@@ -0,0 +1,506 @@
+"""
+Sharded tracking across worker processes and hosts.
+
+One asyncio loop driving many browsers runs out of CPU on DOM serialisation
+and screenshots long before the site or the Gemini quota is the limit. Here
+the booking IDs are spread over several worker processes, each with its own
+event loop, browser pool and LLM client:
+
+    - a coordinator writes the bookings into an SQLite work queue, each one
+      assigned to a shard by consistent hashing, so the same booking keeps
+      going to the same worker (and its warm caches) and adding a shard only
+      moves about 1/N of the bookings,
+    - every worker claims jobs from its own shard first and takes over jobs
+      from other shards once its own are done, so a slow shard does not hold
+      up the batch,
+    - the records are merged back into one JSON Lines output in input order.
+
+The queue is a single SQLite file, so workers on other hosts can join by
+pointing at the same file on shared storage. Jobs claimed by a worker that
+died are handed out again after LEASE_SECONDS, checked every SWEEP_SECONDS
+by each worker, and are recorded as errors once MAX_ATTEMPTS leases expired.
+
+The Gemini quota is per key, not per process: the host's share of it
+(--quota-share, or GEMINI_QUOTA_SHARE, 1 by default) is split evenly over
+its local worker processes; give each host its share when several share a key.
+
+Usage:
+    python sharded_tracking.py run bookings.txt --workers 4 --headless
+
+    # across hosts sharing interactions/shard_queue.db
+    python sharded_tracking.py enqueue bookings.txt --shards 8
+    python sharded_tracking.py worker --shards 8 --shard 0 --shard 1 --headless   # on each host
+    python sharded_tracking.py collect <batch> --wait -o results.jsonl
+"""
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import bisect
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from datetime import datetime
+
+from batch_tracking import read_booking_ids, track_one
+from browser_pool import DEFAULT_MAX_USES, BrowserPool
+from llm_scheduler import BATCH, llm_priority
+from main import RESULTS_DIR
+from result_cache import connect
+from run_metrics import add_budget_arguments, budget_from_args
+from telemetry import configure_telemetry
+
+QUEUE_DB = os.path.join("interactions", "shard_queue.db")
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_CONCURRENCY = 2
+DEFAULT_REPLICAS = 64
+LEASE_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+SWEEP_SECONDS = 60.0
+POLL_SECONDS = 2.0
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping booking IDs to shards.
+
+    Args:
+        shards: Number of shards
+        replicas: Points per shard on the ring; more points spread the load more evenly
+    """
+
+    def __init__(self, shards, replicas=DEFAULT_REPLICAS):
+        points = sorted((_hash(f"shard-{shard}-{i}"), shard) for shard in range(shards) for i in range(replicas))
+        self._keys = [key for key, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, booking_id):
+        index = bisect.bisect(self._keys, _hash(booking_id)) % len(self._keys)
+        return self._shards[index]
+
+
+class WorkQueue:
+    """
+    SQLite-backed job queue shared by the coordinator and all workers.
+
+    Args:
+        db_path: SQLite database file holding the queue
+    """
+
+    def __init__(self, db_path=QUEUE_DB):
+        self._conn = connect(db_path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS shard_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch TEXT NOT NULL,
+                booking_id TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_at REAL,
+                finished_at REAL,
+                record TEXT
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_shard_jobs_claim ON shard_jobs (status, shard, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_shard_jobs_batch ON shard_jobs (batch, id)")
+        self._conn.commit()
+
+    def enqueue(self, booking_ids, shards, batch=None):
+        """
+        Add a batch of bookings, each assigned to a shard on the hash ring.
+
+        Returns:
+            The batch ID, used to collect the results
+        """
+        batch = batch or datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        ring = HashRing(shards)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO shard_jobs (batch, booking_id, shard) VALUES (?, ?, ?)",
+                [(batch, booking_id, ring.shard_for(booking_id)) for booking_id in booking_ids],
+            )
+        return batch
+
+    def claim(self, worker, shards, steal=True):
+        """
+        Take the next pending job, from one of `shards` if possible.
+
+        Returns:
+            Tuple of (job_id, booking_id), or None if there is nothing to do
+        """
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same job
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            placeholders = ','.join('?' * len(shards))
+            row = self._conn.execute(
+                f"SELECT id, booking_id FROM shard_jobs WHERE status = 'pending' AND shard IN ({placeholders}) "
+                "ORDER BY id LIMIT 1",
+                list(shards),
+            ).fetchone()
+            if row is None and steal:
+                row = self._conn.execute(
+                    "SELECT id, booking_id FROM shard_jobs WHERE status = 'pending' ORDER BY id LIMIT 1"
+                ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE shard_jobs SET status = 'running', worker = ?, attempts = attempts + 1, claimed_at = ? "
+                    "WHERE id = ?",
+                    (worker, now, row[0]),
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def requeue_expired(self):
+        """
+        Hand out again the jobs of workers that died mid-lookup, or record
+        them as errors once MAX_ATTEMPTS leases have expired.
+
+        Returns:
+            Tuple of (jobs requeued, jobs given up)
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = self._conn.execute(
+                "SELECT id, booking_id, attempts FROM shard_jobs WHERE status = 'running' AND claimed_at < ?",
+                (now - LEASE_SECONDS,),
+            ).fetchall()
+            given_up = [
+                (json.dumps({'booking_id': booking_id, 'status': 'error',
+                             'error': f"Lease expired on all {attempts} attempts"}, ensure_ascii=False), now, job_id)
+                for job_id, booking_id, attempts in expired if attempts >= MAX_ATTEMPTS
+            ]
+            requeued = [(job_id,) for job_id, _, attempts in expired if attempts < MAX_ATTEMPTS]
+            self._conn.executemany("UPDATE shard_jobs SET status = 'done', record = ?, finished_at = ? WHERE id = ?",
+                                   given_up)
+            self._conn.executemany("UPDATE shard_jobs SET status = 'pending' WHERE id = ?", requeued)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return len(requeued), len(given_up)
+
+    def complete(self, job_id, record):
+        """Store the record of a finished job; errors are retried up to MAX_ATTEMPTS."""
+        with self._conn:
+            if record['status'] == 'error':
+                self._conn.execute(
+                    "UPDATE shard_jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'done' END, "
+                    "record = ?, finished_at = ? WHERE id = ?",
+                    (MAX_ATTEMPTS, json.dumps(record, ensure_ascii=False), time.time(), job_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE shard_jobs SET status = 'done', record = ?, finished_at = ? WHERE id = ?",
+                    (json.dumps(record, ensure_ascii=False), time.time(), job_id),
+                )
+
+    def counts(self, batch=None):
+        """Number of jobs per status, for one batch or the whole queue."""
+        if batch is None:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM shard_jobs GROUP BY status")
+        else:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM shard_jobs WHERE batch = ? GROUP BY status",
+                                      (batch,))
+        return dict(rows.fetchall())
+
+    def shard_counts(self, batch):
+        """Rows of (shard, worker, jobs, done) for a batch."""
+        return self._conn.execute(
+            "SELECT shard, worker, COUNT(*), SUM(status = 'done') FROM shard_jobs WHERE batch = ? "
+            "GROUP BY shard, worker ORDER BY shard, worker",
+            (batch,),
+        ).fetchall()
+
+    def records(self, batch):
+        """The records of a batch in the order the bookings were enqueued; unfinished jobs are reported as errors."""
+        records = []
+        for booking_id, status, record in self._conn.execute(
+            "SELECT booking_id, status, record FROM shard_jobs WHERE batch = ? ORDER BY id", (batch,)
+        ):
+            if status == 'done':
+                records.append(json.loads(record))
+            else:
+                records.append({'booking_id': booking_id, 'status': 'error',
+                                'error': f"Job still {status} when the results were collected"})
+        return records
+
+    def close(self):
+        self._conn.close()
+
+
+async def run_worker(queue_path, shards, worker_id=None, concurrency=DEFAULT_CONCURRENCY, headless=False,
+                     adaptive=False, max_uses=DEFAULT_MAX_USES, use_http=True, max_age=None, budget=None,
+                     steal=True, poll=None):
+    """
+    Process jobs from the queue with one browser pool and one LLM client.
+
+    Args:
+        queue_path: SQLite file of the work queue
+        shards: Shard numbers this worker serves first
+        worker_id: Name recorded on claimed jobs, defaults to host:pid
+        concurrency: Lookups running at once in this worker
+        steal: Take jobs from other shards when its own are done
+        poll: Seconds to wait for new jobs when the queue is empty; None exits instead
+
+    Returns:
+        Number of jobs processed
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(queue_path)
+    processed = 0
+
+    async def slot(browser_pool):
+        nonlocal processed
+        while True:
+            job = queue.claim(worker_id, shards, steal=steal)
+            if job is None:
+                if poll is None:
+                    return
+                await asyncio.sleep(poll)
+                continue
+            job_id, booking_id = job
+            record = await track_one(booking_id, None, browser_pool, adaptive=adaptive, use_http=use_http,
+                                     max_age=max_age, budget=budget)
+            queue.complete(job_id, {**record, 'worker': worker_id})
+            processed += 1
+
+    async def sweep():
+        while True:
+            await asyncio.sleep(SWEEP_SECONDS)
+            queue.requeue_expired()
+
+    queue.requeue_expired()
+    sweeper = asyncio.create_task(sweep())
+    try:
+        async with BrowserPool(size=concurrency, headless=headless, max_uses=max_uses) as browser_pool:
+            with llm_priority(BATCH):
+                await asyncio.gather(*(slot(browser_pool) for _ in range(concurrency)))
+    finally:
+        sweeper.cancel()
+        from http_fetcher import close_fetcher
+        await close_fetcher()
+        queue.close()
+    return processed
+
+
+def _worker_process(queue_path, shards, quota_share, options):
+    """Entry point of a local worker process."""
+    load_dotenv()
+    # Inherited from the parent as the host's share; this process gets its part of it
+    os.environ['GEMINI_QUOTA_SHARE'] = str(quota_share)
+    # Each worker serves its own /metrics, on the ports after the coordinator's
+    configure_telemetry(port_offset=1 + min(shards))
+    # Only the coordinator writes to stdout, which may be the JSON Lines stream
+    with contextlib.redirect_stdout(sys.stderr):
+        asyncio.run(run_worker(queue_path, shards, **options))
+
+
+def host_quota_share():
+    """Fraction of the Gemini quota this host's workers may use between them."""
+    return float(os.getenv('GEMINI_QUOTA_SHARE', 1))
+
+
+def start_workers(queue_path, shard_groups, quota_share, options):
+    """Start one process per group of shards, each with `quota_share` of the Gemini quota."""
+    # spawn behaves the same on Windows and Linux and does not fork a running event loop
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    for shards in shard_groups:
+        process = context.Process(target=_worker_process, args=(queue_path, shards, quota_share, options),
+                                  name=f"tracking-shard-{'-'.join(map(str, shards))}")
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def run_sharded(booking_ids, out, workers=DEFAULT_WORKERS, queue_path=QUEUE_DB, **options):
+    """
+    Track bookings with `workers` local processes and merge their records into `out`.
+
+    Args:
+        booking_ids: Booking IDs to track
+        out: Text stream receiving one JSON line per booking, in input order
+        workers: Worker processes, one shard each
+        queue_path: SQLite file of the work queue
+        options: Passed on to run_worker (concurrency, headless, adaptive, ...)
+
+    Returns:
+        Tuple of (succeeded, failed) counts
+    """
+    queue = WorkQueue(queue_path)
+    batch = queue.enqueue(booking_ids, shards=workers)
+    processes = start_workers(queue_path, [[shard] for shard in range(workers)], host_quota_share() / workers,
+                              options)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        raise
+
+    for shard, worker, jobs, done in queue.shard_counts(batch):
+        print(f"Shard {shard}: {done}/{jobs} done by {worker or 'nobody'}", file=sys.stderr)
+    counts = {'ok': 0, 'error': 0}
+    for record in queue.records(batch):
+        counts[record['status']] += 1
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    queue.close()
+    return counts['ok'], counts['error']
+
+
+def _add_worker_arguments(parser):
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Concurrent browser sessions per worker (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--max-uses', type=int, default=DEFAULT_MAX_USES,
+                        help=f"Lookups per browser before it is relaunched (default: {DEFAULT_MAX_USES})")
+    parser.add_argument('--headless', action='store_true', help="Run browsers in headless mode")
+    parser.add_argument('--adaptive', action='store_true', help="Use adaptive tracking for each booking")
+    parser.add_argument('--no-http', dest='use_http', action='store_false',
+                        help="Skip the direct HTTP fast path and always use the browser")
+    parser.add_argument('--max-age', type=float, default=None,
+                        help="Reuse cached results up to this many seconds old (0 disables the cache)")
+    parser.add_argument('--no-steal', dest='steal', action='store_false',
+                        help="Only process jobs of the worker's own shards")
+    add_budget_arguments(parser)
+
+
+def _worker_options(args):
+    return dict(concurrency=args.concurrency, headless=args.headless, adaptive=args.adaptive,
+                max_uses=args.max_uses, use_http=args.use_http, max_age=args.max_age,
+                budget=budget_from_args(args), steal=args.steal)
+
+
+def _open_output(output):
+    if output == '-':
+        return sys.stdout
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    return open(output, 'w', encoding='utf-8')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Track booking IDs with sharded worker processes.")
+    parser.add_argument('--queue', default=QUEUE_DB, help=f"SQLite work queue (default: {QUEUE_DB})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Shard a batch over local worker processes and merge the results")
+    run.add_argument('source', help="File with one booking ID per line, or '-' to read from stdin")
+    run.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                     help=f"Worker processes (default: {DEFAULT_WORKERS})")
+    run.add_argument('-o', '--output',
+                     help="JSON Lines output file, or '-' for stdout (default: results/sharded_<timestamp>.jsonl)")
+    _add_worker_arguments(run)
+
+    enqueue = commands.add_parser('enqueue', help="Add a batch to the queue for workers on any host")
+    enqueue.add_argument('source', help="File with one booking ID per line, or '-' to read from stdin")
+    enqueue.add_argument('--shards', type=int, required=True, help="Total number of shards")
+
+    worker = commands.add_parser('worker', help="Run worker processes against the queue")
+    worker.add_argument('--shards', type=int, required=True, help="Total number of shards")
+    worker.add_argument('--shard', type=int, action='append',
+                        help="Shard served by one worker process; repeat for more processes (default: 0)")
+    worker.add_argument('--quota-share', type=float, default=None,
+                        help="This host's fraction of the Gemini quota, split over its worker processes "
+                             "(default: GEMINI_QUOTA_SHARE or 1)")
+    worker.add_argument('--poll', type=float, default=None,
+                        help=f"Keep polling for new jobs every N seconds instead of exiting when idle "
+                             f"(e.g. {POLL_SECONDS})")
+    _add_worker_arguments(worker)
+
+    collect = commands.add_parser('collect', help="Write the merged results of a batch")
+    collect.add_argument('batch', help="Batch ID printed by enqueue")
+    collect.add_argument('-o', '--output', default='-', help="JSON Lines output file, or '-' for stdout")
+    collect.add_argument('--wait', action='store_true', help="Wait until every job of the batch is done")
+
+    status = commands.add_parser('status', help="Show job counts per status and shard")
+    status.add_argument('batch', nargs='?', help="Batch ID (default: whole queue)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Load environment variables from .env
+    load_dotenv()
+    configure_telemetry()
+
+    if args.command == 'run':
+        booking_ids = read_booking_ids(args.source)
+        if not booking_ids:
+            print("No booking IDs to track.", file=sys.stderr)
+            return
+        output = args.output or os.path.join(RESULTS_DIR, f"sharded_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        workers = max(1, min(args.workers, len(booking_ids)))
+        print(f"Tracking {len(booking_ids)} booking IDs with {workers} workers x {args.concurrency} sessions",
+              file=sys.stderr)
+        started = time.perf_counter()
+        out = _open_output(output)
+        try:
+            ok, failed = run_sharded(booking_ids, out, workers=workers, queue_path=args.queue, **_worker_options(args))
+        finally:
+            if out is not sys.stdout:
+                out.close()
+                print(f"Results written to {output}", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+        print(f"\n✅ {ok} succeeded, ❌ {failed} failed in {elapsed:.1f}s", file=sys.stderr)
+
+    elif args.command == 'enqueue':
+        booking_ids = read_booking_ids(args.source)
+        queue = WorkQueue(args.queue)
+        batch = queue.enqueue(booking_ids, shards=args.shards)
+        queue.close()
+        print(f"Queued {len(booking_ids)} booking IDs over {args.shards} shards as batch", file=sys.stderr)
+        print(batch)
+
+    elif args.command == 'worker':
+        shards = args.shard or [0]
+        invalid = [shard for shard in shards if not 0 <= shard < args.shards]
+        if invalid:
+            print(f"--shard must be between 0 and {args.shards - 1} for --shards {args.shards}, "
+                  f"got {', '.join(map(str, invalid))}", file=sys.stderr)
+            sys.exit(2)
+        quota_share = args.quota_share if args.quota_share is not None else host_quota_share()
+        options = dict(_worker_options(args), poll=args.poll)
+        processes = start_workers(args.queue, [[shard] for shard in shards], quota_share / len(shards), options)
+        for process in processes:
+            process.join()
+
+    elif args.command == 'collect':
+        queue = WorkQueue(args.queue)
+        while args.wait and {'pending', 'running'} & set(queue.counts(args.batch)):
+            time.sleep(POLL_SECONDS)
+        out = _open_output(args.output)
+        try:
+            for record in queue.records(args.batch):
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        queue.close()
+
+    elif args.command == 'status':
+        queue = WorkQueue(args.queue)
+        print(json.dumps(queue.counts(args.batch)))
+        if args.batch:
+            for shard, worker, jobs, done in queue.shard_counts(args.batch):
+                print(f"shard {shard:>3}  {worker or '-':<30} {done}/{jobs} done")
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Local stand-in for seacargotracking.net and the HMM Track & Trace endpoint,
+serving recorded pages from fixtures/ so both the HTTP fast path and the
+browser flow can be exercised without network.
+
+Pages:
+    /                   fixtures/seacargo/index.html, the carrier list
+    /hmm                fixtures/seacargo/hmm.html, the booking search form
+    TRACK_PATH          fixtures/hmm/<BOOKING_ID>.html or .json, by booking ID;
+                        unknown bookings get not_found.html
+
+Usage:
+    python stub_server.py --port 8765
+    set HMM_TRACK_URL=http://127.0.0.1:8765/e-service/general/trackNTrace/TrackNTrace.do
+    set SEACARGO_URL=http://127.0.0.1:8765/
+    python http_fetcher.py SINI25432400
+"""
+import argparse
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "hmm")
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "seacargo")
+SITE_PAGES = {"/": "index.html", "/hmm": "hmm.html"}
+TRACK_PATH = "/e-service/general/trackNTrace/TrackNTrace.do"
+BOOKING_FIELD = "srchBkgNo1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    fixtures_dir = FIXTURES_DIR
+
+    def log_message(self, format, *args):
+        # Keep benchmark and fetcher output readable
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self, params):
+        booking_id = params.get(BOOKING_FIELD, [""])[0].strip()
+        if not booking_id or os.path.basename(booking_id) != booking_id:
+            self._send(400, "text/plain", b"missing booking id")
+            return
+        for extension, content_type in ((".json", "application/json"), (".html", "text/html; charset=utf-8")):
+            path = os.path.join(self.fixtures_dir, booking_id + extension)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    self._send(200, content_type, f.read())
+                return
+        with open(os.path.join(self.fixtures_dir, "not_found.html"), "rb") as f:
+            self._send(200, "text/html; charset=utf-8", f.read())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in SITE_PAGES:
+            with open(os.path.join(SITE_DIR, SITE_PAGES[url.path]), "rb") as f:
+                self._send(200, "text/html; charset=utf-8", f.read())
+            return
+        if url.path != TRACK_PATH:
+            self._send(404, "text/plain", b"not found")
+            return
+        self._respond(parse_qs(url.query))
+
+    def do_POST(self):
+        if urlparse(self.path).path != TRACK_PATH:
+            self._send(404, "text/plain", b"not found")
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        self._respond(parse_qs(self.rfile.read(length).decode("utf-8")))
+
+
+def start_stub_server(host="127.0.0.1", port=0):
+    """
+    Start the stub server on a background thread.
+
+    Returns:
+        Tuple of (server, track_url); call server.shutdown() when done.
+        The mock seacargotracking.net site is at base_url(server).
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"{base_url(server)}{TRACK_PATH}"
+
+
+def base_url(server):
+    """Root URL of a running stub server, e.g. http://127.0.0.1:8765"""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve HMM Track & Trace fixtures locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Serving the mock site at http://{args.host}:{args.port}/ and {FIXTURES_DIR} at {TRACK_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
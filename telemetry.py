@@ -0,0 +1,365 @@
+"""
+Spans, counters and latency histograms for the tracking hot path.
+
+The lookup code opens a span around each expensive stage: browser start,
+navigation, agent steps, LLM calls, extraction and storage writes. It also
+counts cache hits, fallbacks, 429s and extraction misses. Every finished
+span adds its duration to the `tracking_span_seconds` histogram, labelled
+with the span name, so the Prometheus endpoint shows where the seconds of a
+lookup go under load. With an OTLP file configured, each span is also
+written out with its trace and parent IDs, so a single slow lookup can be
+followed step by step.
+
+Everything is kept in process with the standard library. Importing this
+module costs next to nothing, and recording stays cheap when no exporter is
+configured.
+
+Settings (environment / .env):
+    TELEMETRY_PROMETHEUS_PORT  Serve GET /metrics in the Prometheus text format on this port
+    TELEMETRY_PROMETHEUS_HOST  Interface the metrics port listens on (default 127.0.0.1; 0.0.0.0 for all)
+    TELEMETRY_OTLP_FILE        Append finished spans to this file as OTLP/JSON, one export request per line
+    LOG_LEVEL                  Level of the `tracking` loggers; DEBUG prints the parser and raw agent output
+
+The tracking service also serves the metrics at GET /metrics on its own port.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+SERVICE_NAME = "seacargo-tracking"
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_registry = {}
+_registry_lock = threading.Lock()
+_exporter = None
+
+
+def get_logger(name):
+    """Logger under the `tracking` hierarchy, e.g. get_logger('parser')."""
+    return logging.getLogger(f"tracking.{name}")
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(label, '')) for label in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name + '_total', dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(str(labels.get(label, '')) for label in self.labelnames))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', dict(labels, le=_format_value(bound)), cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+def _get_or_create(cls, name, help_text, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, labelnames, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric '{name}' is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name, help_text, labelnames=()):
+    """The process-wide counter called `name`, created on first use."""
+    return _get_or_create(Counter, name, help_text, labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """The process-wide histogram called `name`, created on first use."""
+    return _get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+
+SPAN_SECONDS = histogram('tracking_span_seconds', "Duration of traced stages of a lookup", ('span', 'status'))
+LOOKUP_SECONDS = histogram('tracking_lookup_seconds', "Wall time of agent and replay runs", ('path', 'success'))
+CACHE_LOOKUPS = counter('tracking_cache_lookups', "Result cache reads by outcome (hit, miss, stale)", ('outcome',))
+FALLBACKS = counter('tracking_fallbacks', "Lookups that fell back to a slower path", ('from_path', 'to_path'))
+RATE_LIMITED = counter('tracking_llm_rate_limited', "Gemini calls refused with 429 / ResourceExhausted", ('key',))
+LLM_SECONDS = histogram('tracking_llm_call_seconds', "Latency of chat model calls by model", ('model',))
+EXTRACTION_MISSES = counter('tracking_extraction_misses', "Extractions that found no vessel", ('source',))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name}{'_total' if metric.kind == 'counter' else ''} {metric.help}")
+        lines.append(f"# TYPE {metric.name}{'_total' if metric.kind == 'counter' else ''} {metric.kind}")
+        for name, labels, value in metric.samples():
+            label_text = ','.join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+            lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+class Span:
+    """One timed stage of a lookup. Use span() or start_span() rather than creating these directly."""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.status = 'ok'
+        self.error = None
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.seconds = None
+
+    def set_attribute(self, name, value):
+        self.attributes[name] = value
+
+    def end(self, error=None):
+        """Finish the span, recording its duration; later calls are ignored."""
+        if self.seconds is not None:
+            return
+        self.seconds = time.perf_counter() - self._started
+        if error is not None:
+            self.status = 'error'
+            self.error = f"{type(error).__name__}: {error}"
+        SPAN_SECONDS.observe(self.seconds, span=self.name, status=self.status)
+        if _exporter is not None:
+            _exporter.export(self)
+
+
+def current_span():
+    """The innermost open span of this context, or None."""
+    return _current_span.get()
+
+
+def start_span(name, parent=None, **attributes):
+    """
+    Start a span that is ended explicitly with Span.end(), for stages that
+    begin and finish in different callbacks (agent steps, LLM calls).
+    """
+    return Span(name, parent if parent is not None else _current_span.get(), attributes)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a span, nested under the current span."""
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+class AgentStepSpans:
+    """
+    on_step_start / on_step_end hooks for Agent.run() timing each agent step
+    as an `agent.step` span.
+
+    Args:
+        then: Optional on_step_end hook run after the step span is closed
+    """
+
+    def __init__(self, then=None):
+        self.then = then
+        self._span = None
+
+    async def on_step_start(self, agent):
+        self._span = start_span('agent.step', step=agent.state.n_steps)
+
+    async def on_step_end(self, agent):
+        if self._span is not None:
+            self._span.end()
+            self._span = None
+        if self.then is not None:
+            await self.then(agent)
+
+
+class OTLPFileExporter:
+    """
+    Appends each finished span to a file as an OTLP/JSON ExportTraceServiceRequest
+    on its own line, the format read by the OpenTelemetry Collector's otlpjsonfile receiver.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._resource = {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+            {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+        ]}
+
+    @staticmethod
+    def _attribute(key, value):
+        if isinstance(value, bool):
+            return {'key': key, 'value': {'boolValue': value}}
+        if isinstance(value, int):
+            return {'key': key, 'value': {'intValue': str(value)}}
+        if isinstance(value, float):
+            return {'key': key, 'value': {'doubleValue': value}}
+        return {'key': key, 'value': {'stringValue': str(value)}}
+
+    def export(self, finished):
+        record = {
+            'traceId': finished.trace_id,
+            'spanId': finished.span_id,
+            'name': finished.name,
+            'kind': 1,
+            'startTimeUnixNano': str(finished.start_ns),
+            'endTimeUnixNano': str(finished.start_ns + int(finished.seconds * 1e9)),
+            'attributes': [self._attribute(key, value) for key, value in finished.attributes.items()],
+            'status': {'code': 2, 'message': finished.error} if finished.error else {'code': 1},
+        }
+        if finished.parent_id:
+            record['parentSpanId'] = finished.parent_id
+        line = json.dumps({'resourceSpans': [{
+            'resource': self._resource,
+            'scopeSpans': [{'scope': {'name': 'tracking'}, 'spans': [record]}],
+        }]})
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def start_metrics_server(port, host=DEFAULT_METRICS_HOST):
+    """Serve GET /metrics from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            content = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+_configured = False
+
+
+def configure_telemetry(port_offset=0):
+    """
+    Set up logging and the exporters from the environment; called once by
+    each entry point. Sharded workers pass their index as `port_offset` so
+    every process gets its own /metrics port.
+    """
+    global _configured, _exporter
+    if _configured:
+        return
+    _configured = True
+
+    logger = logging.getLogger('tracking')
+    logger.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(levelname)s [%(name)s] %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+    otlp_file = os.getenv('TELEMETRY_OTLP_FILE')
+    if otlp_file:
+        _exporter = OTLPFileExporter(otlp_file)
+
+    port = os.getenv('TELEMETRY_PROMETHEUS_PORT')
+    if port:
+        try:
+            start_metrics_server(int(port) + port_offset, os.getenv('TELEMETRY_PROMETHEUS_HOST', DEFAULT_METRICS_HOST))
+        except OSError as e:
+            logger.warning("Could not serve metrics on port %s: %s", int(port) + port_offset, e)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Fresh process-wide stores under tmp_path and no Gemini key."""
+    import main
+    import result_cache
+    import result_store
+    import voyage_index
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, 'load_dotenv', lambda *args, **kwargs: None)
+    for name in ('GOOGLE_API_KEY', 'GOOGLE_API_KEYS'):
+        monkeypatch.delenv(name, raising=False)
+    for module, name in ((result_cache, '_shared_cache'), (result_store, '_shared_store'),
+                         (voyage_index, '_shared_index'), (main, '_shared_llm')):
+        monkeypatch.setattr(module, name, None)
+    yield tmp_path
+    result_store.close_result_store()
@@ -0,0 +1,139 @@
+import asyncio
+import itertools
+
+import pytest
+from browser_use import Agent
+from langchain_core.messages import HumanMessage
+
+import action_cache
+from action_cache import STATE_MARKER, ActionCache, CachingAgent, fingerprint
+
+TASK = "Track booking SINI1 on seacargotracking.net"
+
+
+def state(booking_id, step=1, result='', elements='[12]<input name="booking"></input>'):
+    lines = [
+        STATE_MARKER,
+        'Current url: https://www.seacargotracking.net/',
+        f'Current step: {step}/20',
+        'Current date and time: 2025-06-03 14:00',
+        f'*{elements}',
+        f'Typed {booking_id}' if booking_id else '',
+    ]
+    if result:
+        lines.append(f'Action result: {result}')
+    return '\n'.join(lines)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A strictly increasing clock, so that every write and hit has its own used_at
+    clock = itertools.count(1_000_000)
+    monkeypatch.setattr(action_cache.time, 'time', lambda: next(clock))
+    cache = ActionCache(str(tmp_path / 'tracking.db'), ttl=3600, size=2)
+    yield cache
+    cache.close()
+
+
+def test_fingerprint_ignores_the_booking_id_and_step_counter():
+    first = fingerprint(TASK, state('SINI1', step=1), 'SINI1')
+    task = TASK.replace('SINI1', 'SINI2')
+    assert fingerprint(task, state('SINI2', step=7), 'SINI2') == first
+    assert first[1] == 'https://www.seacargotracking.net/'
+
+
+def test_fingerprint_slots_on_previous_results_and_fingerprints_the_page():
+    slot, _, digest = fingerprint(TASK, state('SINI1'), 'SINI1')
+    typed_slot, _, _ = fingerprint(TASK, state('SINI1', result='Input SINI1 into index 12'), 'SINI1')
+    assert typed_slot != slot
+    changed_slot, _, changed_digest = fingerprint(TASK, state('SINI1', elements='[12]<select></select>'), 'SINI1')
+    assert changed_slot == slot
+    assert changed_digest != digest
+
+
+def test_hit_drift_and_expiry(cache):
+    cache.put_many([('slot', 'url', 'digest', 'output')])
+    assert cache.get('slot', 'digest') == ('hit', 'output')
+    assert cache.get('slot', 'other page') == ('drift', None)
+    # A drifted entry is dropped
+    assert cache.get('slot', 'digest') == ('miss', None)
+
+    cache.put_many([('slot', 'url', 'digest', 'output')])
+    cache.ttl = 0
+    assert cache.get('slot', 'digest') == ('miss', None)
+    cache.ttl = 3600
+    assert cache.get('slot', 'digest') == ('miss', None)
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.put_many([('a', 'url', 'digest', 'A'), ('b', 'url', 'digest', 'B')])
+    # Using 'a' makes 'b' the least recently used
+    assert cache.get('a', 'digest') == ('hit', 'A')
+    cache.put_many([('c', 'url', 'digest', 'C')])
+    assert cache.get('b', 'digest') == ('miss', None)
+    assert cache.get('a', 'digest') == ('hit', 'A')
+    assert cache.get('c', 'digest') == ('hit', 'C')
+
+
+class Step:
+    def __init__(self, name):
+        self.name = name
+
+    def model_dump(self, exclude_unset=False):
+        return {self.name: {}}
+
+
+class ModelOutput:
+    def __init__(self, *names):
+        self.action = [Step(name) for name in names]
+
+    def model_dump_json(self, exclude_unset=False):
+        return '{"action": [{"input_text": {"text": "SINI1"}}]}'
+
+
+def caching_agent(cache, monkeypatch, output):
+    async def ask_model(self, input_messages):
+        return output
+
+    monkeypatch.setattr(Agent, 'get_next_action', ask_model)
+    # Only the attributes get_next_action() and settle() use; no browser or model is needed
+    agent = CachingAgent.__new__(CachingAgent)
+    agent.task = TASK
+    agent.booking_id = 'SINI1'
+    agent.action_cache = cache
+    agent._learned = []
+    agent._reused = []
+    return agent
+
+
+def test_decisions_are_stored_only_after_a_successful_run(cache, monkeypatch):
+    agent = caching_agent(cache, monkeypatch, ModelOutput('input_text'))
+    messages = [HumanMessage(content=state('SINI1'))]
+    slot, _, digest = fingerprint(TASK, state('SINI1'), 'SINI1')
+
+    asyncio.run(agent.get_next_action(messages))
+    agent.settle(False)
+    assert cache.get(slot, digest) == ('miss', None)
+
+    asyncio.run(agent.get_next_action(messages))
+    agent.settle(True)
+    outcome, output = cache.get(slot, digest)
+    assert outcome == 'hit'
+    # Stored with the booking ID parameterised out
+    assert 'SINI1' not in output
+
+
+def test_final_answers_are_never_stored(cache, monkeypatch):
+    agent = caching_agent(cache, monkeypatch, ModelOutput('done'))
+    asyncio.run(agent.get_next_action([HumanMessage(content=state('SINI1'))]))
+    agent.settle(True)
+    slot, _, digest = fingerprint(TASK, state('SINI1'), 'SINI1')
+    assert cache.get(slot, digest) == ('miss', None)
+
+
+def test_failed_run_evicts_the_decisions_it_reused(cache, monkeypatch):
+    agent = caching_agent(cache, monkeypatch, ModelOutput('input_text'))
+    cache.put_many([('slot', 'url', 'digest', 'output')])
+    agent._reused = ['slot']
+    agent.settle(False)
+    assert cache.get('slot', 'digest') == ('miss', None)
@@ -0,0 +1,15 @@
+import asyncio
+import sys
+
+import adaptive_tracking
+import result_cache
+
+
+def test_cache_hit_does_not_import_the_http_fetcher(workdir, capsys, monkeypatch):
+    monkeypatch.setattr(adaptive_tracking, 'load_dotenv', lambda *args, **kwargs: None)
+    monkeypatch.delitem(sys.modules, 'http_fetcher', raising=False)
+    result_cache.get_cache().put({'booking_id': 'SINI1', 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W',
+                                  'arrival_date': '2025-06-03 14:00'})
+    asyncio.run(adaptive_tracking.main(['SINI1']))
+    assert 'YM MANDATE' in capsys.readouterr().out
+    assert 'http_fetcher' not in sys.modules
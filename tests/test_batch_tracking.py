@@ -0,0 +1,22 @@
+import asyncio
+import io
+import json
+import sys
+
+import main
+import result_cache
+from batch_tracking import run_batch
+
+
+def test_cached_batch_runs_without_a_gemini_key(workdir, monkeypatch):
+    monkeypatch.delitem(sys.modules, 'http_fetcher', raising=False)
+    cached = {'booking_id': 'SINI1', 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W',
+              'arrival_date': '2025-06-03 14:00'}
+    result_cache.get_cache().put(cached)
+    out = io.StringIO()
+    assert asyncio.run(run_batch(['SINI1'], out, headless=True, use_http=False)) == (1, 0)
+    record = json.loads(out.getvalue())
+    assert record['status'] == 'ok'
+    assert record['result']['vessel_name'] == 'YM MANDATE'
+    assert main._shared_llm is None
+    assert 'http_fetcher' not in sys.modules
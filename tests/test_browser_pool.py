@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import browser_pool
+from browser_pool import BrowserPool
+
+
+class FakeSession:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+        self.browser_profile = type('Profile', (), {'keep_alive': True})()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePool(BrowserPool):
+    """A pool whose launches follow a script of sessions and errors instead of starting Chrome."""
+
+    def __init__(self, launches, **kwargs):
+        super().__init__(**kwargs)
+        self.launches = list(launches)
+        self.launched = []
+
+    async def _launch(self):
+        await asyncio.sleep(0)
+        outcome = self.launches.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        session = FakeSession(outcome)
+        self._uses[id(session)] = 0
+        self.launched.append(session)
+        return session
+
+    @staticmethod
+    async def _is_healthy(browser_session):
+        return not browser_session.closed
+
+    @staticmethod
+    async def _clean_tab(browser_session):
+        return None
+
+
+def test_failed_start_closes_the_launched_sessions():
+    async def scenario():
+        pool = FakePool(['a', RuntimeError('no chrome'), 'c', 'd'], size=2)
+        with pytest.raises(RuntimeError, match='no chrome'):
+            await pool.start()
+        assert [session.closed for session in pool.launched] == [True]
+        assert not pool._started
+        # The next borrow starts the pool again
+        async with pool.session() as session:
+            assert session.name in ('c', 'd')
+        await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_borrowers_get_the_error_when_relaunching_keeps_failing(monkeypatch):
+    monkeypatch.setattr(browser_pool, 'RELAUNCH_DELAY', 0)
+
+    async def scenario():
+        failures = [RuntimeError(f"no chrome {i}") for i in range(browser_pool.RELAUNCH_ATTEMPTS + 1)]
+        pool = FakePool(['a'] + failures + ['b'], size=1, max_uses=1)
+        async with pool.session():
+            pass
+        # The worn out session cannot be replaced: the next borrower fails instead of waiting forever
+        with pytest.raises(RuntimeError, match='no chrome'):
+            await asyncio.wait_for(pool.session().__aenter__(), 1)
+        # Once Chrome launches again, so does the pool
+        async with pool.session() as session:
+            assert session.name == 'b'
+        await pool.close()
+
+    asyncio.run(scenario())
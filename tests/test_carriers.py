@@ -0,0 +1,36 @@
+import pytest
+
+import carriers as router
+from carriers import GENERIC_VOYAGE, Carrier, carrier_for, get_carrier
+
+
+@pytest.mark.parametrize('booking_id, code', [
+    ('HDMUSEL12345678', 'HMM'),
+    ('EGLV123456789', 'EMC'),
+    (' eglv123456789 ', 'EMC'),
+    ('YMLU1234567', 'YML'),
+    ('ONEYTYOF12345', 'ONE'),
+    ('MAEU123456789', 'MSK'),
+    ('CMDU1234567', 'CMA'),
+])
+def test_bookings_are_routed_by_prefix(booking_id, code):
+    assert carrier_for(booking_id).code == code
+
+
+def test_unknown_prefix_goes_to_the_default_carrier(monkeypatch):
+    monkeypatch.delenv('TRACKING_CARRIER', raising=False)
+    assert carrier_for('SINI25432400').code == 'HMM'
+    monkeypatch.setenv('TRACKING_CARRIER', 'emc')
+    assert carrier_for('SINI25432400').code == 'EMC'
+
+
+def test_longest_prefix_wins(monkeypatch):
+    feeder = Carrier('FDR', 'Feeder line', ('EGLVF',), voyage_pattern=GENERIC_VOYAGE)
+    monkeypatch.setitem(router._carriers, 'FDR', feeder)
+    assert carrier_for('EGLVF1234').code == 'FDR'
+    assert carrier_for('EGLV1234').code == 'EMC'
+
+
+def test_unknown_carrier_code():
+    with pytest.raises(KeyError, match='Unknown carrier'):
+        get_carrier('XYZ')
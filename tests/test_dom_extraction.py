@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+from browser_use.agent.views import ActionResult, AgentHistory, AgentHistoryList
+from browser_use.browser.views import BrowserStateHistory
+
+from carriers import carrier_for
+from dom_extraction import DomExtractor
+from run_metrics import RunMetrics
+from tracking_models import result_fields
+
+SCHEDULE = [[['Vessel / Voyage', 'ETB'], ['YM MANDATE 0096W', '2025-06-03 14:00']]]
+
+
+class FakePage:
+    def __init__(self, tables):
+        self.tables = tables
+
+    async def evaluate(self, script):
+        if isinstance(self.tables, Exception):
+            raise self.tables
+        return self.tables
+
+
+def fake_agent(tables):
+    step = AgentHistory(model_output=None, result=[ActionResult(extracted_content='Clicked search')],
+                        state=BrowserStateHistory(url='https://www.hmm21.com/', title='Track & Trace', tabs=[],
+                                                  interacted_element=[], screenshot=None))
+    page = FakePage(tables)
+
+    async def get_current_page():
+        return page
+
+    return SimpleNamespace(
+        state=SimpleNamespace(history=AgentHistoryList(history=[step])),
+        browser_session=SimpleNamespace(get_current_page=get_current_page),
+    )
+
+
+def test_results_table_ends_the_run_with_a_structured_answer():
+    agent = fake_agent(SCHEDULE)
+    metrics = RunMetrics('SINI1', 'agent')
+    extractor = DomExtractor('SINI1', carrier_for('SINI1'), metrics)
+    asyncio.run(extractor(agent))
+
+    history = agent.state.history
+    assert history.is_done() and history.is_successful()
+    assert metrics.dom_extracted
+    assert result_fields(history, 'SINI1') == {'booking_id': 'SINI1', 'vessel_name': 'YM MANDATE',
+                                               'voyage_number': '0096W', 'arrival_date': '2025-06-03 14:00'}
+    # Only once per run
+    asyncio.run(extractor(agent))
+    assert len(history.history[-1].result) == 2
+
+
+def test_page_without_a_schedule_leaves_the_run_going():
+    for tables in ([[['Notice'], ['No data found']]], [], RuntimeError('Execution context was destroyed')):
+        agent = fake_agent(tables)
+        extractor = DomExtractor('SINI1', carrier_for('SINI1'))
+        asyncio.run(extractor(agent))
+        assert not agent.state.history.is_done()
+        assert extractor.extracted is None
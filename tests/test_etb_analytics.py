@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+import pytest
+
+from etb_analytics import EtbHistory, arrival_column, columns_file
+from result_store import ResultStore
+from tracking_parser import parse_arrival
+
+
+def add_results(db_path, count, recorded_at, booking_prefix='SINI'):
+    store = ResultStore(db_path, batch_size=count + 1)
+    for i in range(count):
+        store.add({'booking_id': f"{booking_prefix}{i:04d}", 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W',
+                   'arrival_date': '2025-02-30 10:00' if i % 2 else '2025-06-03 14:00'},
+                  'http', recorded_at=recorded_at + i)
+    store.close()
+
+
+def test_invalid_dates_load_as_nat(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    add_results(db_path, 4, time.time() - 60)
+    history = EtbHistory.load(db_path)
+    assert len(history) == 4
+    assert np.isnat(history.arrival).tolist() == [False, True, False, True]
+
+
+def test_snapshot_is_trimmed_to_the_retention_window(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'results.db')
+    now = time.time()
+    add_results(db_path, 3, now - 2 * 86400, booking_prefix='OLD')
+    add_results(db_path, 2, now - 60, booking_prefix='NEW')
+    assert len(EtbHistory.load(db_path)) == 5
+
+    monkeypatch.setenv('RESULT_RETENTION_DAYS', '1')
+    history = EtbHistory.load(db_path)
+    assert len(history) == 2
+    snapshot = EtbHistory.read(columns_file(db_path))
+    assert len(snapshot) == 2
+    assert snapshot.booking_ids == ['NEW0000', 'NEW0001']
+
+
+@pytest.mark.parametrize('value', [
+    '2025-06-03 14:30',
+    'ETB 2025-06-03T14:30 (local)',
+    '2025-06-03',
+    '2025-02-30 10:00',
+    '2025-06-03 25:00',
+    '2025-13-01',
+    'Not available',
+    '',
+    None,
+])
+def test_arrival_column_matches_parse_arrival(value):
+    expected = parse_arrival(value)
+    parsed = arrival_column([value])[0]
+    if expected is None:
+        assert np.isnat(parsed)
+    else:
+        assert parsed == np.datetime64(expected, 'm')
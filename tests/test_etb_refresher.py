@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from etb_refresher import EtbStore, refresh_interval
+
+NOW = datetime(2025, 6, 1, 12, 0)
+HOUR = 3600
+
+
+def fields(booking_id, arrival, vessel='YM MANDATE', voyage='0096W'):
+    return {'booking_id': booking_id, 'vessel_name': vessel, 'voyage_number': voyage,
+            'arrival_date': f"{arrival:%Y-%m-%d %H:%M}" if isinstance(arrival, datetime) else arrival}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EtbStore(str(tmp_path / 'tracking.db'))
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize('hours_to_arrival, hours', [
+    (12, 1),
+    (48, 3),
+    (100, 12),
+    (24 * 30, 24),
+    (None, 6),
+])
+def test_refresh_tiers(hours_to_arrival, hours):
+    arrival = NOW + timedelta(hours=hours_to_arrival) if hours_to_arrival is not None else None
+    assert refresh_interval(arrival, None, NOW.timestamp()) == hours * HOUR
+
+
+def test_recent_change_halves_the_interval():
+    arrival = NOW + timedelta(hours=48)
+    assert refresh_interval(arrival, NOW.timestamp() - HOUR, NOW.timestamp()) == 1.5 * HOUR
+    assert refresh_interval(arrival, NOW.timestamp() - 48 * HOUR, NOW.timestamp()) == 3 * HOUR
+
+
+def test_observe_reports_only_changes(store):
+    now = NOW.timestamp()
+    store.add(['SINI1'])
+    assert store.observe(fields('SINI1', NOW + timedelta(days=5)), observed_at=now) == []
+    assert store.observe(fields('SINI1', NOW + timedelta(days=5)), observed_at=now + HOUR) == []
+
+    events = store.observe(fields('SINI1', NOW + timedelta(days=5, hours=6)), observed_at=now + 2 * HOUR)
+    assert [event['event'] for event in events] == ['changed']
+    assert events[0]['shift_hours'] == 6
+    assert list(events[0]['changes']) == ['arrival_date']
+    assert len(store.history('SINI1')) == 2
+
+    # A lookup that found nothing keeps the last known ETB
+    assert store.observe(fields('SINI1', 'Not available'), observed_at=now + 3 * HOUR) == []
+    assert store.watched()[0]['arrival_date'] == f"{NOW + timedelta(days=5, hours=6):%Y-%m-%d %H:%M}"
+
+
+def test_berthed_booking_drops_out(store):
+    now = NOW.timestamp()
+    store.add(['SINI1'])
+    events = store.observe(fields('SINI1', NOW - timedelta(hours=12)), observed_at=now)
+    assert [event['event'] for event in events] == ['berthed']
+    assert store.due(now=now + 30 * 24 * HOUR) == []
+
+
+def test_due_follows_the_refresh_tiers_closest_arrival_first(store):
+    now = NOW.timestamp()
+    store.add(['SOON', 'LATER', 'NEW'])
+    store.observe(fields('SOON', NOW + timedelta(hours=12)), observed_at=now)
+    store.observe(fields('LATER', NOW + timedelta(days=20)), observed_at=now)
+    # Never looked up: due straight away
+    assert store.due(now=now) == ['NEW']
+    assert store.due(now=now + 2 * HOUR) == ['SOON', 'NEW']
+    assert store.due(now=now + 25 * HOUR) == ['SOON', 'LATER', 'NEW']
+    assert store.due(now=now + 25 * HOUR, limit=1) == ['SOON']
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+import http_fetcher
+from carriers import BookingNotFound
+from http_fetcher import FetchError, HMMHttpFetcher, fetch_tracking
+from stub_server import StubHandler, base_url, start_stub_server
+
+
+@pytest.fixture(scope='module')
+def stub_server():
+    server, track_url = start_stub_server()
+    yield server, track_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def track_url(stub_server, monkeypatch):
+    _, url = stub_server
+    monkeypatch.setenv('HMM_TRACK_URL', url)
+    monkeypatch.setattr(http_fetcher, '_shared_fetcher', None)
+    return url
+
+
+def fetch(booking_id, **kwargs):
+    async def scenario():
+        async with HMMHttpFetcher(**kwargs) as fetcher:
+            return await fetcher.fetch(booking_id)
+
+    return asyncio.run(scenario())
+
+
+def fetch_shared(booking_id):
+    async def scenario():
+        try:
+            return await fetch_tracking(booking_id)
+        finally:
+            await http_fetcher.close_fetcher()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('booking_id, vessel, voyage, arrival', [
+    ('SINI25432400', 'YM MANDATE', '0096W', '2025-06-03 08:00'),
+    ('SINI25432401', 'HMM BLESSING', '0027E', '2025-06-21 06:30'),
+])
+def test_html_and_json_responses(track_url, booking_id, vessel, voyage, arrival):
+    expected = {'booking_id': booking_id, 'vessel_name': vessel, 'voyage_number': voyage, 'arrival_date': arrival}
+    assert fetch(booking_id) == expected
+    assert fetch_shared(booking_id) == expected
+
+
+def test_unknown_booking_is_answered_as_not_found(track_url):
+    with pytest.raises(BookingNotFound):
+        fetch('SINI00000000')
+    with pytest.raises(BookingNotFound):
+        fetch_shared('SINI00000000')
+
+
+def test_unreadable_response_is_a_fetch_error(track_url, tmp_path, monkeypatch):
+    # A page without a schedule table or the "no data" answer, as after a site redesign
+    (tmp_path / 'SINI25432400.html').write_text('<html><body><p>Service notice</p></body></html>')
+    monkeypatch.setattr(StubHandler, 'fixtures_dir', str(tmp_path))
+    with pytest.raises(FetchError, match='No vessel schedule'):
+        fetch('SINI25432400')
+
+
+def test_http_error_status_is_a_fetch_error(stub_server, track_url):
+    server, _ = stub_server
+    with pytest.raises(FetchError, match='404'):
+        fetch('SINI25432400', track_url=f"{base_url(server)}/missing")
+    # The stub answers 400 to a booking ID that is not a plain name
+    with pytest.raises(FetchError, match='400'):
+        fetch('../SINI25432400')
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import BACKGROUND, BATCH, INTERACTIVE, GeminiScheduler, KeyQuota, TokenBucket
+
+
+class FakeClock:
+    """Stands in for time.monotonic() and time.sleep() in llm_scheduler."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_scheduler.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(llm_scheduler.time, 'sleep', fake.sleep)
+    return fake
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(60)
+    assert bucket.delay_for(60) == 0
+    bucket.take(60)
+    assert bucket.delay_for(1) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.delay_for(30) == 0
+    assert bucket.delay_for(31) == pytest.approx(1.0)
+    clock.now += 600
+    assert bucket.tokens <= bucket.capacity
+    assert bucket.delay_for(61) == 0
+
+
+def test_token_bucket_give_back_is_capped(clock):
+    bucket = TokenBucket(10)
+    bucket.take(4)
+    bucket.give_back(100)
+    assert bucket.tokens == 10
+
+
+def test_key_quota_waits_for_the_scarcer_bucket(clock):
+    quota = KeyQuota('key-abcd', rpm=60, tpm=600)
+    quota.take(600)
+    assert quota.delay_for(10) == pytest.approx(1.0)
+    assert quota.request_count == 1
+    assert quota.label == '...abcd'
+
+
+def test_key_quota_settle_corrects_the_estimate(clock):
+    quota = KeyQuota('key', rpm=60, tpm=600)
+    quota.take(100)
+    quota.settle(100, 40)
+    assert quota.tokens.tokens == pytest.approx(560)
+    quota.take(100)
+    quota.settle(100, 160)
+    assert quota.tokens.tokens == pytest.approx(400)
+    quota.settle(50, None)
+    assert quota.token_count == 40 + 160 + 50
+
+
+def test_key_quota_cool_down(clock):
+    quota = KeyQuota('key', rpm=60, tpm=600)
+    quota.cool_down(5)
+    assert quota.delay_for(1) == pytest.approx(5)
+    assert quota.rate_limited == 1
+    clock.now += 5
+    assert quota.delay_for(1) == 0
+
+
+def test_scheduler_spreads_calls_over_keys(clock):
+    scheduler = GeminiScheduler(['key-1', 'key-2'], rpm=1, tpm=1000)
+
+    async def acquire_two():
+        return [await scheduler.acquire(10), await scheduler.acquire(10)]
+
+    first, second = asyncio.run(acquire_two())
+    assert {first.api_key, second.api_key} == {'key-1', 'key-2'}
+
+
+def test_scheduler_serves_waiters_by_priority(clock):
+    scheduler = GeminiScheduler(['key'], rpm=60, tpm=1_000_000)
+    scheduler.quotas[0].requests.take(60)
+    served = []
+
+    async def call(name, priority):
+        await scheduler.acquire(1, priority)
+        served.append(name)
+
+    async def run():
+        tasks = [asyncio.create_task(call(name, priority)) for name, priority in
+                 (('background', BACKGROUND), ('batch', BATCH), ('interactive', INTERACTIVE))]
+        # Every call is queued; now let one request per turn through
+        await asyncio.sleep(0)
+        for _ in tasks:
+            scheduler.quotas[0].requests.give_back(1)
+            async with scheduler._condition:
+                scheduler._condition.notify_all()
+            for _ in range(5):
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert served == ['interactive', 'batch', 'background']
+
+
+def test_blocking_acquire_sleeps_until_quota(clock):
+    scheduler = GeminiScheduler(['key'], rpm=60, tpm=1_000_000)
+    scheduler.quotas[0].requests.take(60)
+    started = clock.now
+    quota = scheduler.acquire_blocking(10)
+    assert quota.api_key == 'key'
+    assert clock.now - started == pytest.approx(1.0)
+
+
+def test_scheduler_needs_a_key():
+    with pytest.raises(ValueError):
+        GeminiScheduler([])
+
+
+@pytest.mark.parametrize('keys, key, expected', [
+    ('a, b ,,c', None, ['a', 'b', 'c']),
+    (None, 'single', ['single']),
+    ('', 'single', ['single']),
+    (None, None, []),
+])
+def test_api_keys_from_env(monkeypatch, keys, key, expected):
+    for name, value in (('GOOGLE_API_KEYS', keys), ('GOOGLE_API_KEY', key)):
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+    assert llm_scheduler.api_keys_from_env() == expected
+
+
+def test_scheduled_model_skips_browser_use_verification():
+    from gemini_client import create_scheduled_llm
+
+    llm = create_scheduled_llm(scheduler=GeminiScheduler(['key']))
+    assert llm._verified_api_keys is True
+
+
+def test_scheduled_model_throttles_blocking_calls(clock, monkeypatch):
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    from gemini_client import ScheduledChatGoogleGenerativeAI, create_scheduled_llm
+
+    class FakeClient:
+        def _generate(self, messages, **kwargs):
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content='ok'))])
+
+    scheduler = GeminiScheduler(['key'], rpm=60, tpm=1_000_000)
+    llm = create_scheduled_llm(scheduler=scheduler)
+    monkeypatch.setattr(ScheduledChatGoogleGenerativeAI, '_client_for', lambda self, api_key: FakeClient())
+    scheduler.quotas[0].requests.take(60)
+    started = clock.now
+    assert llm.invoke([HumanMessage(content='hello')]).content == 'ok'
+    assert clock.now - started == pytest.approx(1.0)
+    assert scheduler.stats()[0]['requests'] == 1
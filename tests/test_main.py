@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+import main
+import result_cache
+
+
+def test_cache_hit_needs_no_lookup(workdir, capsys, monkeypatch):
+    async def no_agent(*args, **kwargs):
+        raise AssertionError("the agent ran for a cached booking")
+
+    monkeypatch.setattr(main, 'track_shipping', no_agent)
+    result_cache.get_cache().put({'booking_id': 'SINI1', 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W',
+                                  'arrival_date': '2025-06-03 14:00'})
+    asyncio.run(main.main(['SINI1']))
+    output = capsys.readouterr().out
+    assert 'Cached result from' in output and 'YM MANDATE' in output
+    assert not os.path.exists(main.carrier_for('SINI1').storage_file)
+
+
+def test_agent_result_is_printed_and_saved(workdir, capsys, monkeypatch):
+    async def agent(booking_id, **kwargs):
+        return f"Could not find booking {booking_id}"
+
+    monkeypatch.setattr(main, 'track_shipping', agent)
+    asyncio.run(main.main(['SINI1', '--no-http']))
+    output = capsys.readouterr().out
+    assert 'Could not find booking SINI1' in output
+    assert 'Saved tracking result and 0 replay steps' in output
+    assert os.path.exists(main.carrier_for('SINI1').storage_file)
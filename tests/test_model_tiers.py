@@ -0,0 +1,125 @@
+import asyncio
+from types import SimpleNamespace
+
+import main
+from model_tiers import ESCALATIONS, EscalationPolicy, ModelLadder, TierEscalator
+from run_metrics import RunMetrics
+
+
+class Action:
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def model_dump(self, exclude_unset=False):
+        return self.fields
+
+
+def step(error=None, url='https://www.seacargotracking.net/', **action):
+    return SimpleNamespace(
+        result=[SimpleNamespace(error=error)],
+        model_output=SimpleNamespace(action=[Action(**(action or {'click_element_by_index': {'index': 3}}))]),
+        state=SimpleNamespace(url=url),
+    )
+
+
+class History:
+    def __init__(self):
+        self.history = []
+
+    def is_done(self):
+        return False
+
+
+def fake_agent(llm):
+    forgotten = []
+    agent = SimpleNamespace(
+        llm=llm,
+        model_name=llm.model_name,
+        settings=SimpleNamespace(page_extraction_llm=llm),
+        state=SimpleNamespace(history=History()),
+        forget_reused=lambda: forgotten.append(True),
+    )
+    return agent, forgotten
+
+
+def ladder(*names):
+    return ModelLadder([SimpleNamespace(model_name=name) for name in names])
+
+
+def run_steps(escalator, agent, steps):
+    for item in steps:
+        agent.state.history.history.append(item)
+        asyncio.run(escalator(agent))
+
+
+def test_stalled_agent_moves_to_the_next_tier():
+    models = ladder('stall-lite', 'stall-pro')
+    agent, forgotten = fake_agent(models[0])
+    metrics = RunMetrics(booking_id='SINI1', path='agent')
+    escalator = TierEscalator(models, metrics=metrics, policy=EscalationPolicy(stall_steps=2, repeat_steps=0))
+    before = ESCALATIONS.value(from_model='stall-lite', to_model='stall-pro', reason='stall')
+
+    run_steps(escalator, agent, [step(error='Element not found', index=1), step(error='Timeout', index=2)])
+    assert agent.llm is models[1]
+    assert agent.settings.page_extraction_llm is models[1]
+    assert escalator.tier == 1
+    assert forgotten == [True]
+    assert metrics.model_tier == 'stall-pro' and metrics.escalations == 1
+    assert ESCALATIONS.value(from_model='stall-lite', to_model='stall-pro', reason='stall') == before + 1
+
+
+def test_repeating_agent_moves_to_the_next_tier_once():
+    models = ladder('repeat-lite', 'repeat-pro')
+    agent, _ = fake_agent(models[0])
+    escalator = TierEscalator(models, policy=EscalationPolicy(stall_steps=0, repeat_steps=3))
+    before = ESCALATIONS.value(from_model='repeat-lite', to_model='repeat-pro', reason='repeat')
+
+    run_steps(escalator, agent, [step(), step()])
+    assert agent.llm is models[0]
+    run_steps(escalator, agent, [step()])
+    assert agent.llm is models[1]
+    # The top tier has nowhere to go
+    run_steps(escalator, agent, [step(), step(), step()])
+    assert escalator.tier == 1
+    assert ESCALATIONS.value(from_model='repeat-lite', to_model='repeat-pro', reason='repeat') == before + 1
+
+
+def test_progressing_agent_stays_on_its_tier():
+    models = ladder('steady-lite', 'steady-pro')
+    agent, _ = fake_agent(models[0])
+    escalator = TierEscalator(models, policy=EscalationPolicy(stall_steps=2, repeat_steps=3))
+    run_steps(escalator, agent, [step(index=1), step(error='Timeout', index=2), step(index=3), step(index=4)])
+    assert agent.llm is models[0]
+    assert escalator.tier == 0
+
+
+def test_run_with_nothing_found_is_retried_on_the_next_tier(monkeypatch):
+    models = ladder('retry-lite', 'retry-pro')
+    answers = {
+        0: "I could not find booking SINI1",
+        1: '{"vessel_name": "YM MANDATE", "voyage_number": "0096W", "arrival_date": "2025-06-03 14:00"}',
+    }
+    tiers = []
+
+    async def run_on_tier(task, ladder, tier, browser_session, booking_id, budget, carrier):
+        tiers.append(ladder.name(tier))
+        return answers[tier], tier
+
+    monkeypatch.setattr(main, '_run_agent_on_tier', run_on_tier)
+    before = ESCALATIONS.value(from_model='retry-lite', to_model='retry-pro', reason='no_result')
+    result = asyncio.run(main.run_tracking_agent('task', models, None, booking_id='SINI1'))
+    assert result == answers[1]
+    assert tiers == ['retry-lite', 'retry-pro']
+    assert ESCALATIONS.value(from_model='retry-lite', to_model='retry-pro', reason='no_result') == before + 1
+
+
+def test_nothing_found_on_the_top_tier_is_not_retried(monkeypatch):
+    tiers = []
+
+    async def run_on_tier(task, ladder, tier, browser_session, booking_id, budget, carrier):
+        tiers.append(tier)
+        return "I could not find booking SINI1", tier
+
+    monkeypatch.setattr(main, '_run_agent_on_tier', run_on_tier)
+    asyncio.run(main.run_tracking_agent('task', ladder('only'), None, booking_id='SINI1'))
+    assert tiers == [0]
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from replay import BOOKING_ID_PLACEHOLDER, ReplayError, _write_json, record_script, replay_script
+
+
+def test_write_json_replaces_the_file_without_leftovers(tmp_path):
+    path = tmp_path / 'interactions' / 'tracking_interactions.json'
+    _write_json(str(path), {'version': 1})
+    _write_json(str(path), {'version': 2})
+    assert json.loads(path.read_text(encoding='utf-8')) == {'version': 2}
+    assert os.listdir(path.parent) == [path.name]
+
+
+class Action:
+    def __init__(self, name, **params):
+        self.name, self.params = name, params
+
+    def model_dump(self, exclude_unset=False):
+        return {self.name: self.params}
+
+
+def history_item(actions, elements=None, errors=None):
+    return SimpleNamespace(
+        model_output=SimpleNamespace(action=actions),
+        state=SimpleNamespace(interacted_element=elements or [None] * len(actions)),
+        result=[SimpleNamespace(error=error) for error in (errors or [None] * len(actions))],
+    )
+
+
+def test_record_script_keeps_successful_actions_with_the_booking_id_parameterised():
+    form = SimpleNamespace(xpath='html/body/form/input', css_selector='input#booking')
+    button = SimpleNamespace(xpath='html/body/form/button', css_selector=None)
+    history = SimpleNamespace(history=[
+        history_item([Action('go_to_url', url='http://www.seacargotracking.net/')]),
+        history_item([Action('click_element_by_index', index=4)], [button], ['Element not clickable']),
+        history_item([Action('input_text', index=3, text='SINI1'), Action('click_element_by_index', index=4)],
+                     [form, button]),
+        history_item([Action('send_keys', keys='Enter'), Action('switch_tab', page_id=1)]),
+        SimpleNamespace(model_output=None),
+    ])
+    assert record_script(history, 'SINI1') == [
+        {'action': 'navigate', 'url': 'http://www.seacargotracking.net/'},
+        {'action': 'fill', 'xpath': 'html/body/form/input', 'css_selector': 'input#booking',
+         'value': BOOKING_ID_PLACEHOLDER},
+        {'action': 'click', 'xpath': 'html/body/form/button'},
+        {'action': 'press', 'keys': 'Enter'},
+        {'action': 'switch_tab', 'page_index': 1},
+    ]
+
+
+class FakeLocator:
+    def __init__(self, page, selector):
+        self.page, self.selector = page, selector
+
+    async def count(self):
+        return 1 if self.selector in self.page.elements else 0
+
+    async def wait_for(self, **kwargs):
+        pass
+
+    async def click(self, **kwargs):
+        self.page.log.append(('click', self.selector))
+
+    async def fill(self, value, **kwargs):
+        self.page.log.append(('fill', self.selector, value))
+
+
+class FakePage:
+    """Just enough of a Playwright page for replay_script()."""
+
+    def __init__(self, elements, tables):
+        self.elements = elements
+        self.tables = tables
+        self.log = []
+        self.context = SimpleNamespace(pages=[self])
+        self.keyboard = SimpleNamespace(press=self._press)
+
+    async def _press(self, keys):
+        self.log.append(('press', keys))
+
+    async def goto(self, url, **kwargs):
+        self.log.append(('goto', url))
+
+    def locator(self, selector):
+        return FakeLocator(self, selector)
+
+    async def wait_for_selector(self, selector, **kwargs):
+        pass
+
+    async def wait_for_load_state(self, state, **kwargs):
+        pass
+
+    async def evaluate(self, script):
+        return self.tables
+
+
+SCRIPT = [
+    {'action': 'navigate', 'url': 'http://www.seacargotracking.net/'},
+    {'action': 'fill', 'xpath': 'html/body/form/input', 'css_selector': 'input#booking',
+     'value': BOOKING_ID_PLACEHOLDER},
+    {'action': 'click', 'xpath': 'html/body/form/button'},
+]
+SCHEDULE = [[['Vessel / Voyage', 'ETB'], ['YM MANDATE 0096W', '2025-06-03 14:00']]]
+
+
+def test_replay_script_types_the_new_booking_id_and_reads_the_table():
+    page = FakePage({'input#booking', 'xpath=/html/body/form/button'}, SCHEDULE)
+    extracted = asyncio.run(replay_script(SCRIPT, 'SINI2', page))
+    assert page.log == [
+        ('goto', 'http://www.seacargotracking.net/'),
+        ('fill', 'input#booking', 'SINI2'),
+        ('click', 'xpath=/html/body/form/button'),
+    ]
+    assert extracted == {'booking_id': 'SINI2', 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W',
+                         'arrival_date': '2025-06-03 14:00'}
+
+
+def test_replay_script_reports_the_step_that_failed():
+    page = FakePage({'xpath=/html/body/form/button'}, SCHEDULE)
+    with pytest.raises(ReplayError) as failure:
+        asyncio.run(replay_script(SCRIPT, 'SINI2', page))
+    assert failure.value.step_index == 1
+    assert failure.value.step is SCRIPT[1]
+
+
+def test_replay_script_without_a_schedule_fails():
+    page = FakePage({'input#booking', 'xpath=/html/body/form/button'}, [[['Notice'], ['No data found']]])
+    with pytest.raises(ReplayError, match='No vessel schedule'):
+        asyncio.run(replay_script(SCRIPT[:2], 'SINI2', page))
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from result_cache import ResultCache
+
+FOUND = {'booking_id': 'SINI1', 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W',
+         'arrival_date': '2025-06-03 14:00'}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / 'tracking.db'), ttl=3600)
+    yield cache
+    cache.close()
+
+
+def test_fresh_result_is_returned_with_its_age(cache):
+    fetched_at = time.time() - 60
+    cache.put(FOUND, fetched_at=fetched_at)
+    assert cache.get('SINI1') == dict(FOUND, fetched_at=fetched_at)
+
+
+def test_ttl_and_max_age(cache):
+    cache.put(FOUND, fetched_at=time.time() - 2 * 3600)
+    assert cache.get('SINI1') is None
+    assert cache.get('SINI1', max_age=3 * 3600) is not None
+    cache.put(FOUND)
+    assert cache.get('SINI1', max_age=60) is not None
+    # max_age=0 always asks for a new lookup
+    assert cache.get('SINI1', max_age=0) is None
+
+
+def test_results_survive_a_restart_and_respect_max_age(tmp_path):
+    db_path = str(tmp_path / 'tracking.db')
+    first = ResultCache(db_path, ttl=3600)
+    first.put(FOUND, fetched_at=time.time() - 600)
+    first.close()
+    cache = ResultCache(db_path, ttl=3600)
+    assert cache.get('SINI1', max_age=300) is None
+    assert cache.get('SINI1')['vessel_name'] == 'YM MANDATE'
+    cache.close()
+
+
+def test_not_found_results_are_not_cached(cache):
+    cache.put(dict(FOUND, vessel_name='Not available'))
+    assert cache.get('SINI1') is None
+
+
+def test_purge_drops_old_results_from_both_tiers(cache):
+    cache.put(FOUND, fetched_at=time.time() - 7200)
+    cache.put(dict(FOUND, booking_id='SINI2'))
+    cache.purge()
+    assert cache.get('SINI1', max_age=10 * 3600) is None
+    assert cache.get('SINI2') is not None
@@ -0,0 +1,48 @@
+import asyncio
+import sqlite3
+
+from result_store import ResultStore
+
+
+def stored_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_buffered_results_are_committed_while_the_loop_is_idle(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+
+    async def scenario():
+        store = ResultStore(db_path, batch_size=100, flush_interval=0.05)
+        store.add({'booking_id': 'SINI1'}, 'http')
+        assert stored_rows(db_path) == 0
+        # Nothing else is added: the timer commits the buffered result
+        await asyncio.sleep(0.2)
+        assert stored_rows(db_path) == 1
+        store.close()
+
+    asyncio.run(scenario())
+
+
+def test_results_are_buffered_without_an_event_loop(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    store = ResultStore(db_path, batch_size=100)
+    store.add({'booking_id': 'SINI1'}, 'http')
+    assert stored_rows(db_path) == 0
+    store.close()
+    assert stored_rows(db_path) == 1
+
+
+def test_queries_see_buffered_results(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'), batch_size=100)
+    store.add({'booking_id': 'SINI1', 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W',
+               'arrival_date': '2025-06-03 14:00'}, 'agent', raw_history='history text')
+    assert [row['booking_id'] for row in store.latest()] == ['SINI1']
+    assert len(store.history('SINI1')) == 1
+    assert [row['booking_id'] for row in store.voyage('ym mandate', '0096w')] == ['SINI1']
+    assert store.stats()['results'] == 1
+    assert store.raw_history(store.latest()[0]['id']) == 'history text'
+    store.close()
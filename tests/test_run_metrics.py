@@ -0,0 +1,20 @@
+from run_metrics import rotate_metrics
+
+
+def test_metrics_file_is_rotated_once_full(tmp_path):
+    metrics_file = tmp_path / 'run_metrics.jsonl'
+    for generation in range(4):
+        metrics_file.write_text(f"{generation}\n" * 10)
+        rotate_metrics(str(metrics_file), max_bytes=10, backups=2)
+    assert not metrics_file.exists()
+    assert (tmp_path / 'run_metrics.jsonl.1').read_text().startswith('3')
+    assert (tmp_path / 'run_metrics.jsonl.2').read_text().startswith('2')
+    assert not (tmp_path / 'run_metrics.jsonl.3').exists()
+
+
+def test_small_metrics_file_is_kept(tmp_path):
+    metrics_file = tmp_path / 'run_metrics.jsonl'
+    metrics_file.write_text('{}\n')
+    rotate_metrics(str(metrics_file), max_bytes=1024, backups=2)
+    assert metrics_file.read_text() == '{}\n'
+    rotate_metrics(str(tmp_path / 'missing.jsonl'), max_bytes=1, backups=2)
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from carriers import BookingNotFound
+from self_healing import FastPathSupervisor, HealingPolicy
+
+
+async def failing_fetch(booking_id):
+    raise ConnectionError(f"reset while fetching {booking_id}")
+
+
+async def found_fetch(booking_id):
+    return {'booking_id': booking_id}
+
+
+def test_probe_that_raises_ends_the_probe():
+    async def scenario():
+        supervisor = FastPathSupervisor('YML', HealingPolicy(window=2, min_samples=2, miss_rate=0.5, cooldown=0))
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await supervisor.call(failing_fetch, 'SINI1')
+        # Paused with no cooldown: the next lookup probes, and its exception is a miss
+        assert supervisor.allow()
+        with pytest.raises(ConnectionError):
+            await supervisor.call(failing_fetch, 'SINI1')
+        # Not stuck probing: the following lookup probes again and resumes the path
+        assert supervisor.allow()
+        assert await supervisor.call(found_fetch, 'SINI1') == {'booking_id': 'SINI1'}
+        assert supervisor.allow() and supervisor.allow()
+
+    asyncio.run(scenario())
+
+
+async def not_found_fetch(booking_id):
+    raise BookingNotFound(f"no schedule for {booking_id}")
+
+
+def test_unknown_bookings_never_pause_the_fast_path():
+    async def scenario():
+        supervisor = FastPathSupervisor('HMM', HealingPolicy(window=4, min_samples=2, miss_rate=0.5, cooldown=600))
+        for _ in range(10):
+            assert supervisor.allow()
+            assert await supervisor.call(not_found_fetch, 'SINI0') is None
+        assert not supervisor.breached()
+        # Lookups that read nothing still count as misses
+        for _ in range(2):
+            await supervisor.call(lambda booking_id: asyncio.sleep(0), 'SINI1')
+        assert not supervisor.allow()
+
+    asyncio.run(scenario())
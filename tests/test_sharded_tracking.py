@@ -0,0 +1,48 @@
+import pytest
+
+import sharded_tracking
+from sharded_tracking import MAX_ATTEMPTS, WorkQueue
+
+
+def expire_leases(queue):
+    with queue._conn:
+        queue._conn.execute("UPDATE shard_jobs SET claimed_at = claimed_at - ?", (sharded_tracking.LEASE_SECONDS + 1,))
+
+
+def test_expired_leases_are_requeued_until_the_attempts_run_out(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    batch = queue.enqueue(['SINI1'], shards=1)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        assert queue.claim('worker', [0]) is not None
+        expire_leases(queue)
+        requeued, given_up = queue.requeue_expired()
+        assert (requeued, given_up) == ((1, 0) if attempt < MAX_ATTEMPTS else (0, 1))
+    assert queue.claim('worker', [0]) is None
+    assert queue.counts(batch) == {'done': 1}
+    [record] = queue.records(batch)
+    assert record['status'] == 'error' and record['booking_id'] == 'SINI1'
+    queue.close()
+
+
+def test_claim_leaves_running_jobs_alone(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    queue.enqueue(['SINI1'], shards=1)
+    assert queue.claim('worker', [0]) is not None
+    expire_leases(queue)
+    # Requeueing is the sweep's job, not claim()'s
+    assert queue.claim('worker', [0]) is None
+    queue.close()
+
+
+def test_worker_processes_split_the_host_quota(monkeypatch):
+    started = []
+    monkeypatch.setattr(sharded_tracking, 'start_workers',
+                        lambda queue_path, groups, quota_share, options: started.append((groups, quota_share)) or [])
+    sharded_tracking.main(['worker', '--shards', '4', '--shard', '0', '--shard', '1', '--quota-share', '0.5'])
+    assert started == [([[0], [1]], 0.25)]
+
+
+def test_worker_rejects_shards_outside_the_ring(monkeypatch):
+    monkeypatch.setattr(sharded_tracking, 'start_workers', lambda *args: [])
+    with pytest.raises(SystemExit):
+        sharded_tracking.main(['worker', '--shards', '2', '--shard', '2'])
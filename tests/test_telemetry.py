@@ -0,0 +1,16 @@
+import urllib.request
+
+import telemetry
+
+
+def test_metrics_server_listens_on_loopback_by_default():
+    telemetry.counter('tracking_test_total', "Test counter").inc()
+    server = telemetry.start_metrics_server(0)
+    try:
+        host, port = server.server_address[:2]
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert 'tracking_test_total' in response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from telemetry import EXTRACTION_MISSES
+from tracking_models import result_fields, structured_fields
+
+
+class History:
+    def __init__(self, final, contents=()):
+        self._final = final
+        self._contents = list(contents)
+
+    def final_result(self):
+        return self._final
+
+    def extracted_content(self):
+        return list(self._contents)
+
+
+def tracking_output(*rows):
+    return json.dumps({'vessel_voyage': [
+        {'vessel_name': vessel, 'voyage_number': voyage, 'arrival_date_time': arrival}
+        for vessel, voyage, arrival in rows
+    ]})
+
+
+def test_structured_output_is_normalised():
+    history = History(tracking_output((' YM MANDATE 0096W ', '0096W', '2025-06-03T14:00:00'),
+                                      ('HMM BLESSING', '0027E', '2025-06-21 06:30')))
+    assert structured_fields(history, 'SINI1') == {
+        'booking_id': 'SINI1',
+        'vessel_name': 'YM MANDATE',
+        'voyage_number': '0096W',
+        'arrival_date': '2025-06-03 14:00',
+    }
+
+
+def test_blank_structured_fields_are_not_available():
+    history = History(tracking_output(('YM MANDATE', ' ', '2025-06-03 14:00')))
+    assert structured_fields(history, 'SINI1')['voyage_number'] == 'Not available'
+
+
+@pytest.mark.parametrize('final', [
+    None,
+    '',
+    'The vessel is YM MANDATE',
+    '{"vessel_voyage": []}',
+    '{"vessel_voyage": [{"vessel_name": "YM MANDATE"}]}',
+])
+def test_no_valid_structured_output(final):
+    assert structured_fields(History(final), 'SINI1') is None
+
+
+def test_structured_fields_ignore_plain_results():
+    assert structured_fields('{"vessel_voyage": []}', 'SINI1') is None
+
+
+def test_result_fields_fall_back_to_text_extraction():
+    history = History('Done', ['Vessel name: YM MANDATE, voyage number 0096W, ETB date: 2025-06-03 14:00'])
+    extracted = result_fields(history, 'SINI1')
+    assert extracted['vessel_name'] == 'YM MANDATE'
+    assert extracted['voyage_number'] == '0096W'
+
+
+def test_result_fields_count_a_miss():
+    before = EXTRACTION_MISSES.value(source='agent')
+    extracted = result_fields(History('Booking not found'), 'SINI1')
+    assert extracted['vessel_name'] == 'Not available'
+    assert EXTRACTION_MISSES.value(source='agent') == before + 1
@@ -0,0 +1,69 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+from tracking_parser import NOT_AVAILABLE, empty_fields, extract_tracking_fields, parse_arrival
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from bench_parser import BOOKING_ID, RecordedHistory, load_corpus  # noqa: E402
+
+CORPUS, EXPECTED = load_corpus()
+HISTORIES = sorted(name for name, text in CORPUS.items() if text.startswith('AgentHistoryList('))
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2025-06-03 14:30', datetime(2025, 6, 3, 14, 30)),
+    ('ETB 2025-06-03T14:30 (local)', datetime(2025, 6, 3, 14, 30)),
+    ('2025-06-03', datetime(2025, 6, 3)),
+])
+def test_parse_arrival(value, expected):
+    assert parse_arrival(value) == expected
+
+
+@pytest.mark.parametrize('value', [
+    '2025-02-30 10:00',
+    '2025-06-03 25:00',
+    '2025-13-01',
+    NOT_AVAILABLE,
+    '',
+    None,
+])
+def test_parse_arrival_without_a_valid_date(value):
+    assert parse_arrival(value) is None
+
+
+@pytest.mark.parametrize('filename', sorted(CORPUS))
+def test_corpus_text(filename):
+    expected = dict(EXPECTED[filename], booking_id=BOOKING_ID)
+    assert extract_tracking_fields(CORPUS[filename], BOOKING_ID) == expected
+
+
+@pytest.mark.parametrize('filename', HISTORIES)
+def test_corpus_history(filename):
+    expected = dict(EXPECTED[filename], booking_id=BOOKING_ID)
+    assert extract_tracking_fields(RecordedHistory(CORPUS[filename]), BOOKING_ID) == expected
+
+
+class History:
+    def __init__(self, final, contents):
+        self._final = final
+        self._contents = contents
+
+    def final_result(self):
+        return self._final
+
+    def extracted_content(self):
+        return list(self._contents)
+
+
+def test_history_keeps_an_earlier_partial_match():
+    # Walked newest first: the arrival-only match comes before the older step
+    history = History('I could not find the vessel.', [
+        'Clicked the search button',
+        'Arrival date (ETB): 2025-06-03 14:00',
+    ])
+    expected = dict(empty_fields(BOOKING_ID), arrival_date='2025-06-03 14:00')
+    assert extract_tracking_fields(history, BOOKING_ID) == expected
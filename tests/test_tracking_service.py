@@ -0,0 +1,96 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+from tracking_service import handle_request
+
+
+class RecordingService:
+    """Stands in for TrackingService and remembers what was submitted."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, booking_ids, max_age=None):
+        self.submitted.append((booking_ids, max_age))
+
+        class _Job:
+            job_id = 'job'
+
+            def to_dict(self):
+                return {'job_id': 'job', 'booking_ids': booking_ids}
+
+        return _Job()
+
+
+def post_track(body, target='/track'):
+    service = RecordingService()
+    raw = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+    status, payload, _ = asyncio.run(handle_request(service, 'POST', target, raw))
+    return status, payload, service.submitted
+
+
+@pytest.mark.parametrize('body', [
+    {'booking_ids': 'ABC'},
+    {'booking_ids': ['SINI1', 2]},
+    {'booking_id': 42},
+    [1, 2],
+    None,
+    'SINI1',
+    {'booking_ids': ['SINI1'], 'max_age': 'soon'},
+    {'booking_ids': ['SINI1'], 'max_age': True},
+    {},
+    {'booking_ids': ['  ']},
+    b'not json',
+])
+def test_invalid_track_bodies_are_rejected(body):
+    status, payload, submitted = post_track(body)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert 'error' in payload
+    assert submitted == []
+
+
+def test_valid_track_body_is_queued():
+    status, _, submitted = post_track({'booking_ids': ['SINI1', ' SINI2 ', 'SINI1'], 'max_age': 60})
+    assert status == HTTPStatus.ACCEPTED
+    assert submitted == [(['SINI1', 'SINI2'], 60)]
+
+
+def test_single_booking_id_and_query_max_age():
+    status, _, submitted = post_track({'booking_id': 'SINI1'}, target='/track?max_age=30')
+    assert status == HTTPStatus.ACCEPTED
+    assert submitted == [(['SINI1'], 30.0)]
+
+
+def test_fresh_lookup_does_not_join_a_looser_one_in_flight():
+    from tracking_service import TrackingService
+
+    async def scenario():
+        service = TrackingService(workers=3)
+        lookups = []
+        release = asyncio.Event()
+
+        async def lookup(booking_id, max_age=None, **kwargs):
+            lookups.append(max_age)
+            await release.wait()
+            return {'booking_id': booking_id, 'max_age': max_age}
+
+        service._lookup = lookup
+        workers = [asyncio.create_task(service._worker()) for _ in range(service.workers)]
+        records = []
+        for max_age in (None, None, 0):
+            service._enqueue(1, 'SINI1', max_age, records.append)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        release.set()
+        await service._queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        return lookups, records
+
+    lookups, records = asyncio.run(scenario())
+    assert sorted(lookups, key=str) == [0, None]
+    assert sorted(record['result']['max_age'] is None for record in records) == [False, True, True]
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from voyage_index import SingleFlight, get_single_flight
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        single_flight = SingleFlight()
+        runs = []
+
+        async def lookup():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return 'ETB'
+
+        results = await asyncio.gather(*(single_flight.do('YM MANDATE/0096W', lookup) for _ in range(3)))
+        assert results == ['ETB'] * 3
+        assert len(runs) == 1
+
+    asyncio.run(scenario())
+
+
+def test_follower_takes_over_when_the_leader_is_cancelled():
+    async def scenario():
+        single_flight = SingleFlight()
+        runs = []
+
+        async def lookup():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return 'ETB'
+
+        leader = asyncio.create_task(single_flight.do('sailing', lookup))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(single_flight.do('sailing', lookup))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == 'ETB'
+        assert len(runs) == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_follower_leaves_the_leader_running():
+    async def scenario():
+        single_flight = SingleFlight()
+
+        async def lookup():
+            await asyncio.sleep(0.02)
+            return 'ETB'
+
+        leader = asyncio.create_task(single_flight.do('sailing', lookup))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(single_flight.do('sailing', lookup))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        assert await leader == 'ETB'
+
+    asyncio.run(scenario())
+
+
+def test_refreshes_share_one_single_flight():
+    assert get_single_flight() is get_single_flight()
+
+
+def refresh_concurrently(answers, groups):
+    """Run one refresh_voyages per booking list at once, sharing a SingleFlight; returns their records."""
+    from voyage_index import VoyageIndex, refresh_voyages
+
+    index = VoyageIndex()
+    for booking_id in answers:
+        index.record({'booking_id': booking_id, 'vessel_name': 'YM MANDATE', 'voyage_number': '0096W'})
+    single_flight = SingleFlight()
+    records = [[] for _ in groups]
+
+    async def lookup(booking_id):
+        await asyncio.sleep(0.02)
+        vessel, voyage = answers[booking_id]
+        return {'booking_id': booking_id, 'vessel_name': vessel, 'voyage_number': voyage,
+                'arrival_date': '2025-06-03 08:00'}
+
+    async def scenario():
+        return await asyncio.gather(*(
+            refresh_voyages(booking_ids, lookup, records[i].append, index=index, single_flight=single_flight)
+            for i, booking_ids in enumerate(groups)
+        ))
+
+    lookups = asyncio.run(scenario())
+    index.close()
+    return lookups, records
+
+
+def test_concurrent_refresh_shares_a_same_sailing_answer(workdir):
+    lookups, (_, joined) = refresh_concurrently(
+        {'SINI1': ('YM MANDATE', '0096W'), 'SINI2': ('YM MANDATE', '0096W')}, [['SINI1'], ['SINI2']])
+    assert lookups == [1, 0]
+    assert joined[0]['booking_id'] == 'SINI2' and joined[0]['shared_with'] == 'SINI1'
+
+
+def test_concurrent_refresh_ignores_another_bookings_rollover(workdir):
+    from result_cache import get_cache
+
+    lookups, (rolled, joined) = refresh_concurrently(
+        {'SINI1': ('HMM BLESSING', '0027E'), 'SINI2': ('YM MANDATE', '0096W')}, [['SINI1'], ['SINI2']])
+    assert lookups == [1, 1]
+    assert rolled[0]['result']['vessel_name'] == 'HMM BLESSING'
+    assert 'shared_with' not in joined[0]
+    assert joined[0]['result']['vessel_name'] == 'YM MANDATE'
+    assert get_cache().get('SINI2')['vessel_name'] == 'YM MANDATE'
@@ -0,0 +1,96 @@
+"""
+Typed output schema for the tracking agent.
+
+The agent is run with a browser-use Controller whose `done` action must
+return a TrackingOutput, so the final result arrives as validated JSON and
+the regex parser in tracking_parser.py is only a fallback for runs that
+ended without a structured answer.
+"""
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from telemetry import EXTRACTION_MISSES, get_logger, span
+from tracking_parser import NOT_AVAILABLE, empty_fields, extract_tracking_fields, split_vessel_and_voyage
+
+logger = get_logger('models')
+
+
+class VesselVoyage(BaseModel):
+    vessel_name: str = Field(description="Vessel name without the voyage number, e.g. YM MANDATE")
+    voyage_number: str = Field(description="Voyage number, e.g. 0096W")
+    arrival_date_time: str = Field(
+        description="Arrival date with time from ETB (Estimated Time of Berthing), formatted YYYY-MM-DD HH:MM"
+    )
+
+    @field_validator('vessel_name', 'voyage_number', 'arrival_date_time')
+    @classmethod
+    def _strip(cls, value):
+        value = value.strip()
+        return value or NOT_AVAILABLE
+
+    @field_validator('arrival_date_time')
+    @classmethod
+    def _normalise_separator(cls, value):
+        # "2025-06-03T08:00" -> "2025-06-03 08:00"
+        if len(value) >= 16 and value[10] == 'T':
+            return value[:10] + ' ' + value[11:16]
+        return value
+
+
+class TrackingOutput(BaseModel):
+    vessel_voyage: list[VesselVoyage] = Field(
+        description="Vessel schedule rows for the booking, first row is the main sailing"
+    )
+
+
+def create_controller():
+    """Create a browser-use Controller whose done action returns a TrackingOutput."""
+    from browser_use import Controller
+    return Controller(output_model=TrackingOutput)
+
+
+def structured_fields(history, booking_id):
+    """
+    Read the validated TrackingOutput from an agent run.
+
+    Returns:
+        Dict with booking_id, vessel_name, voyage_number and arrival_date, or
+        None if the run did not end with a valid structured answer
+    """
+    final = history.final_result() if hasattr(history, 'final_result') else None
+    if not final:
+        return None
+    try:
+        output = TrackingOutput.model_validate_json(final)
+    except ValidationError:
+        return None
+    if not output.vessel_voyage:
+        return None
+
+    row = output.vessel_voyage[0]
+    vessel_name, voyage_number = row.vessel_name, row.voyage_number
+    # The model occasionally repeats the voyage in the vessel name
+    split_name, split_voyage = split_vessel_and_voyage(vessel_name)
+    if split_voyage and split_voyage == voyage_number:
+        vessel_name = split_name
+
+    extracted = empty_fields(booking_id)
+    extracted['vessel_name'] = vessel_name
+    extracted['voyage_number'] = voyage_number
+    extracted['arrival_date'] = row.arrival_date_time
+    return extracted
+
+
+def result_fields(result, booking_id):
+    """
+    Tracking fields of an agent run: the structured output when present,
+    otherwise whatever extract_tracking_fields() can recover.
+    """
+    with span('extraction', source='agent') as current:
+        extracted = structured_fields(result, booking_id)
+        if extracted is None:
+            logger.debug("No structured output in agent result, falling back to text extraction")
+            current.set_attribute('structured', False)
+            extracted = extract_tracking_fields(result, booking_id)
+    if extracted['vessel_name'] == NOT_AVAILABLE:
+        EXTRACTION_MISSES.inc(source='agent')
+    return extracted
@@ -0,0 +1,457 @@
+"""
+Extraction of booking_id, vessel_name, voyage_number and arrival_date from
+everything the tracker reads: the browser agent's result, carrier results
+tables (replayed scripts, the HTTP fast path) and JSON responses.
+"""
+import json
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+
+from telemetry import get_logger
+
+logger = get_logger('parser')
+
+NOT_AVAILABLE = 'Not available'
+
+VOYAGE_SUFFIX = re.compile(r'^\d{3,5}[A-Z]?$')
+DATE_TIME = re.compile(r'\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2})?')
+KEY_WORD = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')
+
+
+def empty_fields(booking_id):
+    """Return the extraction result with every field marked as not available."""
+    return {
+        'booking_id': booking_id,
+        'vessel_name': NOT_AVAILABLE,
+        'voyage_number': NOT_AVAILABLE,
+        'arrival_date': NOT_AVAILABLE
+    }
+
+
+def split_vessel_and_voyage(text, voyage_pattern=None):
+    """
+    Split combined vessel name and voyage number, e.g. "YM MANDATE 0096W".
+
+    The last word is taken as the voyage if it matches `voyage_pattern`, or by
+    default if it holds a digit and ends in a direction (W/E/N/S) as HMM's do.
+    """
+    if not text:
+        return None, None
+    parts = text.strip().rsplit(' ', 1)
+    if len(parts) == 2:
+        if voyage_pattern is not None:
+            if voyage_pattern.match(parts[1].upper()):
+                return parts[0], parts[1]
+        elif any(c.isdigit() for c in parts[1]) and parts[1][-1].upper() in 'WENS':
+            return parts[0], parts[1]
+    return text.strip(), None
+
+
+def parse_arrival(value):
+    """Return the datetime in an arrival_date string, or None if it holds no valid date."""
+    match = DATE_TIME.search(value or '')
+    if not match:
+        return None
+    text = match.group(0).replace('T', ' ')
+    try:
+        return datetime.strptime(text, '%Y-%m-%d %H:%M' if len(text) > 10 else '%Y-%m-%d')
+    except ValueError:
+        # Date-shaped but out of range, e.g. "2025-02-30" or "25:00"
+        return None
+
+
+def _find_column(header, *keywords):
+    for keyword in keywords:
+        for i, cell in enumerate(header):
+            if keyword in cell:
+                return i
+    return None
+
+
+def fields_from_table(rows, booking_id, voyage_pattern=None):
+    """
+    Extract the tracking fields from a results table.
+
+    Args:
+        rows: Table rows as lists of cell strings, header row first
+        booking_id: The booking ID the table belongs to
+        voyage_pattern: Carrier's voyage number format, see split_vessel_and_voyage()
+
+    Returns:
+        Dict with booking_id, vessel_name, voyage_number and arrival_date, or
+        None if the rows do not look like a vessel schedule table
+    """
+    if len(rows) < 2:
+        return None
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    vessel_col = _find_column(header, 'vessel')
+    date_col = _find_column(header, 'etb', 'berth', 'arrival', 'eta')
+    if vessel_col is None or date_col is None:
+        return None
+    voyage_col = _find_column(header, 'voyage')
+
+    for row in rows[1:]:
+        if len(row) <= max(vessel_col, date_col):
+            continue
+        date_match = DATE_TIME.search(row[date_col])
+        vessel_cell = row[vessel_col].strip()
+        if not vessel_cell or not date_match:
+            continue
+
+        vessel_name, voyage_number = split_vessel_and_voyage(vessel_cell, voyage_pattern)
+        if voyage_col is not None and voyage_col != vessel_col and len(row) > voyage_col:
+            voyage_cell = row[voyage_col].strip()
+            if (voyage_pattern or VOYAGE_SUFFIX).match(voyage_cell):
+                voyage_number = voyage_cell
+
+        extracted = empty_fields(booking_id)
+        extracted['vessel_name'] = vessel_name
+        extracted['voyage_number'] = voyage_number or NOT_AVAILABLE
+        extracted['arrival_date'] = date_match.group(0)
+        return extracted
+    return None
+
+
+def fields_from_tables(tables, booking_id, voyage_pattern=None):
+    """Return the fields from the first table that looks like a vessel schedule."""
+    for rows in tables:
+        extracted = fields_from_table(rows, booking_id, voyage_pattern)
+        if extracted:
+            return extracted
+    return None
+
+
+class _TableCollector(HTMLParser):
+    """Collects the text of every <table> in an HTML document as rows of cells."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tables = []
+        self._stack = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self._stack.append([])
+        elif tag == 'tr' and self._stack:
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+        elif tag == 'br' and self._cell is not None:
+            self._cell.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th') and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if self._row:
+                self._stack[-1].append(self._row)
+            self._row = None
+        elif tag == 'table' and self._stack:
+            self.tables.append(self._stack.pop())
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def tables_from_html(html):
+    """Return every table in an HTML document as a list of rows of cell texts."""
+    collector = _TableCollector()
+    collector.feed(html)
+    collector.close()
+    return collector.tables
+
+
+def _key_words(key):
+    """Split a JSON key such as 'vesselName' or 'ETB_DATE' into lowercase words."""
+    return [word.lower() for word in KEY_WORD.findall(str(key))]
+
+
+def _first_value(data, *keywords):
+    for keyword in keywords:
+        for key, value in data.items():
+            if not any(word.startswith(keyword) for word in _key_words(key)):
+                continue
+            if isinstance(value, (str, int, float)) and str(value).strip():
+                return str(value).strip()
+    return None
+
+
+def fields_from_json(data, booking_id, voyage_pattern=None):
+    """
+    Find the first object in a decoded JSON response that carries a vessel
+    name and an arrival/berthing date, searching nested lists and objects.
+    `voyage_pattern` is the carrier's voyage number format.
+
+    Returns:
+        Dict with booking_id, vessel_name, voyage_number and arrival_date, or None
+    """
+    pending = [data]
+    while pending:
+        node = pending.pop(0)
+        if isinstance(node, list):
+            pending.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+
+        vessel = _first_value(node, 'vessel')
+        arrival = _first_value(node, 'etb', 'berth', 'arrival', 'eta')
+        if vessel and arrival:
+            vessel_name, voyage_number = split_vessel_and_voyage(vessel, voyage_pattern)
+            voyage = _first_value(node, 'voyage', 'voy')
+            if voyage and voyage != vessel:
+                voyage_number = voyage
+            extracted = empty_fields(booking_id)
+            extracted['vessel_name'] = vessel_name
+            extracted['voyage_number'] = voyage_number or NOT_AVAILABLE
+            date_match = DATE_TIME.search(arrival)
+            extracted['arrival_date'] = date_match.group(0) if date_match else arrival
+            return extracted
+        pending.extend(node.values())
+    return None
+
+
+# Patterns for the agent's free-text answer, compiled once at import time.
+# Keywords are matched case-insensitively, captured names stay upper case.
+VESSEL_VOYAGE_JSON = re.compile(
+    r'"vessel_voyage":\s*\[\s*\{[^}]*"vessel_name":\s*"([^"]+)"[^}]*"voyage_number":\s*"([^"]+)"'
+    r'[^}]*"(?:arrival_date_time|arrival_date|etb)":\s*"([^"]+)"'
+)
+JSON_OBJECT_START = re.compile(r'\{\s*"')
+LINE_BREAK = re.compile(r'\r?\n|\\n')
+TABLE_SEPARATOR_CELL = re.compile(r'^:?-+:?$')
+TABLE_ROW = re.compile(
+    r'\|\s*([A-Z0-9\- ]+?)(?:\s+(\d{4,5}[A-Z]))?[^|]*\|[^|]*\|[^|]*\|[^|]*\|[^|]*\|\s*(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2})'
+)
+FIELD_LABEL = re.compile(r'vessel|ship|voyage|arrival|et[ab]')
+FIELD_LABEL_ANY_CASE = re.compile(r'(?i)vessel|ship|voyage|arrival|et[ab]')
+VESSEL_AND_VOYAGE_TEXT = re.compile(
+    r'(?i:(?:vessel|ship)\s+name\s+(?:and\s+voyage\s+number\s+)?(?:is|:))\s*([A-Z0-9\- ]+\s+\d{4,5}[WENS])'
+)
+VESSEL_NAME_TEXT = re.compile(r'(?i:(?:vessel|ship)\s+name)\s*(?:(?i:is)|:)?\s+([A-Z0-9][A-Z0-9\- ]*[A-Z0-9])')
+VOYAGE_TEXT = re.compile(r'(?i:voyage(?:\s+number)?)\s*(?:(?i:is)|:)?\s*(\d{4,5}[A-Z]|[A-Z0-9]+-[A-Z0-9]+)')
+ARRIVAL_TEXT = re.compile(
+    r'(?i:(?:arrival|eta|etb)\s+(?:date|time)(?:\s+and\s+time)?\s*(?:\(ETB\))?\s*(?:is|:)?)\s*'
+    r'(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2})'
+)
+
+DATE_KEYS = ('arrival_date_time', 'arrival_date', 'etb')
+NESTED_KEYS = ('result', 'raw_result', 'data')
+
+_json_decoder = json.JSONDecoder()
+
+
+def _fields_from_entry(entry, booking_id):
+    """Read the fields from a single vessel_voyage entry or flat result object."""
+    extracted = empty_fields(booking_id)
+    vessel_name = entry.get('vessel_name')
+    voyage_number = entry.get('voyage_number')
+
+    # The adaptive prompt only asks for voyage_number, which the agent often
+    # returns together with the vessel name ("YM MANDATE 0096W")
+    if isinstance(voyage_number, str) and ' ' in voyage_number.strip():
+        split_name, split_voyage = split_vessel_and_voyage(voyage_number)
+        if split_voyage:
+            vessel_name = vessel_name or split_name
+            voyage_number = split_voyage
+    elif isinstance(vessel_name, str) and not voyage_number:
+        vessel_name, voyage_number = split_vessel_and_voyage(vessel_name)
+
+    if vessel_name:
+        extracted['vessel_name'] = str(vessel_name).strip()
+    if voyage_number:
+        extracted['voyage_number'] = str(voyage_number).strip()
+    for date_key in DATE_KEYS:
+        if entry.get(date_key):
+            extracted['arrival_date'] = str(entry[date_key]).strip()
+            break
+    return extracted
+
+
+def _found(extracted):
+    return extracted is not None and (
+        extracted['vessel_name'] != NOT_AVAILABLE or extracted['voyage_number'] != NOT_AVAILABLE
+    )
+
+
+def _field_count(extracted):
+    if extracted is None:
+        return 0
+    return sum(extracted[field] != NOT_AVAILABLE for field in ('vessel_name', 'voyage_number', 'arrival_date'))
+
+
+def _fields_from_mapping(data, booking_id):
+    """Extract the fields from a decoded dict, or None if it holds none of them."""
+    for key in NESTED_KEYS:
+        if key in data:
+            nested = _fields_from_value(data[key], booking_id)
+            if _found(nested):
+                return nested
+
+    voyages = data.get('vessel_voyage')
+    if isinstance(voyages, list) and voyages and isinstance(voyages[0], dict):
+        extracted = _fields_from_entry(voyages[0], booking_id)
+        if _found(extracted):
+            return extracted
+
+    if 'vessel_name' in data or 'voyage_number' in data:
+        extracted = _fields_from_entry(data, booking_id)
+        if _found(extracted):
+            return extracted
+    return None
+
+
+def _fields_from_value(value, booking_id):
+    if isinstance(value, dict):
+        return _fields_from_mapping(value, booking_id)
+    if isinstance(value, str):
+        return _fields_from_text(value, booking_id)
+    return None
+
+
+def iter_json_objects(text):
+    """
+    Yield every top-level JSON object embedded in free text.
+
+    Scans left to right in a single pass: decoding starts only where an object
+    with a string key begins, and a successfully decoded object is skipped as
+    a whole, so overlapping spans are never parsed twice.
+    """
+    position = 0
+    while True:
+        match = JSON_OBJECT_START.search(text, position)
+        if match is None:
+            return
+        try:
+            obj, end = _json_decoder.raw_decode(text, match.start())
+        except ValueError:
+            position = match.start() + 1
+            continue
+        if isinstance(obj, dict):
+            yield obj
+        position = end
+
+
+def _fields_from_text(text, booking_id):
+    """Extract the fields from free text, or None if nothing was found."""
+    if '{' in text:
+        for obj in iter_json_objects(text):
+            extracted = _fields_from_mapping(obj, booking_id)
+            if _found(extracted):
+                return extracted
+
+        # JSON that was escaped inside a repr() cannot be decoded, match it directly
+        match = VESSEL_VOYAGE_JSON.search(text)
+        if match:
+            extracted = empty_fields(booking_id)
+            extracted['vessel_name'], extracted['voyage_number'], extracted['arrival_date'] = match.groups()
+            return extracted
+
+    if '|' in text:
+        extracted = fields_from_tables(markdown_tables(text), booking_id)
+        if extracted:
+            return extracted
+        row = TABLE_ROW.search(text)
+        if row:
+            extracted = empty_fields(booking_id)
+            extracted['vessel_name'] = row.group(1).strip()
+            extracted['voyage_number'] = row.group(2) or NOT_AVAILABLE
+            extracted['arrival_date'] = row.group(3).strip()
+            return extracted
+
+    # One pass over the field labels; each label is then matched in place.
+    # Searching the lower-cased copy is much faster than a case-insensitive
+    # pattern, but only valid when lower-casing kept every offset.
+    extracted = empty_fields(booking_id)
+    lowered = text.lower()
+    labels = FIELD_LABEL.finditer(lowered) if len(lowered) == len(text) else FIELD_LABEL_ANY_CASE.finditer(text)
+    for label in labels:
+        word = label.group(0).lower()
+        position = label.start()
+        if word in ('vessel', 'ship'):
+            if extracted['vessel_name'] != NOT_AVAILABLE:
+                continue
+            combined = VESSEL_AND_VOYAGE_TEXT.match(text, position)
+            match = combined or VESSEL_NAME_TEXT.match(text, position)
+            if match:
+                vessel_name, voyage_number = split_vessel_and_voyage(match.group(1))
+                extracted['vessel_name'] = vessel_name
+                if voyage_number:
+                    extracted['voyage_number'] = voyage_number
+        elif word == 'voyage':
+            if extracted['voyage_number'] == NOT_AVAILABLE:
+                match = VOYAGE_TEXT.match(text, position)
+                if match:
+                    extracted['voyage_number'] = match.group(1)
+        elif extracted['arrival_date'] == NOT_AVAILABLE:
+            match = ARRIVAL_TEXT.match(text, position)
+            if match:
+                extracted['arrival_date'] = match.group(1)
+        if NOT_AVAILABLE not in extracted.values():
+            break
+
+    if any(extracted[field] != NOT_AVAILABLE for field in ('vessel_name', 'voyage_number', 'arrival_date')):
+        return extracted
+    return None
+
+
+def markdown_tables(text):
+    """Return the pipe-delimited (markdown) tables in a text as rows of cells."""
+    tables = []
+    rows = []
+    for line in LINE_BREAK.split(text):
+        line = line.strip()
+        if line.startswith('|') and line.count('|') >= 3:
+            cells = [cell.strip() for cell in line.strip('|').split('|')]
+            if not all(TABLE_SEPARATOR_CELL.match(cell) for cell in cells if cell):
+                rows.append(cells)
+        elif rows:
+            tables.append(rows)
+            rows = []
+    if rows:
+        tables.append(rows)
+    return tables
+
+
+def _history_texts(history):
+    """Texts worth parsing in an AgentHistoryList, most authoritative first."""
+    final = history.final_result()
+    if final:
+        yield final
+    for content in reversed(history.extracted_content()):
+        if content and content != final:
+            yield content
+
+
+def extract_tracking_fields(result, booking_id):
+    """
+    Extract booking_id, vessel_name, voyage_number, and arrival_date from agent result.
+    Accepts a browser-use AgentHistoryList, a dict or a string.
+    Returns a dict with only those fields, "Not available" for anything not found.
+    """
+    if hasattr(result, 'final_result') and hasattr(result, 'extracted_content'):
+        # Walk the structured history instead of parsing its (much larger) str() form
+        extracted = None
+        for text in _history_texts(result):
+            candidate = _fields_from_text(text, booking_id)
+            if _found(candidate):
+                extracted = candidate
+                break
+            # Keep the fullest partial match (e.g. arrival date only) seen so far
+            if _field_count(candidate) > _field_count(extracted):
+                extracted = candidate
+    else:
+        extracted = _fields_from_value(result if isinstance(result, (dict, str)) else str(result), booking_id)
+
+    if extracted is not None:
+        logger.debug("Extracted tracking fields from agent output")
+        return extracted
+
+    logger.debug("No reliable data found, returning default values")
+    return empty_fields(booking_id)
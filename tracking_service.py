@@ -0,0 +1,375 @@
+"""
+Resident tracking service with a small JSON HTTP API.
+
+Keeps the browser pool, the Gemini client, the HTTP fetcher and the result
+cache warm across requests, so a lookup only pays for the scrape itself
+instead of Python startup, imports and a cold browser.
+
+Endpoints:
+    POST /track               {"booking_ids": [...]} or {"booking_id": "..."}; queues a job (202)
+    GET  /track/{booking_id}  Resolve one booking and wait for the result
+    GET  /jobs/{job_id}       Status and results of a queued job
+    GET  /health              Queue depth and worker count
+    GET  /metrics             Spans, counters and latency histograms in the Prometheus text format
+
+When the queue is full requests are refused with 503 and a Retry-After
+header instead of piling up.
+
+Usage:
+    python tracking_service.py --port 8080 --workers 3 --headless
+    curl -X POST localhost:8080/track -d "{\"booking_ids\": [\"SINI25432400\"]}"
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from dotenv import load_dotenv
+
+from main import lookup_booking
+from adaptive_tracking import adaptive_tracking
+from browser_pool import DEFAULT_MAX_USES, BrowserPool
+from llm_scheduler import BATCH, INTERACTIVE, llm_priority
+from result_cache import get_cache
+from telemetry import configure_telemetry, render_prometheus
+from voyage_index import SingleFlight
+
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 3
+DEFAULT_QUEUE_SIZE = 100
+MAX_JOBS = 1000
+MAX_BODY = 1024 * 1024
+RETRY_AFTER = 5
+
+
+class QueueFullError(Exception):
+    """Raised when a request would not fit in the lookup queue."""
+
+
+class Job:
+    """A batch of booking IDs submitted with POST /track."""
+
+    def __init__(self, booking_ids):
+        self.job_id = uuid.uuid4().hex
+        self.booking_ids = booking_ids
+        self.results = {}
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def record(self, booking_id, record):
+        self.results[booking_id] = record
+        if len(self.results) == len(self.booking_ids):
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': 'done' if self.finished_at else 'running',
+            'total': len(self.booking_ids),
+            'completed': len(self.results),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'results': [self.results[booking_id] for booking_id in self.booking_ids if booking_id in self.results],
+        }
+
+
+class TrackingService:
+    """
+    Queue of booking lookups served by a fixed set of workers sharing one
+    LLM client and one browser pool.
+
+    Args:
+        workers: Concurrent lookups (and warm browsers)
+        queue_size: Lookups that may wait in the queue before requests are refused
+        headless: Whether to run browsers in headless mode
+        adaptive: Use adaptive_tracking() instead of lookup_booking()
+        use_http: Try the direct HTTP fast path before the browser
+        max_uses: Lookups served by a pooled browser before it is relaunched
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, headless=True, adaptive=False,
+                 use_http=True, max_uses=DEFAULT_MAX_USES):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.headless = headless
+        self.use_http = use_http
+        self.max_uses = max_uses
+        self._lookup = adaptive_tracking if adaptive else lookup_booking
+        self._queue = asyncio.PriorityQueue(maxsize=queue_size)
+        self._sequence = itertools.count()
+        self._jobs = OrderedDict()
+        self._single_flight = SingleFlight()
+        self._tasks = []
+        self._browser_pool = None
+
+    async def start(self):
+        self._browser_pool = BrowserPool(size=self.workers, headless=self.headless, max_uses=self.max_uses)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._browser_pool is not None:
+            await self._browser_pool.close()
+        from http_fetcher import close_fetcher
+        await close_fetcher()
+
+    def _enqueue(self, priority, booking_id, max_age, on_done):
+        self._queue.put_nowait((priority, next(self._sequence), booking_id, max_age, on_done))
+
+    async def _resolve(self, booking_id, max_age):
+        return await self._lookup(booking_id, browser_pool=self._browser_pool,
+                                  use_http=self.use_http, max_age=max_age)
+
+    async def _worker(self):
+        while True:
+            priority, _, booking_id, max_age, on_done = await self._queue.get()
+            started = time.perf_counter()
+            try:
+                with llm_priority(priority):
+                    # Concurrent requests for the same booking share one lookup, unless one
+                    # asks for a fresher result than the lookup already running would give
+                    minimal = await self._single_flight.do((booking_id, max_age),
+                                                           lambda: self._resolve(booking_id, max_age))
+                record = {'booking_id': booking_id, 'status': 'ok', 'result': minimal}
+            except Exception as e:
+                record = {'booking_id': booking_id, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+            finally:
+                self._queue.task_done()
+            record['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+            on_done(record)
+
+    def submit(self, booking_ids, max_age=None):
+        """
+        Queue a job for several booking IDs.
+
+        Raises:
+            QueueFullError: If the IDs do not all fit in the queue
+        """
+        if self._queue.qsize() + len(booking_ids) > self.queue_size:
+            raise QueueFullError(f"Queue has room for {self.queue_size - self._queue.qsize()} lookups")
+        job = Job(booking_ids)
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > MAX_JOBS:
+            self._jobs.popitem(last=False)
+        for booking_id in booking_ids:
+            self._enqueue(BATCH, booking_id, max_age, lambda record, booking_id=booking_id: job.record(booking_id, record))
+        return job
+
+    async def track(self, booking_id, max_age=None):
+        """
+        Resolve one booking ahead of queued jobs and wait for its record.
+
+        Raises:
+            QueueFullError: If the queue is full
+        """
+        cached = get_cache().get(booking_id, max_age=max_age)
+        if cached is not None:
+            return {'booking_id': booking_id, 'status': 'ok', 'result': cached, 'elapsed_seconds': 0.0}
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._enqueue(INTERACTIVE, booking_id, max_age,
+                          lambda record: future.done() or future.set_result(record))
+        except asyncio.QueueFull:
+            raise QueueFullError("Queue is full") from None
+        return await future
+
+    def job(self, job_id):
+        return self._jobs.get(job_id)
+
+    def health(self):
+        return {'status': 'ok', 'workers': self.workers, 'queued': self._queue.qsize(), 'queue_size': self.queue_size}
+
+
+def _parse_max_age(query):
+    value = query.get('max_age', [None])[0]
+    return float(value) if value is not None else None
+
+
+def _parse_track_body(body, default_max_age):
+    """
+    Booking IDs and max_age of a POST /track body.
+
+    Raises:
+        ValueError: If the body is not a JSON object with string booking IDs and a numeric max_age
+    """
+    try:
+        payload = json.loads(body or b'{}')
+    except json.JSONDecodeError:
+        raise ValueError('Body must be JSON') from None
+    if not isinstance(payload, dict):
+        raise ValueError('Body must be a JSON object')
+    if 'booking_ids' in payload:
+        booking_ids = payload['booking_ids']
+        if not isinstance(booking_ids, list) or not all(isinstance(booking_id, str) for booking_id in booking_ids):
+            raise ValueError('booking_ids must be a list of strings')
+    elif payload.get('booking_id') is not None:
+        if not isinstance(payload['booking_id'], str):
+            raise ValueError('booking_id must be a string')
+        booking_ids = [payload['booking_id']]
+    else:
+        booking_ids = []
+    booking_ids = list(dict.fromkeys(booking_id.strip() for booking_id in booking_ids if booking_id.strip()))
+    if not booking_ids:
+        raise ValueError('booking_id or booking_ids is required')
+    max_age = payload.get('max_age', default_max_age)
+    if max_age is not None and (isinstance(max_age, bool) or not isinstance(max_age, (int, float))):
+        raise ValueError('max_age must be a number')
+    return booking_ids, max_age
+
+
+async def handle_request(service, method, target, body):
+    """
+    Route one API request.
+
+    Returns:
+        Tuple of (HTTPStatus, JSON-serialisable payload or plain text, extra headers)
+    """
+    url = urlsplit(target)
+    query = parse_qs(url.query)
+    parts = [part for part in url.path.split('/') if part]
+    try:
+        max_age = _parse_max_age(query)
+    except ValueError:
+        return HTTPStatus.BAD_REQUEST, {'error': 'max_age must be a number'}, {}
+
+    try:
+        if parts == ['health'] and method == 'GET':
+            return HTTPStatus.OK, service.health(), {}
+
+        if parts == ['metrics'] and method == 'GET':
+            return HTTPStatus.OK, render_prometheus(), {}
+
+        if parts == ['track'] and method == 'POST':
+            try:
+                booking_ids, max_age = _parse_track_body(body, max_age)
+            except ValueError as e:
+                return HTTPStatus.BAD_REQUEST, {'error': str(e)}, {}
+            job = service.submit(booking_ids, max_age=max_age)
+            return HTTPStatus.ACCEPTED, job.to_dict(), {'Location': f"/jobs/{job.job_id}"}
+
+        if len(parts) == 2 and parts[0] == 'track' and method == 'GET':
+            record = await service.track(parts[1], max_age=max_age)
+            return HTTPStatus.OK, record, {}
+
+        if len(parts) == 2 and parts[0] == 'jobs' and method == 'GET':
+            job = service.job(parts[1])
+            if job is None:
+                return HTTPStatus.NOT_FOUND, {'error': 'Unknown job'}, {}
+            return HTTPStatus.OK, job.to_dict(), {}
+    except QueueFullError as e:
+        return HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}, {'Retry-After': str(RETRY_AFTER)}
+
+    return HTTPStatus.NOT_FOUND, {'error': 'Not found'}, {}
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, version = request_line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+    return method, target, body, keep_alive
+
+
+async def serve_connection(service, reader, writer):
+    """Serve HTTP/1.1 requests on one connection until the client closes it."""
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                request = None
+                status, payload, headers, keep_alive = HTTPStatus.BAD_REQUEST, {'error': 'Bad request'}, {}, False
+            else:
+                if request is None:
+                    return
+                method, target, body, keep_alive = request
+                try:
+                    status, payload, headers = await handle_request(service, method, target, body)
+                except Exception as e:
+                    # Answer instead of dropping the connection
+                    status, payload, headers = (HTTPStatus.INTERNAL_SERVER_ERROR,
+                                                {'error': f"{type(e).__name__}: {e}"}, {})
+
+            if isinstance(payload, str):
+                content, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                content, content_type = json.dumps(payload, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8"
+            head = [f"HTTP/1.1 {status.value} {status.phrase}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(content)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+            head += [f"{name}: {value}" for name, value in headers.items()]
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + content)
+            await writer.drain()
+            if not keep_alive:
+                return
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_service(host, port, **options):
+    service = TrackingService(**options)
+    await service.start()
+    server = await asyncio.start_server(lambda r, w: serve_connection(service, r, w), host, port)
+    print(f"Tracking service listening on http://{host}:{port} with {service.workers} workers", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the shipment tracking service.")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent lookups and warm browsers (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Lookups that may wait before requests are refused (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument('--max-uses', type=int, default=DEFAULT_MAX_USES,
+                        help=f"Lookups per browser before it is relaunched (default: {DEFAULT_MAX_USES})")
+    parser.add_argument('--headless', action='store_true', help="Run browsers in headless mode")
+    parser.add_argument('--adaptive', action='store_true', help="Use adaptive tracking for each booking")
+    parser.add_argument('--no-http', dest='use_http', action='store_false',
+                        help="Skip the direct HTTP fast path and always use the browser")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Load environment variables from .env
+    load_dotenv()
+    configure_telemetry()
+    try:
+        asyncio.run(run_service(args.host, args.port, workers=args.workers, queue_size=args.queue_size,
+                                headless=args.headless, adaptive=args.adaptive, use_http=args.use_http,
+                                max_uses=args.max_uses))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
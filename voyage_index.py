@@ -0,0 +1,259 @@
+"""
+Booking -> (vessel, voyage) index and voyage-level ETB refresh.
+
+The arrival date (ETB) is a property of the sailing, not of the booking, so
+once a booking has been resolved its vessel and voyage are remembered here.
+A refresh then scrapes one booking per voyage and fans the new ETB out to
+every booking on that voyage, with concurrent refreshes of the same voyage
+collapsed into a single lookup (single-flight).
+"""
+import asyncio
+import time
+
+from result_cache import TRACKING_DB, connect, get_cache
+from result_store import get_result_store
+from tracking_parser import NOT_AVAILABLE
+
+
+def voyage_key(extracted):
+    """Return the (vessel_name, voyage_number) of a result, or None if either is missing."""
+    vessel = extracted.get('vessel_name', NOT_AVAILABLE)
+    voyage = extracted.get('voyage_number', NOT_AVAILABLE)
+    if NOT_AVAILABLE in (vessel, voyage) or not vessel or not voyage:
+        return None
+    return (vessel.strip().upper(), voyage.strip().upper())
+
+
+class VoyageIndex:
+    """
+    Persistent mapping of booking IDs to the sailing they are on.
+
+    Args:
+        db_path: SQLite database file holding the index
+    """
+
+    def __init__(self, db_path=TRACKING_DB):
+        self._conn = connect(db_path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS voyage_index (
+                booking_id TEXT PRIMARY KEY,
+                vessel_name TEXT NOT NULL,
+                voyage_number TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_voyage_index_voyage ON voyage_index (vessel_name, voyage_number)")
+        self._conn.commit()
+
+    def record(self, extracted):
+        """Remember which sailing a resolved booking is on."""
+        key = voyage_key(extracted)
+        if key is None:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO voyage_index VALUES (?, ?, ?, ?)",
+            (extracted['booking_id'], key[0], key[1], time.time()),
+        )
+        self._conn.commit()
+
+    def voyage_for(self, booking_id):
+        """Return the (vessel_name, voyage_number) a booking is on, or None if unknown."""
+        row = self._conn.execute(
+            "SELECT vessel_name, voyage_number FROM voyage_index WHERE booking_id = ?", (booking_id,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def bookings_for(self, vessel_name, voyage_number):
+        """Return every indexed booking on a sailing."""
+        rows = self._conn.execute(
+            "SELECT booking_id FROM voyage_index WHERE vessel_name = ? AND voyage_number = ? ORDER BY booking_id",
+            (vessel_name.upper(), voyage_number.upper()),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def group_by_voyage(self, booking_ids):
+        """
+        Split booking IDs by sailing.
+
+        Returns:
+            Tuple of (dict mapping (vessel, voyage) to booking IDs, list of unindexed booking IDs)
+        """
+        groups = {}
+        unknown = []
+        for booking_id in booking_ids:
+            key = self.voyage_for(booking_id)
+            if key is None:
+                unknown.append(booking_id)
+            else:
+                groups.setdefault(key, []).append(booking_id)
+        return groups, unknown
+
+    def close(self):
+        self._conn.close()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller
+    runs the coroutine, later callers await the same result. If the first
+    caller is cancelled, a waiting caller takes over and runs it instead.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, coro_factory):
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # This caller was cancelled, not the one running the call
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await coro_factory()
+        except asyncio.CancelledError:
+            # Wakes the waiting callers so that one of them runs the call again
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+
+_shared_index = None
+
+
+def get_voyage_index():
+    """Return the process-wide voyage index."""
+    global _shared_index
+    if _shared_index is None:
+        _shared_index = VoyageIndex()
+    return _shared_index
+
+
+_shared_single_flight = None
+
+
+def get_single_flight():
+    """Return the SingleFlight shared by every voyage refresh in this process."""
+    global _shared_single_flight
+    if _shared_single_flight is None:
+        _shared_single_flight = SingleFlight()
+    return _shared_single_flight
+
+
+async def refresh_voyages(booking_ids, lookup, on_record, concurrency=3, index=None, single_flight=None):
+    """
+    Refresh the ETB of many bookings with one lookup per sailing.
+
+    Bookings already in the index are grouped by sailing; one representative
+    is looked up and its vessel/voyage/ETB are copied to the others. If the
+    representative turns out to have moved to another sailing (rollover) the
+    next booking of the group is tried instead. Unindexed bookings are looked
+    up individually and indexed.
+
+    Args:
+        booking_ids: Booking IDs to refresh
+        lookup: Coroutine function taking a booking ID and returning tracking fields
+        on_record: Called with one JSON-serialisable record per booking as it completes
+        concurrency: Maximum number of lookups in flight
+        index: VoyageIndex to use, defaults to the shared one
+        single_flight: SingleFlight deduplicating lookups of a sailing, defaults to the one
+            shared by every refresh running in this process (get_single_flight())
+
+    Returns:
+        Number of lookups actually performed
+    """
+    index = index or get_voyage_index()
+    single_flight = single_flight or get_single_flight()
+    cache = get_cache()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    lookups = 0
+
+    async def fetch(booking_id):
+        nonlocal lookups
+        async with semaphore:
+            lookups += 1
+            return await lookup(booking_id)
+
+    def emit(booking_id, status, started, result=None, error=None, shared_with=None):
+        record = {'booking_id': booking_id, 'status': status}
+        if result is not None:
+            record['result'] = result
+        if error is not None:
+            record['error'] = error
+        if shared_with is not None:
+            record['shared_with'] = shared_with
+        record['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        on_record(record)
+
+    async def look_up(booking_id):
+        return booking_id, await fetch(booking_id)
+
+    def share(minimal, booking_ids, answered_for, started):
+        for booking_id in booking_ids:
+            shared = dict(minimal, booking_id=booking_id)
+            shared.pop('fetched_at', None)
+            cache.put(shared)
+            get_result_store().add(shared, 'shared')
+            emit(booking_id, 'ok', started, result=shared, shared_with=answered_for)
+
+    async def refresh_group(key, members):
+        started = time.perf_counter()
+        pending = list(members)
+        while pending:
+            representative = pending.pop(0)
+            try:
+                answered_for, minimal = await single_flight.do(key, lambda: look_up(representative))
+                if answered_for != representative and voyage_key(minimal) != key:
+                    # A concurrent refresh looked up another booking of this sailing, which was rolled
+                    answered_for, minimal = await look_up(representative)
+            except Exception as e:
+                emit(representative, 'error', started, error=f"{type(e).__name__}: {e}")
+                continue
+            if answered_for != representative:
+                # A concurrent refresh of the same sailing answered for all of its bookings;
+                # it already indexed and cached the booking it looked up
+                share(minimal, [representative] + pending, answered_for, started)
+                return
+            index.record(minimal)
+            cache.put(minimal)
+            emit(representative, 'ok', started, result=minimal)
+            if voyage_key(minimal) != key:
+                # The booking was rolled to another sailing; its result says nothing about the others
+                continue
+            share(minimal, pending, representative, started)
+            return
+
+    async def refresh_single(booking_id):
+        started = time.perf_counter()
+        try:
+            minimal = await fetch(booking_id)
+        except Exception as e:
+            emit(booking_id, 'error', started, error=f"{type(e).__name__}: {e}")
+            return
+        index.record(minimal)
+        cache.put(minimal)
+        emit(booking_id, 'ok', started, result=minimal)
+
+    groups, unknown = index.group_by_voyage(booking_ids)
+    print(f"Refreshing {len(booking_ids)} bookings: {len(groups)} known sailings, {len(unknown)} unindexed bookings")
+    await asyncio.gather(
+        *(refresh_group(key, members) for key, members in groups.items()),
+        *(refresh_single(booking_id) for booking_id in unknown),
+    )
+    return lookups